@@ -0,0 +1,91 @@
+import csv
+import io
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, NamedTuple
+
+from .availability import Availability
+
+
+# Utilization analytics over the same per-minute "minutes free" arrays the
+# availability engines answer lookups from. Every free minute counts down
+# to the end of its free block, so a day's aggregates come straight out of
+# C-level array methods without visiting each minute (or slot) in Python:
+#
+#   free minutes              minutes that aren't 0
+#   free blocks               minutes that are 1 (the last minute of each block)
+#   longest free block        the largest value (the first minute of that block)
+#   free blocks of N+ minutes minutes that are N (one in each such block)
+
+
+# How an agent's working hours on a local date were spent
+class DayUtilization(NamedTuple):
+    agent_id: int
+    date: date
+    working_minutes: int
+    busy_minutes: int
+    free_minutes: int
+    # How fragmented the free time is
+    free_blocks: int
+    longest_free_block: int
+    # Free blocks long enough to count as underutilized time
+    long_free_blocks: int
+    # The share of working minutes that are busy
+    utilization: float
+
+
+# Helper function to compute how an agent's working hours on a local date
+# were spent. Free blocks of at least `min_block` minutes are counted as
+# long free blocks (as with /underutilized, which looks for 1-hour blocks)
+def day_utilization(agent_id: int, availability: Availability, local_date: date, min_block: int = 60) -> DayUtilization:
+    _, values = availability.day_values(local_date)
+
+    working_minutes = sum(end - start for start, end in availability.hours.open_blocks(local_date))
+    free_minutes = len(values) - values.count(0)
+    busy_minutes = working_minutes - free_minutes
+
+    return DayUtilization(
+        agent_id=agent_id,
+        date=local_date,
+        working_minutes=working_minutes,
+        busy_minutes=busy_minutes,
+        free_minutes=free_minutes,
+        free_blocks=values.count(1),
+        longest_free_block=max(values, default=0),
+        long_free_blocks=values.count(min_block),
+        utilization=round(busy_minutes / working_minutes, 4) if working_minutes else 0.0,
+    )
+
+
+# Helper function to build a utilization report with one row per agent per
+# local date from `start_date` through `end_date` (inclusive), sorted by
+# agent and then date. Each agent's dates are in their own timezone
+def utilization_report(availabilities: Dict[int, Availability], start_date: date, end_date: date, min_block: int = 60) -> List[DayUtilization]:
+    if end_date < start_date:
+        raise ValueError("The end date must not be before the start date")
+    if min_block <= 0:
+        raise ValueError("The minimum block must be at least one minute")
+
+    dates = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+    return [
+        day_utilization(agent_id, availabilities[agent_id], local_date, min_block)
+        for agent_id in sorted(availabilities)
+        for local_date in dates
+    ]
+
+
+# Helper function to render a utilization report as
+# a compact table of columns and rows for JSON output
+def utilization_table(rows: Iterable[DayUtilization]) -> Dict:
+    return {
+        "columns": list(DayUtilization._fields),
+        "rows": [[*row[:1], row.date.isoformat(), *row[2:]] for row in rows],
+    }
+
+
+# Helper function to render a utilization report as CSV with a header row
+def utilization_csv(rows: Iterable[DayUtilization]) -> str:
+    output = io.StringIO()
+    writer = csv.writer(output, lineterminator="\n")
+    writer.writerow(DayUtilization._fields)
+    writer.writerows(rows)
+    return output.getvalue()
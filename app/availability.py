@@ -0,0 +1,482 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from itertools import chain, compress, count
+from datetime import date, datetime, timedelta, tzinfo
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .constants import (
+    AVAILABILITY_BACKEND,
+    DAY_CACHE_SIZE,
+    DEFAULT_TIMEZONE,
+    HORIZON_START,
+    HORIZON_END,
+)
+from .ics_reader import IcsSeries, iter_occurrences
+from .working_hours import DEFAULT_WORKING_HOURS, WorkingHours, iter_open_blocks
+
+
+# Helper function to treat naive datetimes as
+# being in the Default/Pacific timezone
+def localize(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=DEFAULT_TIMEZONE)
+    return value
+
+
+# Helper function to convert a datetime into the number
+# of whole minutes since the Unix epoch, which is the unit
+# our availability engines index their data by
+def to_epoch_minute(value: datetime) -> int:
+    return int(localize(value).timestamp()) // 60
+
+
+# Helper function to convert minutes since the Unix
+# epoch back into a datetime in the requested timezone
+def from_epoch_minute(minute: int, tz: tzinfo = DEFAULT_TIMEZONE) -> datetime:
+    return datetime.fromtimestamp(minute * 60, tz=tz)
+
+
+# Helper function to return the epoch minute at which the
+# business day containing epoch minute `minute` ends
+def business_day_end(minute: int, hours: WorkingHours = DEFAULT_WORKING_HOURS) -> int:
+    block = hours.open_block_at(minute)
+    return block[1] if block is not None else minute
+
+
+# Helper function to check whether epoch
+# minute `minute` falls inside the business day
+def is_business_hours(minute: int, hours: WorkingHours = DEFAULT_WORKING_HOURS) -> bool:
+    return hours.open_block_at(minute) is not None
+
+
+# Helper function to yield the [start, end) epoch minutes of every block of
+# business hours that overlaps the range between epoch minutes `start` and
+# `end`, following the agent's working hours
+def iter_business_days(start: int, end: int, hours: WorkingHours = DEFAULT_WORKING_HOURS) -> Iterator[Tuple[int, int]]:
+    return iter(iter_open_blocks(hours, start, end))
+
+
+# Helper function to yield the [start, end) epoch minutes of every block of
+# free business time that overlaps the range between epoch minutes `start`
+# and `end`. Blocks are not clipped to the range, so a block's end is always
+# the moment the agent stops being free
+def iter_free_blocks(busy_starts: List[int], busy_ends: List[int], start: int, end: int, hours: WorkingHours = DEFAULT_WORKING_HOURS) -> Iterator[Tuple[int, int]]:
+    for day_start, day_end in iter_business_days(start, end, hours):
+        # Skip past busy intervals that ended before the business day started
+        index = bisect_right(busy_ends, day_start)
+        block_start = day_start
+
+        while block_start < day_end:
+            if index < len(busy_starts) and busy_starts[index] < day_end:
+                if busy_starts[index] > block_start:
+                    yield block_start, busy_starts[index]
+                block_start = max(block_start, busy_ends[index])
+                index += 1
+            else:
+                yield block_start, day_end
+                block_start = day_end
+
+
+# Helper function to return the [start, end) epoch minutes of an event
+def event_minutes(event: Dict) -> Tuple[int, int]:
+    start = to_epoch_minute(event["begin"])
+    # Round partial minutes up so the agent is busy for all of them
+    end = -(-int(event["end"].timestamp()) // 60)
+    return start, end
+
+
+# Helper function to yield every local date that overlaps
+# the range between epoch minutes `start` and `end`
+def iter_local_dates(start: int, end: int, tz: tzinfo = DEFAULT_TIMEZONE) -> Iterator[date]:
+    local_date = from_epoch_minute(start, tz).date()
+    last_date = from_epoch_minute(end, tz).date()
+
+    while local_date <= last_date:
+        yield local_date
+        local_date += timedelta(days=1)
+
+
+# Helper function to write the minutes free for every minute between epoch
+# minutes `start` and `end` (inclusive) into `values`, an array indexed by
+# minute offset from `window_start`
+def fill_free_blocks(values: array, window_start: int, busy_starts: List[int], busy_ends: List[int], start: int, end: int, hours: WorkingHours = DEFAULT_WORKING_HOURS):
+    for local_date in iter_local_dates(start, end, hours.tz):
+        day_start, next_day_start = hours.day_bounds(local_date)
+        first = max(day_start, start)
+        last = min(next_day_start - 1, end)
+
+        # Days without any events are copied straight from the
+        # working hours' template for that day...
+        index = bisect_right(busy_ends, day_start)
+        if index == len(busy_starts) or busy_starts[index] >= next_day_start:
+            values[first - window_start:last - window_start + 1] = hours.day_template(local_date)[first - day_start:last - day_start + 1]
+            continue
+
+        # ...otherwise every minute starts out unavailable...
+        values[first - window_start:last - window_start + 1] = array("H", bytes(2 * (last - first + 1)))
+
+        # ...and every minute of a free block counts down to the end of it
+        for block_start, block_end in iter_free_blocks(busy_starts, busy_ends, first, last, hours):
+            block_first = max(block_start, first)
+            block_last = min(block_end, last + 1)
+            if block_first < block_last:
+                values[block_first - window_start:block_last - window_start] = array("H", range(block_end - block_first, block_end - block_last, -1))
+
+
+# Helper function to check that every block of working hours on a
+# local date falls inside the window between epoch minutes
+# `window_start` and `window_end` (inclusive)
+def check_day_window(hours: WorkingHours, local_date: date, window_start: int, window_end: int):
+    for block_start, block_end in hours.open_blocks(local_date):
+        if block_start < window_start or block_end - 1 > window_end:
+            raise LookupError("Requested time is outside of the preprocessed window")
+
+
+# Helper function to turn an agent's events as [start, end) epoch minutes
+# (sorted by start) into a list of non-overlapping busy intervals
+def merge_busy_intervals(sorted_intervals: Iterable[Tuple[int, int]]) -> Tuple[List[int], List[int]]:
+    busy_starts = []
+    busy_ends = []
+
+    for start, end in sorted_intervals:
+        if end <= start:
+            continue
+
+        # Extend the previous interval when the events overlap or touch
+        if busy_ends and start <= busy_ends[-1]:
+            busy_ends[-1] = max(busy_ends[-1], end)
+        else:
+            busy_starts.append(start)
+            busy_ends.append(end)
+
+    return busy_starts, busy_ends
+
+
+# Availability engine backed by an agent's merged busy intervals.
+# Building it costs O(events) and each lookup is a binary search
+class IntervalAvailability:
+    def __init__(self, busy_starts: List[int], busy_ends: List[int], window_start: datetime, window_end: datetime, hours: WorkingHours = DEFAULT_WORKING_HOURS):
+        self.busy_starts = busy_starts
+        self.busy_ends = busy_ends
+        self.window_start = to_epoch_minute(window_start)
+        self.window_end = to_epoch_minute(window_end)
+        self.hours = hours
+
+    @classmethod
+    def from_events(cls, sorted_events: List[Dict], window_start: datetime, window_end: datetime, hours: WorkingHours = DEFAULT_WORKING_HOURS):
+        busy_starts, busy_ends = merge_busy_intervals(map(event_minutes, sorted_events))
+        return cls(busy_starts, busy_ends, window_start, window_end, hours)
+
+    # Return the epoch minute at which the local day starts, and the
+    # minutes free for every minute of the day, computed from the busy
+    # intervals. The day's working hours must be inside the window
+    def day_values(self, local_date: date) -> Tuple[int, array]:
+        check_day_window(self.hours, local_date, self.window_start, self.window_end)
+
+        day_start, next_day_start = self.hours.day_bounds(local_date)
+        values = array("H", bytes(2 * (next_day_start - day_start)))
+        fill_free_blocks(values, day_start, self.busy_starts, self.busy_ends, day_start, next_day_start - 1, self.hours)
+        return day_start, values
+
+    # Return the number of minutes the agent is free starting at `requested_time`
+    def minutes_free(self, requested_time: datetime) -> int:
+        minute = to_epoch_minute(requested_time)
+
+        if minute < self.window_start or minute > self.window_end:
+            raise LookupError("Requested time is outside of the preprocessed window")
+
+        return self.minutes_free_at(minute)
+
+    # Same as minutes_free(), but for an epoch minute within the window
+    def minutes_free_at(self, minute: int) -> int:
+        # Case 1: It's outside of the business day
+        #
+        # Result: The agent is unavailable, so the duration is 0 min
+        block = self.hours.open_block_at(minute)
+        if block is None:
+            return 0
+
+        # Find the first busy interval starting after `minute`
+        index = bisect_right(self.busy_starts, minute)
+
+        # Case 2: The previous busy interval overlaps with `minute`
+        #
+        # Result: The agent is unavailable, so the duration is 0 min
+        if index > 0 and self.busy_ends[index - 1] > minute:
+            return 0
+
+        # Case 3: The agent is free until the next busy interval
+        #         or until the end of the business day, whichever is first
+        day_end = block[1]
+        if index < len(self.busy_starts):
+            return min(self.busy_starts[index], day_end) - minute
+        return day_end - minute
+
+    # Return every `step`-minute slot from epoch minute `first` through `last`
+    # at which the agent is free for at least `duration` minutes. Only the
+    # free blocks in the range are visited, so the cost grows with the number
+    # of blocks and matches rather than the number of slots
+    def find_slots(self, first: int, last: int, duration: int, step: int = 15) -> List[int]:
+        slots = []
+
+        for block_start, block_end in iter_free_blocks(self.busy_starts, self.busy_ends, first, last, self.hours):
+            # Snap the block's start onto the slot grid anchored at `first`
+            slot = max(block_start, first)
+            slot += -(slot - first) % step
+            slots.extend(range(slot, min(block_end - duration, last) + 1, step))
+
+        return slots
+
+    # Return the subset of `slots` (epoch minutes) at
+    # which the agent is free for at least `duration` minutes
+    def filter_slots(self, slots: List[int], duration: int) -> List[int]:
+        return [slot for slot in slots if self.minutes_free_at(slot) >= duration]
+
+
+# Availability engine backed by one contiguous array holding the minutes
+# the agent is free for every minute of the preprocessed window, so that
+# each lookup is a single offset into the array
+class ArrayAvailability:
+    def __init__(self, values: array, window_start: int, hours: WorkingHours = DEFAULT_WORKING_HOURS):
+        self.values = values
+        self.window_start = window_start
+        self.window_end = window_start + len(values) - 1
+        self.hours = hours
+
+    @classmethod
+    def from_events(cls, sorted_events: List[Dict], window_start: datetime, window_end: datetime, hours: WorkingHours = DEFAULT_WORKING_HOURS):
+        busy_starts, busy_ends = merge_busy_intervals(map(event_minutes, sorted_events))
+        return cls.from_busy_intervals(busy_starts, busy_ends, to_epoch_minute(window_start), to_epoch_minute(window_end), hours)
+
+    @classmethod
+    def from_busy_intervals(cls, busy_starts: List[int], busy_ends: List[int], window_start: int, window_end: int, hours: WorkingHours = DEFAULT_WORKING_HOURS):
+        values = array("H", bytes(2 * (window_end - window_start + 1)))
+        fill_free_blocks(values, window_start, busy_starts, busy_ends, window_start, window_end, hours)
+        return cls(values, window_start, hours)
+
+    # Return a copy of this availability with the given local days
+    # recomputed from the agent's (updated) busy intervals, so that a
+    # calendar change only costs as much as the days it touched
+    def with_days_rebuilt(self, busy_starts: List[int], busy_ends: List[int], days: Iterable[date]):
+        values = array("H", self.values)
+
+        for day in days:
+            day_start, next_day_start = self.hours.day_bounds(day)
+
+            start = max(day_start, self.window_start)
+            end = min(next_day_start - 1, self.window_end)
+            if start <= end:
+                fill_free_blocks(values, self.window_start, busy_starts, busy_ends, start, end, self.hours)
+
+        return ArrayAvailability(values, self.window_start, self.hours)
+
+    # Return the epoch minute at which the local day starts, and the minutes
+    # free for every minute of the day, copied out of the array. The day's
+    # working hours must be inside the window, so any minutes of the day
+    # outside of it are unavailable anyway
+    def day_values(self, local_date: date) -> Tuple[int, array]:
+        check_day_window(self.hours, local_date, self.window_start, self.window_end)
+
+        day_start, next_day_start = self.hours.day_bounds(local_date)
+        values = array("H", bytes(2 * (next_day_start - day_start)))
+
+        start = max(day_start, self.window_start)
+        end = min(next_day_start, self.window_end + 1)
+        if start < end:
+            values[start - day_start:end - day_start] = array("H", self.values[start - self.window_start:end - self.window_start])
+        return day_start, values
+
+    # Return the number of minutes the agent is free starting at `requested_time`
+    def minutes_free(self, requested_time: datetime) -> int:
+        minute = to_epoch_minute(requested_time)
+
+        if minute < self.window_start or minute > self.window_end:
+            raise LookupError("Requested time is outside of the preprocessed window")
+
+        return self.values[minute - self.window_start]
+
+    # Same as minutes_free(), but for an epoch minute within the window
+    def minutes_free_at(self, minute: int) -> int:
+        return self.values[minute - self.window_start]
+
+    # Return every `step`-minute slot from epoch minute `first` through `last`
+    # at which the agent is free for at least `duration` minutes. The slots
+    # are read as one strided slice of the array and filtered in a single
+    # pass without any per-slot Python bytecode
+    def find_slots(self, first: int, last: int, duration: int, step: int = 15) -> List[int]:
+        offset = first - self.window_start
+        values = self.values[offset:last - self.window_start + 1:step]
+        return list(compress(range(first, last + 1, step), map(duration.__le__, values)))
+
+    # Return the subset of `slots` (epoch minutes) at
+    # which the agent is free for at least `duration` minutes
+    def filter_slots(self, slots: List[int], duration: int) -> List[int]:
+        values = self.values
+        window_start = self.window_start
+        return list(compress(slots, map(duration.__le__, [values[slot - window_start] for slot in slots])))
+
+
+# Bounded LRU cache of materialized days, shared by every agent so
+# that memory grows with the days being looked up, not the horizon
+class DayCache:
+    def __init__(self, max_days: int):
+        self.max_days = max_days
+        self._days: "OrderedDict[Hashable, Tuple[int, array]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._days)
+
+    def get(self, key: Hashable) -> Optional[Tuple[int, array]]:
+        day = self._days.get(key)
+        if day is not None:
+            self._days.move_to_end(key)
+        return day
+
+    def put(self, key: Hashable, day: Tuple[int, array]):
+        self._days[key] = day
+        self._days.move_to_end(key)
+        while len(self._days) > self.max_days:
+            self._days.popitem(last=False)
+
+    def clear(self):
+        self._days.clear()
+
+
+day_cache = DayCache(DAY_CACHE_SIZE)
+
+# Every DayAvailability gets its own key in the day cache, so the days
+# of an agent's previous availability are never served after a rebuild
+day_cache_owners = count()
+
+
+# Availability engine backed by an agent's merged busy intervals over
+# the whole calendar, which materializes one array of minutes free per
+# local day the first time that day is looked up. Lookups cost the same
+# as ArrayAvailability once a day is cached, but any date can be queried
+# and only the days that are looked up take up memory. Recurring events
+# are kept as rules and only expanded for the day being materialized
+class DayAvailability:
+    def __init__(self, busy_starts: List[int], busy_ends: List[int], series: Tuple[IcsSeries, ...] = (), hours: WorkingHours = DEFAULT_WORKING_HOURS):
+        self.busy_starts = busy_starts
+        self.busy_ends = busy_ends
+        self.series = tuple(series)
+        self.hours = hours
+        self.window_start = to_epoch_minute(HORIZON_START)
+        self.window_end = to_epoch_minute(HORIZON_END)
+        self._owner = next(day_cache_owners)
+
+    # Availabilities built in a worker process get a fresh day cache owner
+    # when they're unpickled, since the counter is per process
+    def __reduce__(self):
+        return DayAvailability, (self.busy_starts, self.busy_ends, self.series, self.hours)
+
+    # Return the epoch minute at which the local day starts, and the minutes
+    # free for every minute of the day, materializing the day if needed
+    def day_values(self, local_date: date) -> Tuple[int, array]:
+        key = (self._owner, local_date)
+        day = day_cache.get(key)
+
+        if day is None:
+            day_start, next_day_start = self.hours.day_bounds(local_date)
+            day_end = next_day_start - 1
+
+            busy_starts, busy_ends = self.day_busy_intervals(day_start, day_end)
+            index = bisect_right(busy_ends, day_start)
+
+            # Days without any events share the working hours' template
+            if index == len(busy_starts) or busy_starts[index] > day_end:
+                values = self.hours.day_template(local_date)
+            else:
+                values = array("H", bytes(2 * (day_end - day_start + 1)))
+                fill_free_blocks(values, day_start, busy_starts, busy_ends, day_start, day_end, self.hours)
+
+            day = (day_start, values)
+            day_cache.put(key, day)
+
+        return day
+
+    # Return the busy intervals that overlap the day between epoch minutes
+    # `day_start` and `day_end`, including any occurrences of recurring events
+    def day_busy_intervals(self, day_start: int, day_end: int) -> Tuple[List[int], List[int]]:
+        occurrences = [
+            (event.start, event.end)
+            for series in self.series
+            for event in iter_occurrences(series, day_start, day_end)
+        ]
+        if not occurrences:
+            return self.busy_starts, self.busy_ends
+
+        first = bisect_right(self.busy_ends, day_start)
+        last = bisect_left(self.busy_starts, day_end + 1)
+        one_offs = zip(self.busy_starts[first:last], self.busy_ends[first:last])
+        return merge_busy_intervals(sorted(chain(one_offs, occurrences)))
+
+    # Return the number of minutes the agent is free starting at `requested_time`
+    def minutes_free(self, requested_time: datetime) -> int:
+        minute = to_epoch_minute(requested_time)
+
+        if minute < self.window_start or minute > self.window_end:
+            raise LookupError("Requested time is outside of the supported date range")
+
+        return self.minutes_free_at(minute)
+
+    # Same as minutes_free(), but for an epoch minute within the window
+    def minutes_free_at(self, minute: int) -> int:
+        day_start, values = self.day_values(from_epoch_minute(minute, self.hours.tz).date())
+        return values[minute - day_start]
+
+    # Return every `step`-minute slot from epoch minute `first` through `last`
+    # at which the agent is free for at least `duration` minutes. Each day in
+    # the range is read as one strided slice, as with ArrayAvailability
+    def find_slots(self, first: int, last: int, duration: int, step: int = 15) -> List[int]:
+        slots = []
+
+        for local_date in iter_local_dates(first, last, self.hours.tz):
+            day_start, values = self.day_values(local_date)
+
+            # Snap the day's first slot onto the slot grid anchored at `first`
+            start = max(first, day_start)
+            start += -(start - first) % step
+            end = min(last, day_start + len(values) - 1)
+
+            if start <= end:
+                day_slots = values[start - day_start:end - day_start + 1:step]
+                slots.extend(compress(range(start, end + 1, step), map(duration.__le__, day_slots)))
+
+        return slots
+
+    # Return the subset of `slots` (epoch minutes) at
+    # which the agent is free for at least `duration` minutes
+    def filter_slots(self, slots: List[int], duration: int) -> List[int]:
+        free_slots = []
+        day_start = day_end = None
+
+        for slot in slots:
+            # Slots are usually sorted, so only look up a day when we leave the last one
+            if day_start is None or not day_start <= slot <= day_end:
+                day_start, values = self.day_values(from_epoch_minute(slot, self.hours.tz).date())
+                day_end = day_start + len(values) - 1
+
+            if values[slot - day_start] >= duration:
+                free_slots.append(slot)
+
+        return free_slots
+
+
+# Every availability engine answers the same minutes_free() lookups
+Availability = Union[IntervalAvailability, ArrayAvailability, DayAvailability]
+
+
+# Helper function to build an agent's availability from its busy
+# intervals using the requested availability backend. The "days"
+# backend isn't limited to the window, and expands the recurring events
+# in `series` itself (the other backends expect them already expanded)
+def build_availability(busy_starts: List[int], busy_ends: List[int], window_start: datetime, window_end: datetime, backend: str = AVAILABILITY_BACKEND, series: Tuple[IcsSeries, ...] = (), hours: WorkingHours = DEFAULT_WORKING_HOURS) -> Availability:
+    if backend == "array":
+        return ArrayAvailability.from_busy_intervals(busy_starts, busy_ends, to_epoch_minute(window_start), to_epoch_minute(window_end), hours)
+    if backend == "intervals":
+        return IntervalAvailability(busy_starts, busy_ends, window_start, window_end, hours)
+    if backend == "days":
+        return DayAvailability(busy_starts, busy_ends, series, hours)
+    raise ValueError(f"Unknown availability backend: {backend}")
@@ -0,0 +1,303 @@
+import argparse
+import json
+import random
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from fastapi.testclient import TestClient
+
+from . import main
+from .constants import BUSINESS_DAY_START, BUSINESS_DAY_END, PREPROCESS_START, PREPROCESS_END
+from .cache import ResultCache
+from .datastore import AvailabilityStore
+from .ics_reader import read_ics_events
+from .utils import preprocess_ics_files, read_ics_file_and_sort_events
+
+
+# Benchmark harness for preprocessing and every endpoint.
+#
+# Run it with e.g.
+#
+#   python -m app.benchmark --agents 200 --events 500 --output results.json
+#   python -m app.benchmark --agents 200 --events 500 --compare results.json
+#
+# It writes synthetic calendars for N agents with M events each, times
+# parsing, preprocessing and every route through TestClient, and reports
+# throughput, p50/p99 latency and peak memory for each benchmark
+
+
+###############################
+# Synthetic calendar creation #
+###############################
+
+# Helper function to format a datetime as an ICS UTC DATE-TIME value
+def ics_utc(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+# Helper function to pick a random quarter-hour during the business day
+def random_business_time(rng: random.Random, start: datetime, days: int) -> datetime:
+    day = start + timedelta(days=rng.randrange(days))
+    minutes = rng.randrange((BUSINESS_DAY_END - BUSINESS_DAY_START) * 4) * 15
+    return day.replace(hour=BUSINESS_DAY_START, minute=0) + timedelta(minutes=minutes)
+
+
+# Helper function to build the VEVENTs of a synthetic calendar: a mix of
+# multi-day all-day events (like Jane's DATE-valued conference), runs of
+# back-to-back meetings, one-off meetings, and years of history that falls
+# outside the preprocess window
+def synthetic_events(rng: random.Random, events: int, history_days: int) -> List[str]:
+    window_days = (PREPROCESS_END.date() - PREPROCESS_START.date()).days + 1
+    history_start = PREPROCESS_START - timedelta(days=history_days)
+
+    vevents = []
+    while len(vevents) < events:
+        uid = f"{len(vevents)}-{rng.getrandbits(64):016x}@benchmark"
+        kind = rng.random()
+
+        # All-day events spanning one to three days
+        if kind < 0.05:
+            start_date = (PREPROCESS_START + timedelta(days=rng.randrange(window_days))).date()
+            end_date = start_date + timedelta(days=rng.randint(1, 3))
+            vevents.append(
+                f"BEGIN:VEVENT\nUID:{uid}\nDTSTART;VALUE=DATE:{start_date:%Y%m%d}\n"
+                f"DTEND;VALUE=DATE:{end_date:%Y%m%d}\nSUMMARY:Conference\nTRANSP:OPAQUE\nEND:VEVENT"
+            )
+
+        # A run of back-to-back 30-minute meetings
+        elif kind < 0.40:
+            start = random_business_time(rng, PREPROCESS_START, window_days)
+            for index in range(min(rng.randint(2, 6), events - len(vevents))):
+                begin = start + timedelta(minutes=30 * index)
+                vevents.append(
+                    f"BEGIN:VEVENT\nUID:{uid}-{index}\nDTSTART:{ics_utc(begin)}\n"
+                    f"DTEND:{ics_utc(begin + timedelta(minutes=30))}\nSUMMARY:Showing\nEND:VEVENT"
+                )
+
+        # One-off meetings, most of them in the past
+        else:
+            in_window = kind < 0.70
+            start = random_business_time(
+                rng,
+                PREPROCESS_START if in_window else history_start,
+                window_days if in_window else history_days,
+            )
+            end = start + timedelta(minutes=rng.choice([15, 30, 45, 60, 90, 120]))
+            vevents.append(
+                f"BEGIN:VEVENT\nUID:{uid}\nDTSTART:{ics_utc(start)}\nDTEND:{ics_utc(end)}\n"
+                f"SUMMARY:Meeting\nDESCRIPTION:Synthetic meeting for benchmarking\nEND:VEVENT"
+            )
+
+    return vevents[:events]
+
+
+# Helper function to write synthetic calendars for `agents` agents with
+# `events` events each, returning the agent_id -> ICS file path config
+def write_synthetic_calendars(directory: Path, agents: int, events: int, history_days: int = 3 * 365, seed: int = 0) -> Dict[int, str]:
+    rng = random.Random(seed)
+    ics_config = dict()
+
+    for agent_id in range(1, agents + 1):
+        ics_file_path = directory / f"agent-{agent_id}.ics"
+        calendar = "\n".join([
+            "BEGIN:VCALENDAR",
+            "VERSION:2.0",
+            "PRODID:-//HouseWhisper//Benchmark//EN",
+            *synthetic_events(rng, events, history_days),
+            "END:VCALENDAR",
+        ])
+        ics_file_path.write_text(calendar.replace("\n", "\r\n") + "\r\n")
+        ics_config[agent_id] = str(ics_file_path)
+
+    return ics_config
+
+
+###########################
+# Measurement and reports #
+###########################
+
+# Helper function to return the p-th percentile of sorted samples
+def percentile(sorted_samples: List[float], p: float) -> float:
+    index = min(len(sorted_samples) - 1, round(p / 100 * (len(sorted_samples) - 1)))
+    return sorted_samples[index]
+
+
+# Helper function to time `function` over `iterations` calls, plus one
+# extra call under tracemalloc to measure its peak memory
+def measure(name: str, function: Callable[[int], object], iterations: int) -> Dict:
+    samples = []
+    for iteration in range(iterations):
+        start = time.perf_counter()
+        function(iteration)
+        samples.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function(iterations)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    samples.sort()
+    total_seconds = sum(samples)
+    return {
+        "name": name,
+        "iterations": iterations,
+        "total_seconds": total_seconds,
+        "throughput_per_second": iterations / total_seconds if total_seconds else float("inf"),
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "peak_memory_bytes": peak_memory,
+    }
+
+
+# Helper function to print a table of results, with the
+# change in p50 latency against a baseline when given one
+def print_results(results: List[Dict], baseline: Optional[Dict] = None):
+    baseline_by_name = {result["name"]: result for result in (baseline or dict()).get("results", [])}
+
+    print(f"{'benchmark':<40} {'ops/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'peak MiB':>10} {'p50 vs base':>12}")
+    for result in results:
+        change = ""
+        if result["name"] in baseline_by_name and baseline_by_name[result["name"]]["p50_ms"]:
+            change = f"{result['p50_ms'] / baseline_by_name[result['name']]['p50_ms']:.2f}x"
+        print(
+            f"{result['name']:<40} {result['throughput_per_second']:>10.1f} {result['p50_ms']:>10.3f} "
+            f"{result['p99_ms']:>10.3f} {result['peak_memory_bytes'] / 2 ** 20:>10.2f} {change:>12}"
+        )
+
+
+# Helper function to return the commit the benchmark ran against
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+##############
+# Benchmarks #
+##############
+
+# Helper function to run every benchmark against `ics_config` and return the results
+def run_benchmarks(ics_config: Dict[int, str], iterations: int, seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed)
+    agent_ids = list(ics_config)
+    sample_ics_file_path = ics_config[agent_ids[0]]
+    window_days = (PREPROCESS_END.date() - PREPROCESS_START.date()).days + 1
+    results = []
+
+    # Parsing and preprocessing
+    results.append(measure("read_ics_file_and_sort_events", lambda _: read_ics_file_and_sort_events(sample_ics_file_path), iterations))
+    results.append(measure("read_ics_events", lambda _: read_ics_events(sample_ics_file_path), iterations))
+    results.append(measure("preprocess_ics_files", lambda _: preprocess_ics_files(ics_config, max_workers=1), max(1, iterations // 10)))
+    results.append(measure("preprocess_ics_files (parallel)", lambda _: preprocess_ics_files(ics_config), max(1, iterations // 10)))
+
+    # Every route, against a datastore that's already been built
+    original_datastore, original_result_cache = main.datastore, main.result_cache
+    main.datastore = AvailabilityStore(ics_config)
+    main.result_cache = ResultCache(
+        original_result_cache.max_entries,
+        original_result_cache.ttl_seconds,
+        original_result_cache.max_slots,
+        original_result_cache.max_entry_slots,
+    )
+    main.datastore.add_listener(main.result_cache.invalidate_agent)
+    main.datastore.refresh()
+
+    try:
+        client = TestClient(main.app)
+
+        def random_day() -> datetime:
+            return PREPROCESS_START.replace(hour=0) + timedelta(days=rng.randrange(window_days))
+
+        def random_slot() -> datetime:
+            return random_business_time(rng, PREPROCESS_START, window_days)
+
+        def check(_):
+            client.get(f"/check/{rng.choice(agent_ids)}/60/{random_slot().isoformat()}")
+
+        def query(_):
+            day = random_day()
+            client.get(f"/query/{rng.choice(agent_ids)}/60/{day.replace(hour=BUSINESS_DAY_START).isoformat()}/{day.replace(hour=BUSINESS_DAY_END).isoformat()}")
+
+        def coordinate(_):
+            agents = rng.sample(agent_ids, min(len(agent_ids), 10))
+            params = "&".join(f"agent_ids={agent_id}" for agent_id in agents)
+            client.get(f"/multi-agent-coordination/60/{PREPROCESS_START.isoformat()}/{PREPROCESS_END.isoformat()}?{params}")
+
+        # The same request over and over, as when the UI polls
+        def cached_coordinate(_):
+            params = "&".join(f"agent_ids={agent_id}" for agent_id in agent_ids[:10])
+            client.get(f"/multi-agent-coordination/60/{PREPROCESS_START.isoformat()}/{PREPROCESS_END.isoformat()}?{params}")
+
+        # The next 5 times any of up to 30 agents can meet
+        def best_slots(_):
+            agents = rng.sample(agent_ids, min(len(agent_ids), 30))
+            params = "&".join(f"agent_ids={agent_id}" for agent_id in agents)
+            client.get(f"/best-slots/60/{PREPROCESS_START.isoformat()}/{PREPROCESS_END.isoformat()}?{params}&k=5")
+
+        # Every agent's utilization for every day of the window
+        def utilization(_):
+            client.get(f"/utilization/{PREPROCESS_START.date().isoformat()}/{PREPROCESS_END.date().isoformat()}")
+
+        def underutilized(_):
+            client.get(f"/underutilized/{rng.choice(agent_ids)}/{random_day().date().isoformat()}")
+
+        def batch(_):
+            client.post("/batch", json={"checks": [
+                {"agent_id": rng.choice(agent_ids), "duration": 60, "start": random_slot().isoformat()}
+                for _ in range(100)
+            ]})
+
+        results.append(measure("GET /check", check, iterations))
+        results.append(measure("GET /query", query, iterations))
+        results.append(measure("GET /multi-agent-coordination", coordinate, iterations))
+        results.append(measure("GET /multi-agent-coordination (cached)", cached_coordinate, iterations))
+        results.append(measure("GET /best-slots", best_slots, iterations))
+        results.append(measure("GET /underutilized", underutilized, iterations))
+        results.append(measure("GET /utilization (every agent)", utilization, iterations))
+        results.append(measure("POST /batch (100 checks)", batch, iterations))
+    finally:
+        main.datastore, main.result_cache = original_datastore, original_result_cache
+
+    return results
+
+
+def run(argv: Optional[List[str]] = None) -> Dict:
+    parser = argparse.ArgumentParser(description="Benchmark preprocessing and every endpoint")
+    parser.add_argument("--agents", type=int, default=50, help="number of synthetic agents")
+    parser.add_argument("--events", type=int, default=200, help="number of events per agent")
+    parser.add_argument("--iterations", type=int, default=200, help="number of timed calls per benchmark")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic calendars and requests")
+    parser.add_argument("--output", type=Path, help="save the results to this JSON file")
+    parser.add_argument("--compare", type=Path, help="compare against results saved by an earlier run")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        ics_config = write_synthetic_calendars(Path(directory), args.agents, args.events, seed=args.seed)
+        results = run_benchmarks(ics_config, args.iterations, seed=args.seed)
+
+    report = {
+        "commit": current_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "agents": args.agents,
+        "events": args.events,
+        "iterations": args.iterations,
+        "results": results,
+    }
+
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    print_results(results, baseline)
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+    return report
+
+
+if __name__ == "__main__":
+    run()
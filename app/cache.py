@@ -0,0 +1,124 @@
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from .metrics import RESULT_CACHE_EVICTIONS, RESULT_CACHE_LOOKUPS
+
+
+# A cache key is (endpoint, agent_ids, duration, range start, range end).
+# The range is kept as ISO 8601 strings since results are returned in the
+# timezone they were requested in, so 08:00-08:00 and 16:00Z differ
+CacheKey = Tuple[str, Tuple[int, ...], int, str, str]
+
+
+# Helper function to build the cache key for a request. The agent_ids are
+# sorted and deduplicated since the order agents are listed in doesn't
+# change which times they're all free
+def result_cache_key(endpoint: str, agent_ids: Iterable[int], duration: int, range_start: datetime, range_end: datetime) -> CacheKey:
+    return endpoint, tuple(sorted(set(agent_ids))), duration, range_start.isoformat(), range_end.isoformat()
+
+
+# LRU cache of endpoint results, so that repeated polls for the same
+# agents, duration and range are answered with a dict lookup. Entries are
+# dropped as soon as any of their agents' availability is rebuilt (see
+# AvailabilityStore.add_listener), so results never go stale. The cache
+# holds at most `max_entries` results and `max_slots` times across all of
+# them, results of more than `max_entry_slots` times aren't cached at all,
+# and entries can optionally expire after `ttl_seconds` as well
+class ResultCache:
+    def __init__(self, max_entries: int, ttl_seconds: float = 0, max_slots: int = 500_000, max_entry_slots: int = 10_000):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_slots = max_slots
+        self.max_entry_slots = max_entry_slots
+        # How many times the cached results hold in total
+        self.slots = 0
+        # key -> (expires at, agent_ids, result), least recently used first
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Tuple[int, ...], List]]" = OrderedDict()
+        self._keys_by_agent: Dict[int, Set[CacheKey]] = dict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # Look up a cached result, or None if there isn't one
+    def get(self, key: CacheKey) -> Optional[List]:
+        endpoint = key[0]
+        cached = self._entries.get(key)
+
+        if cached is not None and self.ttl_seconds > 0 and cached[0] <= time.monotonic():
+            self._remove(key)
+            RESULT_CACHE_EVICTIONS.inc("expired")
+            cached = None
+
+        if cached is None:
+            self.misses += 1
+            RESULT_CACHE_LOOKUPS.inc(endpoint, "miss")
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        RESULT_CACHE_LOOKUPS.inc(endpoint, "hit")
+        return cached[2]
+
+    # Cache a result, evicting the least recently used results if full
+    def put(self, key: CacheKey, result: List):
+        if self.max_entries <= 0:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        # A single large result would push out many small ones
+        if len(result) > min(self.max_entry_slots, self.max_slots):
+            RESULT_CACHE_EVICTIONS.inc("too_large")
+            return
+
+        agent_ids = key[1]
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds > 0 else float("inf")
+        self._entries[key] = (expires_at, agent_ids, result)
+        self.slots += len(result)
+        for agent_id in agent_ids:
+            self._keys_by_agent.setdefault(agent_id, set()).add(key)
+
+        while len(self._entries) > self.max_entries or self.slots > self.max_slots:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+            RESULT_CACHE_EVICTIONS.inc("capacity")
+
+    # Drop every cached result that involves the agent. This is registered
+    # as a datastore listener, so it runs whenever an agent is rebuilt
+    def invalidate_agent(self, agent_id: int):
+        for key in self._keys_by_agent.pop(agent_id, set()):
+            self._remove(key)
+            self.invalidations += 1
+            RESULT_CACHE_EVICTIONS.inc("invalidated")
+
+    def clear(self):
+        self._entries.clear()
+        self._keys_by_agent.clear()
+        self.slots = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    # Helper method to remove an entry and unlink it from its agents
+    def _remove(self, key: Hashable):
+        _, agent_ids, result = self._entries.pop(key)
+        self.slots -= len(result)
+        for agent_id in agent_ids:
+            keys = self._keys_by_agent.get(agent_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_agent[agent_id]
@@ -1,3 +1,4 @@
+import os
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
@@ -12,4 +13,80 @@ DEFAULT_TIMEZONE = PACIFIC_TIMEZONE
 # These datetime values dictate the values that 
 # are populated in the in-memory datastore
 PREPROCESS_START = datetime(2024, 12, 2, 8, 0, tzinfo=PACIFIC_TIMEZONE)
-PREPROCESS_END = datetime(2024, 12, 6, 17, 0, tzinfo=PACIFIC_TIMEZONE)
\ No newline at end of file
+PREPROCESS_END = datetime(2024, 12, 6, 17, 0, tzinfo=PACIFIC_TIMEZONE)
+
+# Which availability engine preprocessing builds for each agent:
+#   "days"      - one uint16 per minute of each day, built the first time
+#                 the day is looked up, for any date. O(1) lookups
+#   "array"     - one uint16 per minute of the window, O(1) lookups
+#   "intervals" - merged busy intervals, O(log events) lookups
+# Only the "days" engine answers lookups outside of the preprocess window
+# and expands recurring events without an end, but it's opt-in: snapshots
+# (SNAPSHOT_PATH), recomputing only the days a calendar change touched,
+# and the shared store (SHARED_STORE_NAME) all need "array" availability,
+# so with "days" every agent is parsed from scratch on startup and on
+# every change, in every worker
+AVAILABILITY_BACKEND = os.environ.get("AVAILABILITY_BACKEND", "array")
+
+# How many days of availability (across every agent) the "days"
+# engine keeps, about 3 KB each, before evicting the least recently used
+DAY_CACHE_SIZE = int(os.environ.get("DAY_CACHE_SIZE", "4096"))
+
+# The range of dates the "days" engine answers lookups for
+HORIZON_START = datetime(1971, 1, 1, tzinfo=PACIFIC_TIMEZONE)
+HORIZON_END = datetime(9999, 12, 30, tzinfo=PACIFIC_TIMEZONE)
+
+# The precomputed availability of every agent is saved to this file
+# and memory-mapped on startup instead of parsing every ICS file
+SNAPSHOT_PATH = os.environ.get("AVAILABILITY_SNAPSHOT_PATH", "availability.snapshot")
+
+# When enabled, the service watches every configured ICS file
+# and rebuilds an agent as soon as its calendar changes
+WATCH_ICS_FILES = os.environ.get("WATCH_ICS_FILES", "0") == "1"
+
+# How many processes preprocess ICS files in parallel
+PREPROCESS_WORKERS = int(os.environ.get("PREPROCESS_WORKERS", os.cpu_count() or 1))
+
+# When enabled, requests, ICS parsing and slot searches are counted and
+# timed, and exposed in the Prometheus text format on /metrics
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+
+# When set, a background thread samples the event loop's stack this often
+# (in milliseconds) and the collapsed stacks are served on /debug/profile
+PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get("PROFILE_SAMPLE_INTERVAL_MS", "0"))
+
+# How many /query and /multi-agent-coordination results are cached (0
+# disables the cache). Results are dropped as soon as any of their agents
+# is rebuilt, and can optionally expire after a number of seconds too
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", "4096"))
+RESULT_CACHE_TTL_SECONDS = float(os.environ.get("RESULT_CACHE_TTL_SECONDS", "0"))
+
+# How many times (about 56 bytes each) the cached results may hold in
+# total before the least recently used results are evicted, and how many
+# times a single result may hold and still be cached (a year of every
+# quarter-hour of the business day is about 13,000)
+RESULT_CACHE_MAX_SLOTS = int(os.environ.get("RESULT_CACHE_MAX_SLOTS", "500000"))
+RESULT_CACHE_MAX_ENTRY_SLOTS = int(os.environ.get("RESULT_CACHE_MAX_ENTRY_SLOTS", "10000"))
+
+# How many agents' calendars are read (or fetched) at once when many agents
+# are refreshed together. Parsing is further bounded by PREPROCESS_WORKERS
+INGEST_CONCURRENCY = int(os.environ.get("INGEST_CONCURRENCY", "16"))
+
+# How long a calendar fetched from a URL is used before it's fetched
+# again (it's only rebuilt if its contents changed), and how long to wait
+# for the server to respond
+REMOTE_ICS_MAX_AGE_SECONDS = float(os.environ.get("REMOTE_ICS_MAX_AGE_SECONDS", "300"))
+REMOTE_ICS_TIMEOUT_SECONDS = float(os.environ.get("REMOTE_ICS_TIMEOUT_SECONDS", "10"))
+
+# When set, the workers of a multi-worker deployment share one copy of
+# every agent's availability in shared memory segments named after this:
+# one worker builds and publishes it, and the others attach to it
+# read-only. Requires the "array" availability backend, and the service
+# won't start with any other
+SHARED_STORE_NAME = os.environ.get("SHARED_STORE_NAME", "")
+
+# How often (in seconds) the worker that builds the shared store checks
+# for changed calendars, and how long the other workers wait for it to
+# publish the first generation on startup
+SHARED_STORE_REFRESH_SECONDS = float(os.environ.get("SHARED_STORE_REFRESH_SECONDS", "5"))
+SHARED_STORE_ATTACH_TIMEOUT_SECONDS = float(os.environ.get("SHARED_STORE_ATTACH_TIMEOUT_SECONDS", "30"))
@@ -0,0 +1,116 @@
+from bisect import bisect_right
+from datetime import datetime
+from heapq import merge
+from typing import Iterable, Iterator, List, Tuple, Union
+
+from .availability import Availability, DayAvailability, IntervalAvailability, from_epoch_minute, localize
+from .search import SLOT_INTERVAL_MINUTES, check_window, slot_chunks, slot_range
+
+
+# Helper function to merge the busy intervals of several agents into one
+# sorted list of non-overlapping intervals, only looking at the intervals
+# that can affect a meeting of `duration` minutes starting between the
+# epoch minutes `first` and `last`
+def union_busy_intervals(availabilities: List[Union[IntervalAvailability, DayAvailability]], first: int, last: int, duration: int) -> Tuple[List[int], List[int]]:
+    busy_starts = []
+    busy_ends = []
+
+    # Start each agent's stream at its first interval that ends after `first`
+    streams = []
+    for availability in availabilities:
+        index = bisect_right(availability.busy_ends, first)
+        streams.append(zip(availability.busy_starts[index:], availability.busy_ends[index:]))
+
+    for start, end in merge(*streams):
+        # The intervals arrive sorted by start, so nothing after
+        # this one can cut short a meeting in the range any more
+        if start >= last + duration:
+            break
+
+        if busy_ends and start <= busy_ends[-1]:
+            busy_ends[-1] = max(busy_ends[-1], end)
+        else:
+            busy_starts.append(start)
+            busy_ends.append(end)
+
+        # Stop once the agents are busy for the rest of the range
+        if busy_starts[-1] <= first and busy_ends[-1] > last:
+            break
+
+    return busy_starts, busy_ends
+
+
+# Helper function to check whether an agent's availability is described
+# entirely by its busy intervals (recurring events aren't expanded into them)
+def has_busy_intervals(availability: Availability) -> bool:
+    if isinstance(availability, DayAvailability):
+        return not availability.series
+    return isinstance(availability, IntervalAvailability)
+
+
+# Helper function to check whether the agents all work the same hours
+def share_working_hours(availabilities: List[Availability]) -> bool:
+    return len({availability.hours for availability in availabilities}) == 1
+
+
+# Helper function to find the slots from epoch minute `first` through
+# `last` at which all of the agents are free for `duration` minutes
+def find_common_slots(availabilities: List[Availability], first: int, last: int, duration: int) -> Iterable[int]:
+    if duration <= 0:
+        return range(first, last + 1, SLOT_INTERVAL_MINUTES)
+
+    # Agents whose busy intervals we have, and who share the same working
+    # hours, are coordinated by merging all of them in one sweep and searching
+    # the gaps that remain, so the cost grows with the total number of events
+    # rather than slots x agents
+    if all(has_busy_intervals(availability) for availability in availabilities) and share_working_hours(availabilities):
+        busy_starts, busy_ends = union_busy_intervals(availabilities, first, last, duration)
+        merged_availability = IntervalAvailability(busy_starts, busy_ends, from_epoch_minute(first), from_epoch_minute(last), availabilities[0].hours)
+        return merged_availability.find_slots(first, last, duration, SLOT_INTERVAL_MINUTES)
+
+    # Otherwise, each agent narrows down the slots that the previous agents
+    # are free for, and we stop as soon as there are no slots left
+    common_slots = availabilities[0].find_slots(first, last, duration, SLOT_INTERVAL_MINUTES)
+    for availability in availabilities[1:]:
+        if not common_slots:
+            break
+        common_slots = availability.filter_slots(common_slots, duration)
+    return common_slots
+
+
+# Helper function to find every quarter-hour between range_start and
+# range_end (inclusive) at which all of the agents are free for `duration`
+# minutes. The results are returned sorted by time
+def find_common_available_times(availabilities: List[Availability], range_start: datetime, range_end: datetime, duration: int) -> List[datetime]:
+    range_start = localize(range_start)
+
+    slots = slot_range(range_start, range_end)
+    if slots is None or not availabilities:
+        return []
+
+    first, last = slots
+    for availability in availabilities:
+        check_window(availability, first, last)
+
+    # Return the times in the same timezone they were requested in
+    return [from_epoch_minute(slot, range_start.tzinfo) for slot in find_common_slots(availabilities, first, last, duration)]
+
+
+# Helper function to find the same times as find_common_available_times(),
+# but lazily and a chunk of the range at a time (see
+# search.iter_available_times()), yielding a list of times per chunk
+def iter_common_available_times(availabilities: List[Availability], range_start: datetime, range_end: datetime, duration: int) -> Iterator[List[datetime]]:
+    range_start = localize(range_start)
+
+    slots = slot_range(range_start, range_end)
+    if slots is None or not availabilities:
+        return iter(())
+
+    first, last = slots
+    for availability in availabilities:
+        check_window(availability, first, last)
+
+    return (
+        [from_epoch_minute(slot, range_start.tzinfo) for slot in find_common_slots(availabilities, chunk_first, chunk_last, duration)]
+        for chunk_first, chunk_last in slot_chunks(first, last)
+    )
@@ -0,0 +1,442 @@
+import asyncio
+import hashlib
+import io
+import os
+import time
+from dataclasses import dataclass
+from datetime import date, tzinfo
+from typing import Awaitable, Callable, Dict, FrozenSet, Hashable, List, Optional, Set, Tuple
+
+from watchfiles import awatch
+
+from .availability import (
+    ArrayAvailability,
+    Availability,
+    build_availability,
+    iter_local_dates,
+    merge_busy_intervals,
+    to_epoch_minute,
+)
+from .constants import AVAILABILITY_BACKEND, DEFAULT_TIMEZONE, INGEST_CONCURRENCY, PREPROCESS_START, PREPROCESS_END
+from .metrics import AGENT_LOOKUPS, AGENT_REBUILDS, AVAILABILITY_BUILD_SECONDS, COALESCED_REFRESHES, ICS_PARSE_SECONDS
+from .shared_store import SharedStorePublisher, SharedStoreReader
+from .snapshot import load_snapshot, write_snapshot
+from .sources import IcsSource, ics_source, source_path
+from .utils import read_agent_events
+from .workers import run_in_process_pool
+from .working_hours import DEFAULT_WORKING_HOURS, WorkingHours, split_agent_config
+
+
+# Each event is identified by its UID and the minutes it spans, so that
+# moving an event shows up as removing the old one and adding the new one
+EventKey = Tuple[str, int, int]
+
+
+# Bookkeeping for a single agent's entry in the datastore
+# so that we can tell when the agent's ICS file has changed
+@dataclass
+class AgentEntry:
+    source: IcsSource
+    # The source's version (e.g. the file's mtime) when it was last
+    # read, or None when the entry was loaded from a snapshot
+    version: Optional[Hashable]
+    content_hash: str
+    availability: Availability
+    # None when the entry was loaded from a snapshot or the shared store
+    event_keys: Optional[FrozenSet[EventKey]] = None
+    # The shared store generation the entry was read from, if it was.
+    # Those entries are kept up to date by the shared store's builder
+    generation: Optional[int] = None
+
+
+# The result of preprocessing a single agent's ICS file.
+# It's built by build_agent(), which may run in a worker process
+@dataclass
+class AgentBuild:
+    version: Hashable
+    content_hash: str
+    # Everything below is None when the content hash hadn't changed
+    event_keys: Optional[FrozenSet[EventKey]] = None
+    busy_starts: Optional[List[int]] = None
+    busy_ends: Optional[List[int]] = None
+    # None when the caller only asked for the agent's events
+    availability: Optional[Availability] = None
+    # How long parsing and building took, since builds that run in a worker
+    # process can't record metrics themselves
+    parse_seconds: float = 0.0
+    build_seconds: float = 0.0
+
+
+# Helper function to preprocess the contents of a single agent's ICS file,
+# read at `version` of its source. When the contents still match
+# `known_content_hash` nothing is parsed, and the availability is only
+# built when `with_availability` is set
+def build_agent(
+    contents: bytes,
+    version: Hashable,
+    known_content_hash: Optional[str] = None,
+    with_availability: bool = True,
+    backend: str = AVAILABILITY_BACKEND,
+    hours: WorkingHours = DEFAULT_WORKING_HOURS,
+) -> AgentBuild:
+    # The version changed, but the contents may not have (e.g. a sync
+    # job rewrote the same calendar), so compare content hashes too
+    content_hash = hashlib.sha256(contents).hexdigest()
+    if content_hash == known_content_hash:
+        return AgentBuild(version=version, content_hash=content_hash)
+
+    # Stream the agent's events that the backend needs, sorted by start time
+    parse_start = time.perf_counter()
+    lines = io.StringIO(contents.decode("utf-8", errors="replace"))
+    sorted_events, series = read_agent_events(lines, backend)
+    busy_starts, busy_ends = merge_busy_intervals((event.start, event.end) for event in sorted_events)
+
+    build_start = time.perf_counter()
+    availability = build_availability(busy_starts, busy_ends, PREPROCESS_START, PREPROCESS_END, backend, series, hours) if with_availability else None
+
+    return AgentBuild(
+        version=version,
+        content_hash=content_hash,
+        event_keys=frozenset((event.uid, event.start, event.end) for event in sorted_events),
+        busy_starts=busy_starts,
+        busy_ends=busy_ends,
+        availability=availability,
+        parse_seconds=build_start - parse_start,
+        build_seconds=time.perf_counter() - build_start,
+    )
+
+
+# In-memory, key-value datastore that holds the results of
+# preprocessing each agent's ICS file.  Entries are built once
+# and only rebuilt when the agent's ICS file actually changes.
+# Each agent's CONFIG entry is either their ICS file's path (or URL,
+# or IcsSource) or a dict that also holds their working hours
+class AvailabilityStore:
+    def __init__(self, config: Dict, backend: str = AVAILABILITY_BACKEND):
+        self.ics_config, self.working_hours = split_agent_config(config)
+        self.sources = {agent_id: ics_source(ics_config_value) for agent_id, ics_config_value in self.ics_config.items()}
+        self.backend = backend
+        self._entries: Dict[int, AgentEntry] = dict()
+        self._listeners: List[Callable[[int], None]] = []
+        # The refresh in flight for each agent, which concurrent lookups share
+        self._refreshes: Dict[int, asyncio.Future] = dict()
+        # Bounds how many agents are read at once on the running event loop
+        self._ingest_limit: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = None
+        # The shared store we read agents from instead of building them, if any
+        self._shared: Optional[SharedStoreReader] = None
+        self._shared_generation = 0
+
+    def __contains__(self, agent_id: int) -> bool:
+        return agent_id in self.ics_config
+
+    # Register a function to call with an agent_id whenever
+    # that agent's availability is (re)built or replaced
+    def add_listener(self, listener: Callable[[int], None]):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[int], None]):
+        self._listeners.remove(listener)
+
+    # Build (or rebuild) every agent whose ICS file has changed.
+    # Returns True when any agent's availability was (re)built
+    def refresh(self) -> bool:
+        rebuilt = False
+        for agent_id in self.ics_config:
+            rebuilt = self.refresh_agent(agent_id) or rebuilt
+        return rebuilt
+
+    # Rebuild a single agent's availability if its ICS file has changed.
+    # Returns True when the agent's availability was (re)built
+    def refresh_agent(self, agent_id: int) -> bool:
+        self._sync_shared()
+        if self.is_fresh(agent_id):
+            return False
+
+        source = self.sources[agent_id]
+        version = source.version()
+        return self._install(agent_id, build_agent(source.read(), version, *self._build_arguments(agent_id)))
+
+    # Same as refresh(), but the agents' calendars are read with async I/O
+    # and preprocessed across the shared process pool, so that the event
+    # loop is never blocked. Lookups of an agent that's already being
+    # refreshed wait for that refresh instead of starting another one.
+    # Returns the agent_ids whose availability was (re)built
+    async def refresh_async(self, agent_ids: Optional[List[int]] = None) -> List[int]:
+        agent_ids = list(self.ics_config) if agent_ids is None else agent_ids
+        self._sync_shared()
+        stale_agent_ids = [agent_id for agent_id in dict.fromkeys(agent_ids) if not self.is_fresh(agent_id)]
+
+        if not stale_agent_ids:
+            return []
+
+        rebuilt = await asyncio.gather(*(self._refresh_coalesced(agent_id) for agent_id in stale_agent_ids))
+        return [agent_id for agent_id, agent_rebuilt in zip(stale_agent_ids, rebuilt) if agent_rebuilt]
+
+    # Check whether an agent's entry is up to date with its ICS file. A
+    # matching version (e.g. the file's mtime) means the file hasn't been
+    # touched since we last built it, so we can skip reading it altogether
+    def is_fresh(self, agent_id: int) -> bool:
+        if agent_id not in self.ics_config:
+            raise LookupError("Unable to find requested agent_id")
+
+        source = self.sources[agent_id]
+        entry = self._entries.get(agent_id)
+
+        if entry is not None and entry.generation is not None:
+            return True
+
+        return entry is not None and entry.source == source and entry.version == source.version()
+
+    # Look up an agent's working hours
+    def working_hours_for(self, agent_id: int) -> WorkingHours:
+        if agent_id not in self.working_hours:
+            raise LookupError("Unable to find requested agent_id")
+        return self.working_hours[agent_id]
+
+    # Look up an agent's availability, rebuilding it first if stale
+    def get(self, agent_id: int) -> Availability:
+        self.refresh_agent(agent_id)
+        AGENT_LOOKUPS.inc(agent_id)
+        return self._entries[agent_id].availability
+
+    # Look up several agents' availability, rebuilding any stale
+    # agents across the process pool without blocking the event loop
+    async def get_async(self, agent_ids: List[int]) -> List[Availability]:
+        await self.refresh_async(list(dict.fromkeys(agent_ids)))
+        for agent_id in agent_ids:
+            AGENT_LOOKUPS.inc(agent_id)
+        return [self._entries[agent_id].availability for agent_id in agent_ids]
+
+    # Helper method to return the refresh in flight for an agent, starting
+    # one if there isn't one. Shielded, so that a cancelled request doesn't
+    # cancel the refresh for the other requests waiting on it
+    def _refresh_coalesced(self, agent_id: int) -> Awaitable[bool]:
+        refresh = self._refreshes.get(agent_id)
+
+        if refresh is None:
+            refresh = self._refreshes[agent_id] = asyncio.ensure_future(self._refresh_agent_async(agent_id))
+            refresh.add_done_callback(lambda _: self._refreshes.pop(agent_id, None))
+        else:
+            COALESCED_REFRESHES.inc(agent_id)
+
+        return asyncio.shield(refresh)
+
+    # Helper method to read and rebuild a single agent without blocking
+    # the event loop. Returns True when the agent's availability was (re)built
+    async def _refresh_agent_async(self, agent_id: int) -> bool:
+        source = self.sources[agent_id]
+
+        async with self._ingest_semaphore():
+            version = source.version()
+            contents = await source.read_async()
+            (build,) = await run_in_process_pool(build_agent, [(contents, version, *self._build_arguments(agent_id))])
+
+        return self._install(agent_id, build)
+
+    # Helper method to return the semaphore bounding how many agents are
+    # read and preprocessed at once, which belongs to the running event loop
+    def _ingest_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._ingest_limit is None or self._ingest_limit[0] is not loop:
+            self._ingest_limit = (loop, asyncio.Semaphore(INGEST_CONCURRENCY))
+        return self._ingest_limit[1]
+
+    # Helper method to return the arguments for build_agent() for an
+    # agent, other than the contents of its ICS file and their version
+    def _build_arguments(self, agent_id: int) -> tuple:
+        source = self.sources[agent_id]
+        entry = self._entries.get(agent_id)
+        hours = self.working_hours[agent_id]
+
+        if entry is None or entry.source != source:
+            return None, True, self.backend, hours
+
+        # When we know which events the agent had before, we'll only
+        # recompute the touched days rather than the whole availability
+        incremental = entry.event_keys is not None and isinstance(entry.availability, ArrayAvailability)
+        return entry.content_hash, not incremental, self.backend, hours
+
+    # Helper method to store the result of build_agent() for an agent.
+    # Returns True when the agent's availability was (re)built
+    def _install(self, agent_id: int, build: AgentBuild) -> bool:
+        entry = self._entries.get(agent_id)
+
+        # The contents hadn't changed, so only the version needs updating
+        if build.event_keys is None:
+            entry.version = build.version
+            return False
+
+        availability = build.availability
+        ICS_PARSE_SECONDS.observe(build.parse_seconds, agent_id)
+
+        # Only the days touched by added or removed events need to be recomputed
+        if availability is None:
+            with AVAILABILITY_BUILD_SECONDS.time(agent_id):
+                previous = entry.availability
+                days = touched_days(entry.event_keys ^ build.event_keys, previous.window_start, previous.window_end, previous.hours.tz)
+                availability = entry.availability.with_days_rebuilt(build.busy_starts, build.busy_ends, days)
+        else:
+            AVAILABILITY_BUILD_SECONDS.observe(build.build_seconds, agent_id)
+
+        AGENT_REBUILDS.inc(agent_id)
+
+        self._entries[agent_id] = AgentEntry(
+            source=self.sources[agent_id],
+            version=build.version,
+            content_hash=build.content_hash,
+            availability=availability,
+            event_keys=build.event_keys,
+        )
+        self._notify(agent_id)
+        return True
+
+    # Helper method to tell every listener that an agent's availability changed
+    def _notify(self, agent_id: int):
+        for listener in self._listeners:
+            listener(agent_id)
+
+    # Watch the configured ICS files and rebuild each agent as soon as
+    # its calendar changes, instead of waiting for the next lookup.
+    # Calendars that aren't local files are refreshed on lookup. The
+    # directories are watched rather than the files, since a file that's
+    # saved by replacing it (as sync tools and editors do) is a new file
+    # that a watch on the old one never hears about
+    async def watch(self):
+        agent_ids_by_path = dict()
+        for agent_id, source in self.sources.items():
+            if source_path(source) is not None:
+                agent_ids_by_path.setdefault(os.path.abspath(source_path(source)), []).append(agent_id)
+
+        if not agent_ids_by_path:
+            return
+
+        async for changes in awatch(*{os.path.dirname(path) for path in agent_ids_by_path}):
+            changed_agent_ids = list(dict.fromkeys(
+                agent_id
+                for _, changed_path in changes
+                for agent_id in agent_ids_by_path.get(os.path.abspath(changed_path), [])
+            ))
+            if not changed_agent_ids:
+                continue
+
+            # A calendar that's mid-rewrite will be picked up on the next change
+            try:
+                await self.refresh_async(changed_agent_ids)
+            except Exception:
+                pass
+
+    # Seed the datastore from a memory-mapped snapshot file. Each agent's
+    # ICS file is still hashed on its first refresh, and only agents whose
+    # calendars changed since the snapshot was written get rebuilt, along
+    # with any agent whose working hours changed since then.
+    # Snapshots hold "array" availability, so other backends ignore them
+    def load_snapshot(self, snapshot_path):
+        if self.backend != "array":
+            return
+
+        window_start = to_epoch_minute(PREPROCESS_START)
+        window_end = to_epoch_minute(PREPROCESS_END)
+
+        for agent_id, (availability, content_hash) in load_snapshot(snapshot_path, window_start, window_end, self.working_hours).items():
+            if agent_id in self.ics_config:
+                self._entries[agent_id] = AgentEntry(
+                    source=self.sources[agent_id],
+                    version=None,
+                    content_hash=content_hash,
+                    availability=availability,
+                )
+                self._notify(agent_id)
+
+    # Write every array-backed agent's availability to a snapshot file
+    def save_snapshot(self, snapshot_path):
+        entries = self._array_entries()
+        if not entries:
+            return
+
+        write_snapshot(
+            snapshot_path,
+            {agent_id: entry.availability for agent_id, entry in entries.items()},
+            {agent_id: entry.content_hash for agent_id, entry in entries.items()},
+        )
+
+    # Publish every array-backed agent's availability as the shared store's
+    # next generation. Returns the generation, or None if there was nothing
+    # to publish
+    def publish_shared(self, publisher: SharedStorePublisher) -> Optional[int]:
+        entries = self._array_entries()
+        if not entries:
+            return None
+
+        return publisher.publish(
+            {agent_id: entry.availability for agent_id, entry in entries.items()},
+            {agent_id: entry.content_hash for agent_id, entry in entries.items()},
+        )
+
+    # Read agents from a shared store that another process builds, rather
+    # than building them here. Agents missing from it are still built here.
+    # The shared store holds "array" availability, so other backends ignore it
+    def follow_shared(self, reader: SharedStoreReader):
+        if self.backend != "array":
+            return
+
+        self._shared = reader
+        self._sync_shared()
+
+    # Helper method to return the entries of every array-backed agent
+    def _array_entries(self) -> Dict[int, AgentEntry]:
+        return {
+            agent_id: entry for agent_id, entry in self._entries.items()
+            if isinstance(entry.availability, ArrayAvailability)
+        }
+
+    # Helper method to move onto the shared store's latest generation,
+    # if we follow one and a new generation was published
+    def _sync_shared(self):
+        if self._shared is None:
+            return
+
+        generation = self._shared.generation()
+        if generation == 0 or generation == self._shared_generation:
+            return
+
+        window_start = to_epoch_minute(PREPROCESS_START)
+        window_end = to_epoch_minute(PREPROCESS_END)
+        agents = self._shared.load(generation, window_start, window_end, self.working_hours)
+        if agents is None:
+            return
+
+        self._shared_generation = generation
+
+        # Agents the builder no longer publishes are built here again
+        for agent_id, entry in list(self._entries.items()):
+            if entry.generation is not None and agent_id not in agents:
+                del self._entries[agent_id]
+
+        for agent_id, (availability, content_hash) in agents.items():
+            if agent_id not in self.ics_config:
+                continue
+
+            entry = self._entries.get(agent_id)
+            self._entries[agent_id] = AgentEntry(
+                source=self.sources[agent_id],
+                version=None,
+                content_hash=content_hash,
+                availability=availability,
+                generation=generation,
+            )
+            if entry is None or entry.content_hash != content_hash:
+                self._notify(agent_id)
+
+
+# Helper function to return the local dates within the window
+# (epoch minutes) that are touched by the given events
+def touched_days(event_keys: Set[EventKey], window_start: int, window_end: int, tz: tzinfo = DEFAULT_TIMEZONE) -> List[date]:
+    days = set()
+
+    for _, start, end in event_keys:
+        start = max(start, window_start)
+        end = min(end - 1, window_end)
+        if start <= end:
+            days.update(iter_local_dates(start, end, tz))
+
+    return sorted(days)
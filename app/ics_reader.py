@@ -0,0 +1,456 @@
+import re
+from calendar import timegm
+from datetime import datetime, timedelta, timezone
+from heapq import merge
+from itertools import takewhile
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from dateutil.rrule import rruleset, rrulestr
+
+from .constants import DEFAULT_TIMEZONE
+
+
+# The only parts of a VEVENT we need downstream: when the agent is
+# busy (as epoch minutes) and the event's UID for diffing calendars
+class IcsEvent(NamedTuple):
+    start: int
+    end: int
+    uid: str
+
+
+# A recurring VEVENT (one with an RRULE or RDATEs). Its occurrences are
+# only generated when they're needed, for the window being looked at
+class IcsSeries(NamedTuple):
+    start: datetime
+    # Seconds each occurrence lasts
+    duration: int
+    uid: str
+    rrule: Optional[str]
+    rdates: Tuple[datetime, ...]
+    # Includes the occurrences that are overridden by another VEVENT
+    exdates: Tuple[datetime, ...]
+
+
+# The events of a calendar: one-off events (and overridden occurrences)
+# sorted by start time, and the recurring events they're merged with
+class IcsCalendar(NamedTuple):
+    events: List[IcsEvent]
+    series: List[IcsSeries]
+
+    # Return every event and occurrence that overlaps the window (epoch
+    # minutes) as one stream sorted by start time. Occurrences are generated
+    # lazily, so an open-ended series only costs as much as the window
+    def iter_events(self, window_start: Optional[int] = None, window_end: Optional[int] = None) -> Iterator[IcsEvent]:
+        events = (event for event in self.events if overlaps_window(event, window_start, window_end))
+        return merge(events, *(iter_occurrences(series, window_start, window_end) for series in self.series))
+
+
+# The properties we pull out of each VEVENT, everything else is skipped
+VEVENT_PROPERTIES = {"DTSTART", "DTEND", "DURATION", "UID", "TRANSP", "RRULE", "RDATE", "EXDATE", "RECURRENCE-ID"}
+
+# Properties that may appear several times in a VEVENT
+MULTI_VALUED_PROPERTIES = {"RDATE", "EXDATE"}
+
+# ISO 8601 durations as used by the DURATION property, e.g. P1D or PT1H30M
+DURATION_PATTERN = re.compile(r"^([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$")
+
+
+# Helper function to read an ICS file one line at a time and yield every
+# VEVENT (or occurrence of a recurring VEVENT) that overlaps the window
+# (epoch minutes) as a compact IcsEvent, sorted by start time. One-off
+# events outside the window are dropped as soon as their times are known,
+# and transparent ("free") events never make the agent busy
+def iter_ics_events(ics_file_path, window_start: Optional[int] = None, window_end: Optional[int] = None) -> Iterator[IcsEvent]:
+    with open(ics_file_path, "r", encoding="utf-8", errors="replace") as file:
+        calendar = read_ics_calendar(file, window_start, window_end)
+    yield from calendar.iter_events(window_start, window_end)
+
+
+# Same as iter_ics_events(), but for the lines of an ICS calendar
+def iter_ics_events_from_lines(lines: Iterable[str], window_start: Optional[int] = None, window_end: Optional[int] = None) -> Iterator[IcsEvent]:
+    return read_ics_calendar(lines, window_start, window_end).iter_events(window_start, window_end)
+
+
+# Helper function to read the lines of an ICS calendar into its one-off
+# events that overlap the window (epoch minutes) and its recurring events,
+# without expanding any of the recurrences
+def read_ics_calendar(lines: Iterable[str], window_start: Optional[int] = None, window_end: Optional[int] = None) -> IcsCalendar:
+    events = []
+    series = []
+    # The occurrences (by UID) that are overridden by another VEVENT
+    overridden: Dict[str, Set[datetime]] = dict()
+
+    # The components we're nested in, e.g. ["VCALENDAR", "VEVENT"]
+    components = []
+    properties = None
+
+    for line in unfold_lines(lines):
+        if line.startswith("BEGIN:"):
+            components.append(line[6:].strip().upper())
+            if components[-1] == "VEVENT":
+                properties = dict()
+            continue
+
+        if line.startswith("END:"):
+            component = components.pop() if components else None
+            if component == "VEVENT" and properties is not None:
+                # An overridden occurrence replaces the one its series would have had
+                if "RECURRENCE-ID" in properties:
+                    recurrence_id = parse_ics_datetime(*properties["RECURRENCE-ID"])
+                    if recurrence_id is not None:
+                        overridden.setdefault(properties.get("UID", (None, ""))[1].strip(), set()).add(recurrence_id)
+                elif "RRULE" in properties or "RDATE" in properties:
+                    recurring = build_series(properties)
+                    if recurring is not None and (window_end is None or to_minute(recurring.start) <= window_end):
+                        series.append(recurring)
+                    properties = None
+                    continue
+
+                event = build_event(properties)
+                properties = None
+                if event is not None and overlaps_window(event, window_start, window_end):
+                    events.append(event)
+            continue
+
+        # Only look at the VEVENT's own properties (not e.g. its VALARMs)
+        if properties is None or components[-1] != "VEVENT":
+            continue
+
+        name, params, value = split_property(line)
+        if name in MULTI_VALUED_PROPERTIES:
+            properties.setdefault(name, []).append((params, value))
+        elif name in VEVENT_PROPERTIES:
+            properties[name] = (params, value)
+
+    # Overrides can appear before or after the event they override
+    series = [
+        recurring._replace(exdates=recurring.exdates + tuple(overridden[recurring.uid]))
+        if recurring.uid in overridden else recurring
+        for recurring in series
+    ]
+
+    events.sort()
+    return IcsCalendar(events, series)
+
+
+# Helper function to read an ICS file and return the events
+# that overlap the window (epoch minutes) sorted by start time
+def read_ics_events(ics_file_path, window_start: Optional[int] = None, window_end: Optional[int] = None) -> List[IcsEvent]:
+    return list(iter_ics_events(ics_file_path, window_start, window_end))
+
+
+# Helper function to undo RFC 5545 line folding, where long lines are
+# continued on the next line after a single leading space or tab
+def unfold_lines(lines: Iterable[str]) -> Iterator[str]:
+    pending = None
+
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and pending is not None:
+            pending += line[1:]
+            continue
+        if pending is not None:
+            yield pending
+        pending = line
+
+    if pending is not None:
+        yield pending
+
+
+# Helper function to split a content line such as
+# "DTSTART;TZID=America/Los_Angeles:20241202T100000"
+# into its name, parameters and value
+def split_property(line: str):
+    # The value starts at the first colon that isn't inside a quoted parameter
+    in_quotes = False
+    for index, character in enumerate(line):
+        if character == '"':
+            in_quotes = not in_quotes
+        elif character == ":" and not in_quotes:
+            break
+    else:
+        return line.upper(), dict(), ""
+
+    name, *raw_params = line[:index].split(";")
+    params = dict()
+    for raw_param in raw_params:
+        key, _, param_value = raw_param.partition("=")
+        params[key.upper()] = param_value.strip('"')
+
+    return name.upper(), params, line[index + 1:]
+
+
+# Helper function to turn the properties of a VEVENT into an
+# IcsEvent, or None if the event doesn't make the agent busy
+def build_event(properties: Dict) -> Optional[IcsEvent]:
+    if "DTSTART" not in properties:
+        return None
+
+    if properties.get("TRANSP", (None, ""))[1].strip().upper() == "TRANSPARENT":
+        return None
+
+    start_params, start_value = properties["DTSTART"]
+    start = parse_ics_timestamp(start_params, start_value)
+    if start is None:
+        return None
+
+    if "DTEND" in properties:
+        end = parse_ics_timestamp(*properties["DTEND"])
+    elif "DURATION" in properties:
+        duration = parse_ics_duration(properties["DURATION"][1])
+        end = start + duration if duration is not None else None
+    # Without an end, an all-day event lasts the day and anything else is instantaneous
+    elif is_date_value(start_params, start_value):
+        end = start + 24 * 60 * 60
+    else:
+        end = start
+
+    if end is None:
+        return None
+
+    uid = properties.get("UID", (None, ""))[1].strip()
+
+    # Round partial minutes up so the agent is busy for all of them
+    return IcsEvent(start // 60, -(-end // 60), uid)
+
+
+# Helper function to turn the properties of a recurring VEVENT into an
+# IcsSeries, or None if the event doesn't make the agent busy
+def build_series(properties: Dict) -> Optional[IcsSeries]:
+    if properties.get("TRANSP", (None, ""))[1].strip().upper() == "TRANSPARENT":
+        return None
+
+    # The first occurrence lasts as long as every other one
+    first = build_event(properties)
+    start = parse_ics_datetime(*properties["DTSTART"]) if "DTSTART" in properties else None
+    if first is None or start is None:
+        return None
+
+    rrule = properties["RRULE"][1].strip() if "RRULE" in properties else None
+
+    return IcsSeries(
+        start=start,
+        duration=(first.end - first.start) * 60,
+        uid=first.uid,
+        rrule=normalize_until(rrule, start) if rrule else None,
+        rdates=tuple(parse_ics_datetimes(properties.get("RDATE", []))),
+        exdates=tuple(parse_ics_datetimes(properties.get("EXDATE", []))),
+    )
+
+
+# Helper function to yield every occurrence of a series that overlaps the
+# window (epoch minutes) as an IcsEvent, sorted by start time. Occurrences
+# are generated one at a time, so a series with no end is fine as long as
+# the window has one
+def iter_occurrences(series: IcsSeries, window_start: Optional[int] = None, window_end: Optional[int] = None) -> Iterator[IcsEvent]:
+    if window_end is None and is_unbounded(series):
+        raise ValueError(f"Unable to expand the recurring event {series.uid} without an end to the window")
+
+    # Occurrences that start before the window may still run into it
+    if window_start is None:
+        occurrences = iter(recurrence_set(series))
+    else:
+        after = datetime.fromtimestamp(window_start * 60 - series.duration, tz=timezone.utc)
+        occurrences = recurrence_set(series, after).xafter(after, inc=False)
+
+    for occurrence in takewhile(lambda occurrence: window_end is None or to_minute(occurrence) <= window_end, occurrences):
+        start = int(occurrence.timestamp())
+        event = IcsEvent(start // 60, -(-(start + series.duration) // 60), series.uid)
+        if overlaps_window(event, window_start, window_end):
+            yield event
+
+
+# Helper function to build the set of occurrences of a series. The first
+# occurrence is always DTSTART, even when it doesn't match the RRULE, and
+# any EXDATE removes an occurrence. When only the occurrences after `after`
+# are needed, the RRULE starts as close to it as it can (see
+# rule_start_near()) instead of repeating every occurrence since DTSTART.
+# Nothing is cached, so a series takes the same memory whenever it's looked at
+def recurrence_set(series: IcsSeries, after: Optional[datetime] = None) -> rruleset:
+    occurrences = rruleset()
+
+    if series.rrule:
+        rule_start = rule_start_near(series.rrule, series.start, after) if after is not None else series.start
+        occurrences.rrule(rrulestr(series.rrule, dtstart=rule_start))
+    occurrences.rdate(series.start)
+    for rdate in series.rdates:
+        occurrences.rdate(rdate)
+    for exdate in series.exdates:
+        occurrences.exdate(exdate)
+
+    return occurrences
+
+
+# How many days each period of a DAILY or WEEKLY rule lasts
+RULE_PERIOD_DAYS = {"DAILY": 1, "WEEKLY": 7}
+
+# How many months each period of a MONTHLY or YEARLY rule lasts
+RULE_PERIOD_MONTHS = {"MONTHLY": 1, "YEARLY": 12}
+
+
+# Helper function to return a DTSTART for an RRULE that repeats the same
+# occurrences from `after` onwards as starting it at `start` would, moved
+# forward by whole periods (INTERVAL x FREQ) of the rule. Moving by whole
+# periods keeps the rule's day, weekday and time, and stopping at least one
+# period short of `after` keeps every occurrence of the period it lands in
+# that could be after `after`. Rules with a COUNT, which counts from the
+# real DTSTART, and rules with shorter periods keep their DTSTART
+def rule_start_near(rrule: str, start: datetime, after: datetime) -> datetime:
+    parts = dict(part.partition("=")[::2] for part in rrule.upper().split(";"))
+    freq = parts.get("FREQ")
+    interval = int(parts.get("INTERVAL") or 1)
+
+    if "COUNT" in parts or interval <= 0:
+        return start
+
+    # Count periods in the rule's own wall-clock time
+    after = after.astimezone(start.tzinfo) if start.tzinfo is not None else after.replace(tzinfo=None)
+
+    if freq in RULE_PERIOD_DAYS:
+        period_days = RULE_PERIOD_DAYS[freq] * interval
+        periods = (after.replace(tzinfo=None) - start.replace(tzinfo=None)).days // period_days - 1
+        return start + timedelta(days=periods * period_days) if periods > 0 else start
+
+    if freq in RULE_PERIOD_MONTHS:
+        period_months = RULE_PERIOD_MONTHS[freq] * interval
+        periods = ((after.year - start.year) * 12 + after.month - start.month) // period_months - 1
+
+        # Step back a period at a time until the month has the start's day (e.g. the 31st or February 29th)
+        for periods in range(periods, max(periods - 8, 0), -1):
+            months = start.month - 1 + periods * period_months
+            try:
+                return start.replace(year=start.year + months // 12, month=months % 12 + 1)
+            except ValueError:
+                continue
+
+    return start
+
+
+# Helper function to check whether a series repeats forever
+def is_unbounded(series: IcsSeries) -> bool:
+    rrule = (series.rrule or "").upper()
+    return bool(rrule) and "COUNT=" not in rrule and "UNTIL=" not in rrule
+
+
+# Helper function to rewrite a floating or all-day UNTIL in an RRULE as
+# UTC, which dateutil requires when DTSTART has a timezone
+def normalize_until(rrule: str, start: datetime) -> str:
+    def to_utc(match):
+        value = match.group(1)
+        if value.endswith("Z"):
+            return match.group(0)
+        # An all-day UNTIL includes the whole of that day
+        if len(value) == 8:
+            value += "T235959"
+        until = datetime.strptime(value, "%Y%m%dT%H%M%S").replace(tzinfo=start.tzinfo)
+        return "UNTIL=" + until.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+    return re.sub(r"UNTIL=([0-9TZ]+)", to_utc, rrule, flags=re.IGNORECASE)
+
+
+# Helper function to parse the comma-separated values of RDATE/EXDATE
+# properties. PERIOD values only count the moment they start
+def parse_ics_datetimes(values: List[Tuple[Dict, str]]) -> Iterator[datetime]:
+    for params, value in values:
+        for item in value.split(","):
+            parsed = parse_ics_datetime(params, item.split("/")[0])
+            if parsed is not None:
+                yield parsed
+
+
+# Helper function to convert a datetime into epoch minutes
+def to_minute(value: datetime) -> int:
+    return int(value.timestamp()) // 60
+
+
+# Helper function to check whether a DTSTART/DTEND holds a DATE (all-day) value
+def is_date_value(params: Dict, value: str) -> bool:
+    return params.get("VALUE", "").upper() == "DATE" or len(value.strip()) == 8
+
+
+# Helper function to convert a DTSTART/DTEND value into seconds since the epoch.
+#
+# - UTC values (ending in "Z") are converted directly
+# - Values with a TZID are read in that timezone
+# - Floating values are read in the Default/Pacific timezone
+# - DATE values are read as midnight UTC, which matches how the
+#   `ics` library has always interpreted all-day events for us
+def parse_ics_timestamp(params: Dict, value: str) -> Optional[int]:
+    value = value.strip()
+
+    try:
+        year, month, day = int(value[0:4]), int(value[4:6]), int(value[6:8])
+
+        if is_date_value(params, value):
+            return timegm((year, month, day, 0, 0, 0))
+
+        hour, minute, second = int(value[9:11]), int(value[11:13]), int(value[13:15])
+
+        if value.endswith("Z"):
+            return timegm((year, month, day, hour, minute, second))
+
+        local_time = datetime(year, month, day, hour, minute, second, tzinfo=ics_timezone(params.get("TZID")))
+        return int(local_time.timestamp())
+    except ValueError:
+        return None
+
+
+# Same as parse_ics_timestamp(), but returns a timezone-aware datetime in
+# the timezone the value was written in, which recurrences are expanded in
+def parse_ics_datetime(params: Dict, value: str) -> Optional[datetime]:
+    value = value.strip()
+
+    try:
+        year, month, day = int(value[0:4]), int(value[4:6]), int(value[6:8])
+
+        if is_date_value(params, value):
+            return datetime(year, month, day, tzinfo=timezone.utc)
+
+        hour, minute, second = int(value[9:11]), int(value[11:13]), int(value[13:15])
+
+        if value.endswith("Z"):
+            return datetime(year, month, day, hour, minute, second, tzinfo=timezone.utc)
+
+        return datetime(year, month, day, hour, minute, second, tzinfo=ics_timezone(params.get("TZID")))
+    except ValueError:
+        return None
+
+
+# Helper function to look up a TZID, falling back to the
+# Default/Pacific timezone for floating or unknown timezones
+def ics_timezone(tzid: Optional[str]):
+    if not tzid:
+        return DEFAULT_TIMEZONE
+
+    try:
+        return ZoneInfo(tzid)
+    except (ZoneInfoNotFoundError, ValueError):
+        return DEFAULT_TIMEZONE
+
+
+# Helper function to convert a DURATION value into seconds
+def parse_ics_duration(value: str) -> Optional[int]:
+    match = DURATION_PATTERN.match(value.strip())
+    if match is None:
+        return None
+
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    duration = timedelta(
+        weeks=int(weeks or 0),
+        days=int(days or 0),
+        hours=int(hours or 0),
+        minutes=int(minutes or 0),
+        seconds=int(seconds or 0),
+    )
+    total_seconds = int(duration.total_seconds())
+    return -total_seconds if sign == "-" else total_seconds
+
+
+# Helper function to check whether an event overlaps the window
+def overlaps_window(event: IcsEvent, window_start: Optional[int], window_end: Optional[int]) -> bool:
+    if window_start is not None and event.end <= window_start:
+        return False
+    if window_end is not None and event.start > window_end:
+        return False
+    return True
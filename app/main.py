@@ -1,14 +1,52 @@
-from datetime import date, datetime, time, timedelta
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager, suppress
+from datetime import date, datetime
 from fastapi import FastAPI, HTTPException, Query
-from typing import Annotated
-
-from .constants import BUSINESS_DAY_START, BUSINESS_DAY_END, DEFAULT_TIMEZONE
-from .utils import preprocess_ics_files
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from typing import Annotated, AsyncIterator, Dict, Iterator, List
+
+from .analytics import utilization_csv, utilization_report, utilization_table
+from .availability import from_epoch_minute, localize
+from .cache import ResultCache, result_cache_key
+from .constants import (
+    PROFILE_SAMPLE_INTERVAL_MS,
+    RESULT_CACHE_MAX_ENTRY_SLOTS,
+    RESULT_CACHE_MAX_SLOTS,
+    RESULT_CACHE_SIZE,
+    RESULT_CACHE_TTL_SECONDS,
+    SHARED_STORE_ATTACH_TIMEOUT_SECONDS,
+    SHARED_STORE_NAME,
+    SHARED_STORE_REFRESH_SECONDS,
+    SNAPSHOT_PATH,
+    WATCH_ICS_FILES,
+)
+from .coordination import find_common_available_times, iter_common_available_times
+from .datastore import AvailabilityStore
+from .metrics import INTERSECTION_SECONDS, REPORT_SECONDS, SLOT_SEARCH_SECONDS, MetricsMiddleware, StackSampler, registry
+from .models import BatchRequest, BatchResponse, BestSlot, CheckResult, QueryResult
+from .ranking import find_best_slots
+from .search import find_available_times, iter_available_times
+from .shared_store import SharedStorePublisher, SharedStoreReader, acquire_builder_lock
+from .workers import shutdown_process_pool
 
 
 # We'll create a default set of calendars 
 # for each of our agents that's mapped by 
-# agent_id to ICS filename
+# agent_id to ICS filename (or an http(s) URL,
+# or any sources.IcsSource). Agents who don't
+# work the default business hours (8 am - 5 pm
+# Pacific, every day) are given a dict instead:
+#
+#   5: {
+#       "ics_file_path": "janedoe.ics",
+#       "working_hours": {
+#           "timezone": "America/New_York",
+#           "hours": {"mon": "09:00-17:00", "tue": "09:00-17:00", "fri": ["09:00-12:00", "13:00-15:00"]},
+#           "holidays": ["2024-12-25"],
+#       },
+#   },
 CONFIG = {
     1: "janedoe.ics", 
     2: "jilldoe.ics", 
@@ -19,9 +57,112 @@ CONFIG = {
 # We'll create an in-memory, key-value 
 # datastore that we'll use to store the
 # results of preprocessing ICS files
-datastore = dict()
+datastore = AvailabilityStore(CONFIG)
+
+# Results of /query and /multi-agent-coordination, dropped
+# whenever the datastore rebuilds any of their agents
+result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL_SECONDS, RESULT_CACHE_MAX_SLOTS, RESULT_CACHE_MAX_ENTRY_SLOTS)
+datastore.add_listener(result_cache.invalidate_agent)
+
+# Samples the event loop's stack while the app is running,
+# when PROFILE_SAMPLE_INTERVAL_MS is set
+profiler = StackSampler(PROFILE_SAMPLE_INTERVAL_MS / 1000) if PROFILE_SAMPLE_INTERVAL_MS > 0 else None
+
+
+# Whether the workers of a multi-worker deployment share one copy of
+# every agent's availability (see shared_store.py)
+SHARE_STORE = bool(SHARED_STORE_NAME)
+
+
+# Publish the datastore to the shared store, and publish it again whenever
+# any agent is rebuilt, checking for changed calendars periodically
+async def publish_shared_store(publisher: SharedStorePublisher):
+    rebuilt_agent_ids = set()
+    datastore.add_listener(rebuilt_agent_ids.add)
+
+    try:
+        datastore.publish_shared(publisher)
+        while True:
+            await asyncio.sleep(SHARED_STORE_REFRESH_SECONDS)
+
+            # A calendar that's mid-rewrite will be picked up next time
+            try:
+                await datastore.refresh_async()
+            except Exception:
+                pass
+
+            if rebuilt_agent_ids:
+                rebuilt_agent_ids.clear()
+                datastore.publish_shared(publisher)
+    finally:
+        datastore.remove_listener(rebuilt_agent_ids.add)
+
+
+# Wait for the builder to publish the shared store's first generation,
+# then read agents from it. If it takes too long, agents are built here
+# until it does
+async def follow_shared_store(reader: SharedStoreReader):
+    deadline = time.monotonic() + SHARED_STORE_ATTACH_TIMEOUT_SECONDS
+    while reader.generation() == 0 and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+
+    datastore.follow_shared(reader)
+
+
+# Preprocess every agent's ICS file once at startup so that
+# requests only need to look up the cached availability. The
+# snapshot lets restarts skip parsing calendars that haven't changed.
+# When the workers share a store, one of them does this and publishes
+# the result, and the others read it from shared memory
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Only the "array" backend can be shared, and quietly building a copy
+    # in every worker instead is what the shared store is there to prevent
+    if SHARED_STORE_NAME and datastore.backend != "array":
+        raise ValueError(f"SHARED_STORE_NAME requires the array availability backend, not {datastore.backend!r}")
+
+    builder_lock = acquire_builder_lock(SHARED_STORE_NAME) if SHARE_STORE else None
+    reader = SharedStoreReader(SHARED_STORE_NAME) if SHARE_STORE and builder_lock is None else None
+
+    if reader is not None:
+        await follow_shared_store(reader)
+    else:
+        datastore.load_snapshot(SNAPSHOT_PATH)
+        if await datastore.refresh_async():
+            datastore.save_snapshot(SNAPSHOT_PATH)
+
+    # Rebuild agents in the background as their calendars change
+    watcher = asyncio.create_task(datastore.watch()) if WATCH_ICS_FILES and reader is None else None
+
+    publisher = SharedStorePublisher(SHARED_STORE_NAME) if builder_lock is not None else None
+    shared_builder = asyncio.create_task(publish_shared_store(publisher)) if publisher is not None else None
+
+    if profiler is not None:
+        profiler.start()
 
-app = FastAPI()
+    yield
+
+    if profiler is not None:
+        profiler.stop()
+
+    if watcher is not None:
+        watcher.cancel()
+
+    if shared_builder is not None:
+        shared_builder.cancel()
+        with suppress(asyncio.CancelledError):
+            await shared_builder
+        publisher.close()
+        builder_lock.close()
+
+    if reader is not None:
+        reader.close()
+
+    shutdown_process_pool()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 
 
 @app.get("/check/{agent_id}/{duration}/{start_datetime_in_default_tz}")
@@ -29,26 +170,11 @@ async def check(agent_id: int, duration: int, start_datetime_in_default_tz: date
     try:
         requested_time = start_datetime_in_default_tz
 
-        # Preprocess ICS files for query
-        datastore = preprocess_ics_files(CONFIG)
-
-        # Check for the agent's availability Dict
-        if agent_id not in datastore:
-            raise LookupError("Unable to find requested agent_id")
-        
-        # Check for the Date's availability Dict
-        if requested_time.date() not in datastore[agent_id]:
-            raise LookupError("Unable to find requested nested Date Dict")
-
-        # Check for the Hour's availability Dict
-        if requested_time.hour not in datastore[agent_id][requested_time.date()]:
-            raise LookupError("Unable to find requested nested Hour Dict")
-            
-        # Check for the Minutes's availability duratiion
-        if requested_time.minute not in datastore[agent_id][requested_time.date()][requested_time.hour]:
-            raise LookupError("Unable to find requested nested Minute Duration")
-
-        min_available = datastore[agent_id][requested_time.date()][requested_time.hour][requested_time.minute]
+        # Look up the agent's preprocessed availability
+        (agent_availability,) = await datastore.get_async([agent_id])
+
+        # Look up how many minutes the agent is free at this time
+        min_available = agent_availability.minutes_free(requested_time)
         is_available = min_available >= duration
         response = "Yes, that meeting time is available!" if is_available else "Sorry, that meeting time is no longer available."
 
@@ -57,61 +183,61 @@ async def check(agent_id: int, duration: int, start_datetime_in_default_tz: date
         return HTTPException(status_code=404, detail=str(e))
 
 
+# Helper function to check the format a search's times are returned in:
+# "json" returns them all at once, and "ndjson" streams them
+def check_search_format(format: str):
+    if format not in ("json", "ndjson"):
+        raise ValueError("The format must be json or ndjson")
+
+
+# Helper function to write out the chunks of times a streamed search finds
+# as newline-delimited JSON, one {"available_time": ...} object per line,
+# as soon as each chunk is searched. Control returns to the event loop
+# between chunks, so other requests are served during a long stream, and a
+# client that disconnects stops the search at the next chunk
+async def stream_available_times(chunks: Iterator[List[datetime]]) -> AsyncIterator[str]:
+    for available_times in chunks:
+        if available_times:
+            yield "".join(json.dumps({"available_time": available_time.isoformat()}) + "\n" for available_time in available_times)
+        await asyncio.sleep(0)
+
+
 @app.get("/query/{agent_id}/{duration}/{time_range_start_datetime_in_default_tz}/{time_range_end_datetime_in_default_tz}")
-async def query(agent_id: int, duration: int, time_range_start_datetime_in_default_tz: datetime, time_range_end_datetime_in_default_tz: datetime):
+async def query(agent_id: int, duration: int, time_range_start_datetime_in_default_tz: datetime, time_range_end_datetime_in_default_tz: datetime, format: str = "json"):
 
     try:
-        # Preprocess ICS files for query
-        datastore = preprocess_ics_files(CONFIG)
-
-        # List to store our return value
-        available_times = []
-
-        # Create a pointer to iterate through the datastore
-        time_pointer = time_range_start_datetime_in_default_tz
-
-        # Set time_pointer to the start of the following quarter-hour
-        # so that we can suggest times at quarter-hour intervales
-        if time_pointer.minute > 0:
-            if time_pointer.minute < 15:
-                time_pointer = time_pointer.replace(minute=15)
-            elif time_pointer.minute < 30:
-                time_pointer = time_pointer.replace(minute=30)
-            elif time_pointer.minute < 45:
-                time_pointer = time_pointer.replace(minute=45)
-            else:
-                time_pointer += timedelta(hours=1)
-                time_pointer = time_pointer.replace(minute=0)
-
-        # Iterate from time_range_start to time_range_end
-        while time_pointer <= time_range_end_datetime_in_default_tz:
-            print(f"Checking {time_pointer}")
-
-            # Check for the agent's availability Dict
-            if agent_id not in datastore:
-                raise LookupError("Unable to find requested agent_id")
-            
-            # Check for the Date's availability Dict
-            if time_pointer.date() not in datastore[agent_id]:
-                raise LookupError("Unable to find requested nested Date Dict")
-
-            # Check for the Hour's availability Dict
-            if time_pointer.hour not in datastore[agent_id][time_pointer.date()]:
-                raise LookupError("Unable to find requested nested Hour Dict")
-                
-            # Check for the Minutes's availability duratiion
-            if time_pointer.minute not in datastore[agent_id][time_pointer.date()][time_pointer.hour]:
-                raise LookupError("Unable to find requested nested Minute Duration")
-
-            min_available = datastore[agent_id][time_pointer.date()][time_pointer.hour][time_pointer.minute]
-            is_available = min_available >= duration
-
-            if is_available:
-                available_times.append(time_pointer)
- 
-            # Increment by quarter-hour increments
-            time_pointer += timedelta(minutes=15)
-
+        check_search_format(format)
+
+        # Look up the agent's preprocessed availability. This rebuilds
+        # the agent first if its calendar changed, which also drops any
+        # of its cached results
+        (agent_availability,) = await datastore.get_async([agent_id])
+
+        # Stream the times as they're found instead, which keeps memory flat
+        # however long the range is. Streamed results aren't cached
+        if format == "ndjson":
+            chunks = iter_available_times(
+                agent_availability,
+                time_range_start_datetime_in_default_tz,
+                time_range_end_datetime_in_default_tz,
+                duration,
+            )
+            return StreamingResponse(stream_available_times(chunks), media_type="application/x-ndjson")
+
+        cache_key = result_cache_key("query", [agent_id], duration, time_range_start_datetime_in_default_tz, time_range_end_datetime_in_default_tz)
+        available_times = result_cache.get(cache_key)
+
+        # Find every quarter-hour from time_range_start to
+        # time_range_end in a single pass over the agent's availability
+        if available_times is None:
+            with SLOT_SEARCH_SECONDS.time("query"):
+                available_times = find_available_times(
+                    agent_availability,
+                    time_range_start_datetime_in_default_tz,
+                    time_range_end_datetime_in_default_tz,
+                    duration,
+                )
+            result_cache.put(cache_key, available_times)
 
         return {"available_times": available_times}
     except Exception as e:
@@ -119,156 +245,232 @@ async def query(agent_id: int, duration: int, time_range_start_datetime_in_defau
 
 
 @app.get("/multi-agent-coordination/{duration}/{time_range_start_datetime_in_default_tz}/{time_range_end_datetime_in_default_tz}")
-async def coordinate(duration: int, time_range_start_datetime_in_default_tz: datetime, time_range_end_datetime_in_default_tz: datetime, agent_ids: Annotated[list[str] | None, Query()]):
+async def coordinate(duration: int, time_range_start_datetime_in_default_tz: datetime, time_range_end_datetime_in_default_tz: datetime, agent_ids: Annotated[list[str] | None, Query()], format: str = "json"):
     # List to store our return value
     available_times = []
 
     try:
         if agent_ids is None or len(agent_ids) < 2:
             raise ValueError("You must specify at least two agent_ids")
-
-        # Preprocess ICS files for query
-        datastore = preprocess_ics_files(CONFIG)
-
-        # Create a Dict to store lists of when each specified agent is available
-        agent_available_times = dict()
-        for agent_id in agent_ids:
-            # Convert to an int
-            agent_id = int(agent_id)
-            # Create a new list for the agent_id
-            agent_available_times[agent_id] = []
-
-        # Create a pointer to iterate through the datastore
-        time_pointer = time_range_start_datetime_in_default_tz
-
-        # Set time_pointer to the start of the following quarter-hour
-        # so that we can suggest times at quarter-hour intervales
-        if time_pointer.minute > 0:
-            if time_pointer.minute < 15:
-                time_pointer = time_pointer.replace(minute=15)
-            elif time_pointer.minute < 30:
-                time_pointer = time_pointer.replace(minute=30)
-            elif time_pointer.minute < 45:
-                time_pointer = time_pointer.replace(minute=45)
-            else:
-                time_pointer += timedelta(hours=1)
-                time_pointer = time_pointer.replace(minute=0)
-
-        # Iterate from time_range_start to time_range_end
-        while time_pointer <= time_range_end_datetime_in_default_tz:
-            print(f"Checking {time_pointer}")
-
-            for agent_id in agent_ids:
-                # Convert to an int
-                agent_id = int(agent_id)
-
-                # Check for the agent's availability Dict
-                if agent_id not in datastore:
-                    raise LookupError("Unable to find requested agent_id")
-                
-                # Check for the Date's availability Dict
-                if time_pointer.date() not in datastore[agent_id]:
-                    raise LookupError("Unable to find requested nested Date Dict")
-
-                # Check for the Hour's availability Dict
-                if time_pointer.hour not in datastore[agent_id][time_pointer.date()]:
-                    raise LookupError("Unable to find requested nested Hour Dict")
-                    
-                # Check for the Minutes's availability duratiion
-                if time_pointer.minute not in datastore[agent_id][time_pointer.date()][time_pointer.hour]:
-                    raise LookupError("Unable to find requested nested Minute Duration")
-
-                min_available = datastore[agent_id][time_pointer.date()][time_pointer.hour][time_pointer.minute]
-                is_available = min_available >= duration
-
-                if is_available:
-                    agent_available_times[agent_id].append(time_pointer)
-    
-                # Increment by quarter-hour increments
-                time_pointer += timedelta(minutes=15)
-
-        available_times_set = None
-        for agent_id in agent_ids:
-            # Convert to an int
-            agent_id = int(agent_id)
-
-            if available_times_set is None:
-                # For the first agent with available times, we accept all times and store them in a set
-                available_times_list = agent_available_times[agent_id]
-                available_times_set = set(available_times_list) if available_times_list is not None else None
-            else:
-                # For every other agent, we use set intersection to narrow the available_times_set 
-                available_times_list = agent_available_times[agent_id]
-                available_times_set = available_times_set.intersection(set(available_times_list))
-        
-        available_times = list(available_times_set)
+        check_search_format(format)
+
+        # Look up each specified agent's preprocessed availability,
+        # converting the agent_ids to ints and skipping duplicates
+        unique_agent_ids = list(dict.fromkeys(int(agent_id) for agent_id in agent_ids))
+        agent_availabilities = await datastore.get_async(unique_agent_ids)
+
+        # Stream the times as they're found instead (see query())
+        if format == "ndjson":
+            chunks = iter_common_available_times(
+                agent_availabilities,
+                time_range_start_datetime_in_default_tz,
+                time_range_end_datetime_in_default_tz,
+                duration,
+            )
+            return StreamingResponse(stream_available_times(chunks), media_type="application/x-ndjson")
+
+        cache_key = result_cache_key("coordinate", unique_agent_ids, duration, time_range_start_datetime_in_default_tz, time_range_end_datetime_in_default_tz)
+        available_times = result_cache.get(cache_key)
+
+        # Find the quarter-hours when every agent is available in one sweep
+        if available_times is None:
+            with INTERSECTION_SECONDS.time("coordinate"):
+                available_times = find_common_available_times(
+                    agent_availabilities,
+                    time_range_start_datetime_in_default_tz,
+                    time_range_end_datetime_in_default_tz,
+                    duration,
+                )
+            result_cache.put(cache_key, available_times)
 
         return {"available_times": available_times}
     except Exception as e:
         return HTTPException(status_code=404, detail=str(e))
 
 
+@app.get("/best-slots/{duration}/{time_range_start_datetime_in_default_tz}/{time_range_end_datetime_in_default_tz}")
+async def best_slots(duration: int, time_range_start_datetime_in_default_tz: datetime, time_range_end_datetime_in_default_tz: datetime, agent_ids: Annotated[list[str] | None, Query()], k: int = 5, rank: str = "earliest"):
+    try:
+        if not agent_ids:
+            raise ValueError("You must specify at least one agent_id")
+
+        # Look up each specified agent's preprocessed availability,
+        # converting the agent_ids to ints and skipping duplicates
+        unique_agent_ids = list(dict.fromkeys(int(agent_id) for agent_id in agent_ids))
+        agent_availabilities = await datastore.get_async(unique_agent_ids)
+
+        # Find the K best quarter-hours at which any of the agents is free,
+        # stopping as soon as they can no longer be beaten
+        with SLOT_SEARCH_SECONDS.time("best_slots"):
+            ranked_slots = find_best_slots(
+                dict(zip(unique_agent_ids, agent_availabilities)),
+                time_range_start_datetime_in_default_tz,
+                time_range_end_datetime_in_default_tz,
+                duration,
+                k,
+                rank,
+            )
+
+        # Return the times in the same timezone they were requested in
+        tz = localize(time_range_start_datetime_in_default_tz).tzinfo
+        return {"best_slots": [
+            BestSlot(
+                agent_id=slot.agent_id,
+                start=from_epoch_minute(slot.start, tz),
+                free_minutes=slot.free_minutes,
+                back_to_back=slot.back_to_back,
+            )
+            for slot in ranked_slots
+        ]}
+    except Exception as e:
+        return HTTPException(status_code=404, detail=str(e))
+
+
 @app.get("/underutilized/{agent_id}/{date_to_check}")
 async def underutilized(agent_id: int, date_to_check: date):
     try:
-        # Preprocess ICS files for query
-        datastore = preprocess_ics_files(CONFIG)
-
-        # List to store our return value
-        available_times = []
+        # Look up the agent's preprocessed availability
+        (agent_availability,) = await datastore.get_async([agent_id])
 
         # Set the duration we'll check for to 60 so that we
         # only identify blocks of 1-hour or more as underutilized
         duration = 60
 
-        # Create a pointer to iterate through the datastore
-        # starting at the beginning of date_to_check
-        time_pointer = datetime.combine(date_to_check, time(BUSINESS_DAY_START, 0), tzinfo=DEFAULT_TIMEZONE)
-        time_pointer_end = datetime.combine(date_to_check, time(BUSINESS_DAY_END, 0), tzinfo=DEFAULT_TIMEZONE)
-
-        # Set time_pointer to the start of the following quarter-hour
-        # so that we can suggest times at quarter-hour intervales
-        if time_pointer.minute > 0:
-            if time_pointer.minute < 15:
-                time_pointer = time_pointer.replace(minute=15)
-            elif time_pointer.minute < 30:
-                time_pointer = time_pointer.replace(minute=30)
-            elif time_pointer.minute < 45:
-                time_pointer = time_pointer.replace(minute=45)
-            else:
-                time_pointer += timedelta(hours=1)
-                time_pointer = time_pointer.replace(minute=0)
-
-        # Iterate from time_range_start to time_range_end
-        while time_pointer <= time_pointer_end:
-            print(f"Checking {time_pointer}")
-
-            # Check for the agent's availability Dict
-            if agent_id not in datastore:
-                raise LookupError("Unable to find requested agent_id")
-            
-            # Check for the Date's availability Dict
-            if time_pointer.date() not in datastore[agent_id]:
-                raise LookupError("Unable to find requested nested Date Dict")
-
-            # Check for the Hour's availability Dict
-            if time_pointer.hour not in datastore[agent_id][time_pointer.date()]:
-                raise LookupError("Unable to find requested nested Hour Dict")
-                
-            # Check for the Minutes's availability duratiion
-            if time_pointer.minute not in datastore[agent_id][time_pointer.date()][time_pointer.hour]:
-                raise LookupError("Unable to find requested nested Minute Duration")
-
-            min_available = datastore[agent_id][time_pointer.date()][time_pointer.hour][time_pointer.minute]
-            is_available = min_available >= duration
-
-            if is_available:
-                available_times.append(time_pointer)
- 
-            # Increment by quarter-hour increments
-            time_pointer += timedelta(minutes=15)
+        # Search the agent's working hours on date_to_check, in their own
+        # timezone. There's nothing to underutilize on their days off
+        hours = datastore.working_hours_for(agent_id)
+        open_blocks = hours.open_blocks(date_to_check)
+        if not open_blocks:
+            return {"available_times": []}
 
+        time_range_start = from_epoch_minute(open_blocks[0][0], hours.tz)
+        time_range_end = from_epoch_minute(open_blocks[-1][1], hours.tz)
+
+        with SLOT_SEARCH_SECONDS.time("underutilized"):
+            available_times = find_available_times(agent_availability, time_range_start, time_range_end, duration)
 
         return {"available_times": available_times}
     except Exception as e:
-        return HTTPException(status_code=404, detail=str(e))
\ No newline at end of file
+        return HTTPException(status_code=404, detail=str(e))
+
+
+@app.get("/utilization/{start_date}/{end_date}")
+async def utilization(start_date: date, end_date: date, agent_ids: Annotated[list[str] | None, Query()] = None, min_block: int = 60, format: str = "json"):
+    try:
+        if format not in ("json", "csv"):
+            raise ValueError("The format must be json or csv")
+
+        # Report on every agent unless specific agent_ids are given,
+        # converting the agent_ids to ints and skipping duplicates
+        unique_agent_ids = list(dict.fromkeys(int(agent_id) for agent_id in agent_ids)) if agent_ids else list(datastore.ics_config)
+        agent_availabilities = await datastore.get_async(unique_agent_ids)
+
+        # Compute each agent's free time and fragmentation for every day in the range
+        with REPORT_SECONDS.time("utilization"):
+            rows = utilization_report(dict(zip(unique_agent_ids, agent_availabilities)), start_date, end_date, min_block)
+
+        if format == "csv":
+            return Response(content=utilization_csv(rows), media_type="text/csv")
+        return utilization_table(rows)
+    except Exception as e:
+        return HTTPException(status_code=404, detail=str(e))
+
+
+# Helper function to return an agent's availability from the lookups made
+# for a batch, raising the error the agent's lookup failed with, if any
+def batch_availability(agent_availabilities: Dict, agent_id: int):
+    if agent_id not in agent_availabilities:
+        raise LookupError("Unable to find requested agent_id")
+
+    availability = agent_availabilities[agent_id]
+    if isinstance(availability, Exception):
+        raise availability
+    return availability
+
+
+@app.post("/batch")
+async def batch(request: BatchRequest):
+    try:
+        # Refresh every agent in the batch once, so that all of the probes
+        # and queries are answered against the same availability. Agents are
+        # looked up separately, so one whose calendar can't be read only
+        # fails its own probes and queries
+        agent_ids = list(dict.fromkeys(
+            item.agent_id for item in [*request.checks, *request.queries] if item.agent_id in datastore
+        ))
+        lookups = await asyncio.gather(*(datastore.get_async([agent_id]) for agent_id in agent_ids), return_exceptions=True)
+        agent_availabilities = {
+            agent_id: lookup if isinstance(lookup, Exception) else lookup[0]
+            for agent_id, lookup in zip(agent_ids, lookups)
+        }
+
+        # Answer each (agent_id, duration, start) probe
+        checks = []
+        for probe in request.checks:
+            try:
+                min_available = batch_availability(agent_availabilities, probe.agent_id).minutes_free(probe.start)
+                checks.append(CheckResult(agent_id=probe.agent_id, start=probe.start, is_available=min_available >= probe.duration))
+            except Exception as e:
+                checks.append(CheckResult(agent_id=probe.agent_id, start=probe.start, detail=str(e)))
+
+        # Answer each (agent_id, duration, start, end) range query
+        queries = []
+        for query in request.queries:
+            try:
+                availability = batch_availability(agent_availabilities, query.agent_id)
+
+                with SLOT_SEARCH_SECONDS.time("batch"):
+                    available_times = find_available_times(availability, query.start, query.end, query.duration)
+                queries.append(QueryResult(agent_id=query.agent_id, available_times=available_times))
+            except Exception as e:
+                queries.append(QueryResult(agent_id=query.agent_id, detail=str(e)))
+
+        return BatchResponse(checks=checks, queries=queries)
+    except Exception as e:
+        return HTTPException(status_code=404, detail=str(e))
+
+
+@app.post("/reload")
+async def reload():
+    try:
+        # Re-read only the agents whose ICS files have changed
+        reloaded_agent_ids = await datastore.refresh_async()
+
+        if reloaded_agent_ids:
+            datastore.save_snapshot(SNAPSHOT_PATH)
+
+        return {"reloaded_agent_ids": reloaded_agent_ids}
+    except Exception as e:
+        return HTTPException(status_code=404, detail=str(e))
+
+
+@app.post("/reload/{agent_id}")
+async def reload_agent(agent_id: int):
+    try:
+        # Re-read the agent's ICS file if it has changed
+        reloaded_agent_ids = await datastore.refresh_async([agent_id])
+
+        if reloaded_agent_ids:
+            datastore.save_snapshot(SNAPSHOT_PATH)
+
+        return {"reloaded_agent_ids": reloaded_agent_ids}
+    except Exception as e:
+        return HTTPException(status_code=404, detail=str(e))
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Counters and histograms in the Prometheus text exposition format
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/debug/profile")
+async def profile():
+    try:
+        if profiler is None:
+            raise LookupError("Profiling is disabled, set PROFILE_SAMPLE_INTERVAL_MS to enable it")
+
+        # Sampled stacks in the collapsed format read by flamegraph.pl and speedscope
+        return PlainTextResponse(profiler.collapsed())
+    except Exception as e:
+        return HTTPException(status_code=404, detail=str(e))
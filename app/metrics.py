@@ -0,0 +1,215 @@
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as StackCounter
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .constants import METRICS_ENABLED
+
+
+# Lightweight counters and histograms rendered in the Prometheus text
+# exposition format, so the service can be scraped without pulling in a
+# client library. Every metric is only ever updated from the event loop's
+# thread (work done in the process pool reports its timings back through
+# its result), so there's no locking here
+
+
+# Upper bounds (in seconds) of the latency buckets. They start well
+# below a millisecond since most lookups are answered in microseconds
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# Helper function to escape a label value for the exposition format
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+# Helper function to format a set of labels, e.g. {agent_id="1",endpoint="check"}
+def format_labels(label_names: Sequence[str], label_values: Sequence[str], extra: str = "") -> str:
+    labels = [f'{name}="{escape_label_value(str(value))}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+# A monotonically increasing count per set of label values
+class Counter:
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.values: Dict[Tuple[str, ...], float] = defaultdict(float)
+
+    def inc(self, *label_values, amount: float = 1.0):
+        if METRICS_ENABLED:
+            self.values[tuple(map(str, label_values))] += amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{format_labels(self.label_names, label_values)} {value:g}")
+        return lines
+
+
+# Observations bucketed by value per set of label values
+class Histogram:
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Per set of label values: the (non-cumulative) count in each
+        # bucket plus one for +Inf, followed by the sum of observations
+        self.series: Dict[Tuple[str, ...], List[float]] = dict()
+
+    def observe(self, value: float, *label_values):
+        if not METRICS_ENABLED:
+            return
+
+        label_values = tuple(map(str, label_values))
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [0] * (len(self.buckets) + 2)
+
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    # Time the body of a `with` block and observe how long it took
+    @contextmanager
+    def time(self, *label_values):
+        if not METRICS_ENABLED:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for label_values, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip([*self.buckets, "+Inf"], series[:-1]):
+                cumulative += count
+                le = f'le="{bound:g}"' if bound != "+Inf" else 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{format_labels(self.label_names, label_values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, label_values)} {series[-1]:g}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, label_values)} {cumulative}")
+        return lines
+
+
+# Every metric the service exposes on /metrics
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, label_names)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, label_names, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    # Render every metric in the Prometheus text exposition format
+    def render(self) -> str:
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+
+registry = MetricsRegistry()
+
+REQUESTS = registry.counter("housewhisper_requests_total", "Requests handled, by endpoint and HTTP status", ["endpoint", "status"])
+REQUEST_SECONDS = registry.histogram("housewhisper_request_duration_seconds", "Time spent handling a request, by endpoint", ["endpoint"])
+AGENT_LOOKUPS = registry.counter("housewhisper_agent_lookups_total", "Availability lookups, by agent", ["agent_id"])
+COALESCED_REFRESHES = registry.counter("housewhisper_coalesced_refreshes_total", "Lookups that waited for a refresh already in flight for the same agent, by agent", ["agent_id"])
+AGENT_REBUILDS = registry.counter("housewhisper_agent_rebuilds_total", "Times an agent's availability was (re)built, by agent", ["agent_id"])
+ICS_PARSE_SECONDS = registry.histogram("housewhisper_ics_parse_duration_seconds", "Time spent parsing an agent's ICS file, by agent", ["agent_id"])
+AVAILABILITY_BUILD_SECONDS = registry.histogram("housewhisper_availability_build_duration_seconds", "Time spent building an agent's availability, by agent", ["agent_id"])
+SLOT_SEARCH_SECONDS = registry.histogram("housewhisper_slot_search_duration_seconds", "Time spent searching an agent's slots, by endpoint", ["endpoint"])
+INTERSECTION_SECONDS = registry.histogram("housewhisper_intersection_duration_seconds", "Time spent intersecting several agents' slots, by endpoint", ["endpoint"])
+REPORT_SECONDS = registry.histogram("housewhisper_report_duration_seconds", "Time spent building a report, by report", ["report"])
+RESULT_CACHE_LOOKUPS = registry.counter("housewhisper_result_cache_lookups_total", "Result cache lookups, by endpoint and whether they hit", ["endpoint", "result"])
+RESULT_CACHE_EVICTIONS = registry.counter("housewhisper_result_cache_evictions_total", "Results dropped from the cache, by reason", ["reason"])
+
+
+# ASGI middleware that counts and times every request by the name of
+# the route that handled it (e.g. "check" or "coordinate")
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Requests that don't match a route share a single label
+            # so that arbitrary paths can't blow up the label count
+            route = scope.get("route")
+            endpoint = getattr(route, "name", None) or "unmatched"
+            REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint)
+            REQUESTS.inc(endpoint, status)
+
+
+# A sampling profiler: a background thread that periodically records the
+# stack of one thread (the event loop's) and counts how often each stack
+# is seen. The counts are returned in the "collapsed" format read by
+# flamegraph.pl and speedscope. The profiled thread never does extra work
+class StackSampler:
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self.stacks: StackCounter = StackCounter()
+        self._thread_id: Optional[int] = None
+        self._stopped = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    # Start sampling the calling thread
+    def start(self):
+        self._thread_id = threading.get_ident()
+        self._stopped.clear()
+        self._sampler = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._sampler is not None:
+            self._sampler.join()
+            self._sampler = None
+
+    # Every sampled stack, root first, with the number of times it was seen
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def _run(self):
+        while not self._stopped.wait(self.interval_seconds):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None:
+                self.stacks[collapse_stack(frame)] += 1
+
+
+# Helper function to turn a frame and its callers into a single
+# "module:function;module:function" line, outermost call first
+def collapse_stack(frame) -> str:
+    calls = []
+    while frame is not None:
+        calls.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(calls))
@@ -0,0 +1,49 @@
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+# Request and response bodies for the JSON endpoints
+
+class CheckProbe(BaseModel):
+    agent_id: int
+    duration: int
+    start: datetime
+
+
+class RangeQuery(BaseModel):
+    agent_id: int
+    duration: int
+    start: datetime
+    end: datetime
+
+
+class BatchRequest(BaseModel):
+    checks: List[CheckProbe] = []
+    queries: List[RangeQuery] = []
+
+
+class CheckResult(BaseModel):
+    agent_id: int
+    start: datetime
+    is_available: Optional[bool] = None
+    detail: Optional[str] = None
+
+
+class QueryResult(BaseModel):
+    agent_id: int
+    available_times: Optional[List[datetime]] = None
+    detail: Optional[str] = None
+
+
+class BatchResponse(BaseModel):
+    checks: List[CheckResult]
+    queries: List[QueryResult]
+
+
+class BestSlot(BaseModel):
+    agent_id: int
+    start: datetime
+    free_minutes: int
+    back_to_back: int
@@ -0,0 +1,144 @@
+from datetime import datetime
+from heapq import heappush, heapreplace, merge
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Tuple
+
+from .availability import Availability, is_business_hours, iter_local_dates, localize
+from .search import SLOT_INTERVAL_MINUTES, check_window, slot_range
+from .working_hours import WorkingHours
+
+
+# The ways the best slots can be ranked: the earliest slots first, the slots
+# with the longest free run first, or the slots touching the fewest of the
+# agent's other meetings first. Ties always go to the earlier slot
+RANKINGS = ("earliest", "longest", "fewest_back_to_back")
+
+
+# A quarter-hour slot at which an agent is free for the requested meeting
+class RankedSlot(NamedTuple):
+    # Epoch minute the slot starts at
+    start: int
+    agent_id: int
+    # How long the agent is free for from the start of the slot
+    free_minutes: int
+    # How many of the agent's meetings end right before the slot or start
+    # right after the meeting would end (0, 1 or 2)
+    back_to_back: int
+
+
+# Helper function to return how good a slot is under a ranking (lower is better)
+def slot_score(slot: RankedSlot, rank: str) -> int:
+    if rank == "longest":
+        return -slot.free_minutes
+    if rank == "fewest_back_to_back":
+        return slot.back_to_back
+    return 0
+
+
+# Helper function to return the longest block of working hours (in
+# minutes) on any local date between epoch minutes `first` and `last`.
+# Blocks are measured in epoch minutes, so one that runs across a daylight
+# saving time change is as long as it really is
+def longest_open_block(hours: WorkingHours, first: int, last: int) -> int:
+    return max(
+        (end - start for local_date in iter_local_dates(first, last, hours.tz) for start, end in hours.open_blocks(local_date)),
+        default=0,
+    )
+
+
+# Helper function to return the best score any slot of these agents
+# between epoch minutes `first` and `last` could possibly get under a
+# ranking. Once the K slots found so far all have it, no later slot can
+# displace them and the search stops
+def best_possible_score(availabilities: Iterable[Availability], rank: str, first: int, last: int) -> int:
+    if rank == "longest":
+        # Nobody is free for longer than the block of working hours they're free in
+        return -max(
+            (longest_open_block(hours, first, last) for hours in {availability.hours for availability in availabilities}),
+            default=0,
+        )
+    return 0
+
+
+# Helper function to count the agent's meetings that a meeting of `duration`
+# minutes at `slot` would be back-to-back with. A minute inside the agent's
+# working hours with no free time is taken by a meeting
+def count_back_to_back(availability: Availability, slot: int, duration: int, free_minutes: int) -> int:
+    before = slot - 1
+    meeting_before = (
+        before >= availability.window_start
+        and is_business_hours(before, availability.hours)
+        and availability.minutes_free_at(before) == 0
+    )
+
+    # The agent's free time runs out exactly when the meeting would end
+    meeting_after = free_minutes == duration and is_business_hours(slot + duration, availability.hours)
+
+    return meeting_before + meeting_after
+
+
+# Helper function to lazily yield every slot between epoch minutes `first`
+# and `last` (on the grid anchored at `first`) at which the agent is free
+# for `duration` minutes, in order. Slots are looked up one local day at a
+# time, so a search that stops early never reads the rest of the range
+def iter_agent_slots(agent_id: int, availability: Availability, first: int, last: int, duration: int) -> Iterator[RankedSlot]:
+    hours = availability.hours
+
+    for local_date in iter_local_dates(first, last, hours.tz):
+        day_start, next_day_start = hours.day_bounds(local_date)
+
+        # Snap the day's first slot onto the slot grid anchored at `first`
+        start = max(first, day_start)
+        start += -(start - first) % SLOT_INTERVAL_MINUTES
+        end = min(last, next_day_start - 1)
+
+        if start > end:
+            continue
+
+        for slot in availability.find_slots(start, end, duration, SLOT_INTERVAL_MINUTES):
+            free_minutes = availability.minutes_free_at(slot)
+            yield RankedSlot(slot, agent_id, free_minutes, count_back_to_back(availability, slot, duration, free_minutes))
+
+
+# Helper function to find the `k` best quarter-hours between range_start and
+# range_end (inclusive) at which any of the agents is free for `duration`
+# minutes. Every agent's slots are merged in time order and the best K seen
+# so far are kept in a heap, so the search stops as soon as the K results
+# can no longer be beaten (right away for "earliest") rather than listing
+# every slot in the range. The results are returned best first
+def find_best_slots(availabilities: Dict[int, Availability], range_start: datetime, range_end: datetime, duration: int, k: int, rank: str = "earliest") -> List[RankedSlot]:
+    if rank not in RANKINGS:
+        raise ValueError(f"Unknown ranking {rank!r}, expected one of: {', '.join(RANKINGS)}")
+    if duration <= 0:
+        raise ValueError("The duration must be at least one minute")
+
+    range_start = localize(range_start)
+
+    slots = slot_range(range_start, range_end)
+    if slots is None or k <= 0 or not availabilities:
+        return []
+
+    first, last = slots
+    for availability in availabilities.values():
+        check_window(availability, first, last)
+
+    best_score = best_possible_score(availabilities.values(), rank, first, last)
+    candidates = merge(*(
+        iter_agent_slots(agent_id, availability, first, last, duration)
+        for agent_id, availability in availabilities.items()
+    ))
+
+    # The best K slots so far, worst on top: (-score, -order, slot)
+    best: List[Tuple[int, int, RankedSlot]] = []
+    for order, slot in enumerate(candidates):
+        score = slot_score(slot, rank)
+
+        if len(best) < k:
+            heappush(best, (-score, -order, slot))
+        elif score < -best[0][0]:
+            heapreplace(best, (-score, -order, slot))
+
+        # Later slots can at best tie with the worst of the K, and ties go to the earlier slot
+        if len(best) == k and -best[0][0] <= best_score:
+            break
+
+    return [slot for _, _, slot in sorted(best, key=lambda entry: (-entry[0], -entry[1]))]
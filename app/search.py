@@ -0,0 +1,90 @@
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from .availability import Availability, from_epoch_minute, localize, to_epoch_minute
+
+
+# We suggest meeting times at quarter-hour intervals
+SLOT_INTERVAL_MINUTES = 15
+
+# A streamed search looks up (and writes out) a day's worth of slots at a time
+STREAM_CHUNK_MINUTES = 24 * 60
+
+
+# Helper function to round a datetime up to the start of the
+# following quarter-hour and return it as an epoch minute
+def first_slot_minute(range_start: datetime) -> int:
+    minute = to_epoch_minute(range_start)
+    return minute + (-minute % SLOT_INTERVAL_MINUTES)
+
+
+# Helper function to turn a requested range into the epoch minutes of the
+# first and last quarter-hour slots in it, or None if the range has no slots
+def slot_range(range_start: datetime, range_end: datetime) -> Optional[Tuple[int, int]]:
+    first = first_slot_minute(range_start)
+    last = to_epoch_minute(range_end)
+
+    if first > last:
+        return None
+
+    return first, first + (last - first) // SLOT_INTERVAL_MINUTES * SLOT_INTERVAL_MINUTES
+
+
+# Helper function to check that every slot we'd check
+# falls inside an agent's preprocessed window
+def check_window(availability: Availability, first: int, last: int):
+    if first < availability.window_start or last > availability.window_end:
+        raise LookupError("Requested time is outside of the preprocessed window")
+
+
+# Helper function to split the slots from epoch minute `first` through
+# `last` into consecutive chunks of STREAM_CHUNK_MINUTES on the same slot
+# grid, as (first, last) pairs
+def slot_chunks(first: int, last: int) -> Iterator[Tuple[int, int]]:
+    for chunk_first in range(first, last + 1, STREAM_CHUNK_MINUTES):
+        yield chunk_first, min(chunk_first + STREAM_CHUNK_MINUTES - SLOT_INTERVAL_MINUTES, last)
+
+
+# Helper function to find the slots from epoch minute `first` through
+# `last` at which the agent is free for `duration` minutes
+def find_agent_slots(availability: Availability, first: int, last: int, duration: int) -> Iterable[int]:
+    # Every slot is "free" for zero minutes, even outside the business day
+    if duration <= 0:
+        return range(first, last + 1, SLOT_INTERVAL_MINUTES)
+    return availability.find_slots(first, last, duration, SLOT_INTERVAL_MINUTES)
+
+
+# Helper function to find every quarter-hour between range_start and
+# range_end (inclusive) at which the agent is free for `duration` minutes
+def find_available_times(availability: Availability, range_start: datetime, range_end: datetime, duration: int) -> List[datetime]:
+    range_start = localize(range_start)
+
+    slots = slot_range(range_start, range_end)
+    if slots is None:
+        return []
+
+    first, last = slots
+    check_window(availability, first, last)
+
+    # Return the times in the same timezone they were requested in
+    return [from_epoch_minute(slot, range_start.tzinfo) for slot in find_agent_slots(availability, first, last, duration)]
+
+
+# Helper function to find the same times as find_available_times(), but
+# lazily and a chunk of the range at a time, yielding a list of times per
+# chunk (which may be empty). The range is checked right away, so only the
+# search itself is deferred until the chunks are consumed
+def iter_available_times(availability: Availability, range_start: datetime, range_end: datetime, duration: int) -> Iterator[List[datetime]]:
+    range_start = localize(range_start)
+
+    slots = slot_range(range_start, range_end)
+    if slots is None:
+        return iter(())
+
+    first, last = slots
+    check_window(availability, first, last)
+
+    return (
+        [from_epoch_minute(slot, range_start.tzinfo) for slot in find_agent_slots(availability, chunk_first, chunk_last, duration)]
+        for chunk_first, chunk_last in slot_chunks(first, last)
+    )
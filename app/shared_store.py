@@ -0,0 +1,176 @@
+import fcntl
+import os
+import struct
+import sys
+import tempfile
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, List, Optional, Tuple
+
+from .availability import ArrayAvailability
+from .snapshot import pack_snapshot, read_snapshot, snapshot_size
+from .working_hours import WorkingHours
+
+
+# Every agent's availability arrays in POSIX shared memory, so that the
+# workers of a multi-worker deployment share a single copy of them:
+#
+#   <name>               control segment: magic and the current generation
+#   <name>-<generation>  one snapshot (see snapshot.py) per generation
+#
+# A single builder writes each new generation to a new segment and only
+# then stores its number in the control segment, so swapping generations
+# is atomic. The segment's name carries the generation, so a reader that
+# races a swap attaches to either the old or the new generation (or, if
+# the old one was already removed, keeps what it has and retries later)
+CONTROL_MAGIC = b"HWSHARE\0"
+CONTROL = struct.Struct("<8sQ")
+
+
+# Helper function to return the name of the segment holding a generation
+def generation_segment_name(name: str, generation: int) -> str:
+    return f"{name}-{generation}"
+
+
+# Helper function to attach to a shared memory segment without the
+# resource tracker removing it when this process exits, since the
+# segment belongs to the builder rather than to us. Before Python 3.13
+# attaching always registers the segment, and unregistering it again
+# would drop the builder's registration too when the workers share a
+# resource tracker, so the registration is skipped instead
+def attach_segment(segment_name: str) -> shared_memory.SharedMemory:
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(segment_name, track=False)
+
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(segment_name)
+    finally:
+        resource_tracker.register = register
+
+
+# Helper function to try to become the one process that builds and
+# publishes the shared store, by taking an exclusive lock that's held for
+# as long as the returned file stays open. Returns None if another
+# process already holds it
+def acquire_builder_lock(name: str):
+    lock_file = open(os.path.join(tempfile.gettempdir(), f"{name}.lock"), "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+# The builder's side of the shared store, which publishes
+# each new generation of every agent's availability
+class SharedStorePublisher:
+    def __init__(self, name: str):
+        self.name = name
+        self.generation = 0
+        self._control = self._open_control()
+        self._segment: Optional[shared_memory.SharedMemory] = None
+
+    # Write every agent's availability to a new generation and swap it in.
+    # Readers still attached to the previous generation keep it until they
+    # move on, but it's removed so that no new reader attaches to it.
+    # Returns the new generation
+    def publish(self, availabilities: Dict[int, ArrayAvailability], content_hashes: Dict[int, str]) -> int:
+        # Generations only ever increase, even across builder restarts,
+        # so readers can tell a new generation from the one they have
+        generation = max(self.generation + 1, time.time_ns())
+
+        segment = shared_memory.SharedMemory(generation_segment_name(self.name, generation), create=True, size=snapshot_size(availabilities))
+        pack_snapshot(segment.buf, availabilities, content_hashes)
+        CONTROL.pack_into(self._control.buf, 0, CONTROL_MAGIC, generation)
+
+        self._retire_segment()
+        self._segment = segment
+        self.generation = generation
+        return generation
+
+    # Remove every segment this publisher created
+    def close(self):
+        self._retire_segment()
+        self._control.close()
+        self._control.unlink()
+
+    def _open_control(self) -> shared_memory.SharedMemory:
+        try:
+            return shared_memory.SharedMemory(self.name, create=True, size=CONTROL.size)
+        except FileExistsError:
+            # Left behind by a previous builder, whose generations we'll replace
+            return shared_memory.SharedMemory(self.name)
+
+    def _retire_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._segment.unlink()
+            self._segment = None
+
+
+# A worker's read-only view of the shared store
+class SharedStoreReader:
+    def __init__(self, name: str):
+        self.name = name
+        self._control: Optional[shared_memory.SharedMemory] = None
+        # Segments of generations we've moved on from, which are only
+        # closed once no availability read from them is still in use
+        self._retired: List[shared_memory.SharedMemory] = []
+        self._segment: Optional[shared_memory.SharedMemory] = None
+
+    # Return the current generation, or 0 if nothing has been published yet
+    def generation(self) -> int:
+        if self._control is None:
+            try:
+                self._control = attach_segment(self.name)
+            except FileNotFoundError:
+                return 0
+
+        magic, generation = CONTROL.unpack_from(self._control.buf)
+        return generation if magic == CONTROL_MAGIC else 0
+
+    # Attach to a generation and return every agent's availability (backed
+    # by the shared pages) along with the hash of the ICS file it was built
+    # from, as with snapshot.load_snapshot(). Returns None if the generation
+    # has already been replaced
+    def load(
+        self,
+        generation: int,
+        window_start: int,
+        window_end: int,
+        working_hours: Optional[Dict[int, WorkingHours]] = None,
+    ) -> Optional[Dict[int, Tuple[ArrayAvailability, str]]]:
+        try:
+            segment = attach_segment(generation_segment_name(self.name, generation))
+        except FileNotFoundError:
+            return None
+
+        if self._segment is not None:
+            self._retired.append(self._segment)
+        self._segment = segment
+        self._close_retired()
+
+        return read_snapshot(segment.buf, window_start, window_end, working_hours)
+
+    def close(self):
+        if self._segment is not None:
+            self._retired.append(self._segment)
+            self._segment = None
+        self._close_retired()
+
+        if self._control is not None:
+            self._control.close()
+            self._control = None
+
+    # Helper method to close the retired segments that nothing reads from any more
+    def _close_retired(self):
+        retired = []
+        for segment in self._retired:
+            try:
+                segment.close()
+            except BufferError:
+                retired.append(segment)
+        self._retired = retired
@@ -0,0 +1,147 @@
+import mmap
+import os
+import struct
+import sys
+from typing import Dict, Optional, Tuple
+
+from .availability import ArrayAvailability
+from .working_hours import DEFAULT_WORKING_HOURS, WorkingHours
+
+
+# Snapshot files hold the precomputed availability arrays of every agent
+# so that a process can memory-map them instead of parsing ICS files.
+# Shared memory segments (see shared_store.py) use the same layout.
+#
+# Layout (header integers are little-endian, arrays use the byte order
+# recorded in the header):
+#
+#   header      magic, version, byte order of the arrays, agent count,
+#               window start (epoch minute), window length (minutes)
+#   agent table one (agent_id, sha256 of the ICS file, fingerprint of
+#               the agent's working hours, data offset) entry per agent
+#   data        one uint16 array of `window length` entries per agent
+SNAPSHOT_MAGIC = b"HWAVAIL\0"
+
+# Bump whenever the layout or the way availability is computed changes,
+# so that snapshots written by older versions are rebuilt on startup
+SNAPSHOT_VERSION = 3
+
+HEADER = struct.Struct("<8sHBxIqq")
+AGENT_ENTRY = struct.Struct("<q32s32sQ")
+
+BYTE_ORDERS = {"little": 0, "big": 1}
+
+
+# Helper function to write the availability arrays of every agent
+# to a snapshot file. The file is written next to its final path and
+# then renamed over it, so readers never see a half-written snapshot
+def write_snapshot(snapshot_path, availabilities: Dict[int, ArrayAvailability], content_hashes: Dict[int, str]):
+    size = snapshot_size(availabilities)
+
+    temp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    with open(temp_path, "w+b") as file:
+        file.truncate(size)
+        with mmap.mmap(file.fileno(), size) as mapped:
+            pack_snapshot(mapped, availabilities, content_hashes)
+
+    os.replace(temp_path, snapshot_path)
+
+
+# Helper function to return the size in bytes of a snapshot of every agent
+def snapshot_size(availabilities: Dict[int, ArrayAvailability]) -> int:
+    if not availabilities:
+        raise ValueError("Unable to write a snapshot without any agents")
+
+    _, window_length = snapshot_window(availabilities)
+    return HEADER.size + (AGENT_ENTRY.size + window_length * 2) * len(availabilities)
+
+
+# Helper function to return the (window start, window length) shared by every agent
+def snapshot_window(availabilities: Dict[int, ArrayAvailability]) -> Tuple[int, int]:
+    windows = {(availability.window_start, len(availability.values)) for availability in availabilities.values()}
+    if len(windows) != 1:
+        raise ValueError("Every agent in a snapshot must share the same window")
+    ((window_start, window_length),) = windows
+    return window_start, window_length
+
+
+# Helper function to write a snapshot of every agent into a writable buffer
+# of at least snapshot_size() bytes, such as a memory-mapped file or a
+# shared memory segment
+def pack_snapshot(buffer, availabilities: Dict[int, ArrayAvailability], content_hashes: Dict[int, str]):
+    window_start, window_length = snapshot_window(availabilities)
+
+    data_offset = HEADER.size + AGENT_ENTRY.size * len(availabilities)
+    array_size = window_length * 2
+
+    HEADER.pack_into(
+        buffer,
+        0,
+        SNAPSHOT_MAGIC,
+        SNAPSHOT_VERSION,
+        BYTE_ORDERS[sys.byteorder],
+        len(availabilities),
+        window_start,
+        window_length,
+    )
+
+    for index, (agent_id, availability) in enumerate(availabilities.items()):
+        offset = data_offset + index * array_size
+        AGENT_ENTRY.pack_into(
+            buffer,
+            HEADER.size + index * AGENT_ENTRY.size,
+            agent_id,
+            bytes.fromhex(content_hashes[agent_id]),
+            availability.hours.fingerprint(),
+            offset,
+        )
+        buffer[offset:offset + array_size] = memoryview(availability.values).cast("B")
+
+
+# Helper function to memory-map a snapshot file and return every agent's
+# availability (backed by the mapped pages) along with the hash of the ICS
+# file it was built from. Returns an empty Dict if the snapshot is missing
+# or doesn't match the window we're expecting, and leaves out any agent
+# whose working hours (the default when not given) don't match
+def load_snapshot(
+    snapshot_path,
+    window_start: int,
+    window_end: int,
+    working_hours: Optional[Dict[int, WorkingHours]] = None,
+) -> Dict[int, Tuple[ArrayAvailability, str]]:
+    if not os.path.exists(snapshot_path):
+        return dict()
+
+    with open(snapshot_path, "rb") as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    return read_snapshot(memoryview(mapped), window_start, window_end, working_hours)
+
+
+# Helper function to read the agents out of a snapshot held in a buffer
+def read_snapshot(
+    buffer: memoryview,
+    window_start: int,
+    window_end: int,
+    working_hours: Optional[Dict[int, WorkingHours]] = None,
+) -> Dict[int, Tuple[ArrayAvailability, str]]:
+    if len(buffer) < HEADER.size:
+        return dict()
+
+    magic, version, byte_order, agent_count, snapshot_window_start, window_length = HEADER.unpack_from(buffer)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION or byte_order != BYTE_ORDERS[sys.byteorder]:
+        return dict()
+    if snapshot_window_start != window_start or window_length != window_end - window_start + 1:
+        return dict()
+
+    agents = dict()
+    for index in range(agent_count):
+        agent_id, content_hash, fingerprint, offset = AGENT_ENTRY.unpack_from(buffer, HEADER.size + index * AGENT_ENTRY.size)
+        hours = (working_hours or dict()).get(agent_id, DEFAULT_WORKING_HOURS)
+        if fingerprint != hours.fingerprint():
+            continue
+
+        values = buffer[offset:offset + window_length * 2].cast("H")
+        agents[agent_id] = (ArrayAvailability(values, window_start, hours), content_hash.hex())
+
+    return agents
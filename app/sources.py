@@ -0,0 +1,85 @@
+import os
+import time
+from dataclasses import dataclass
+from typing import Hashable, Optional
+
+import anyio
+import httpx
+
+from .constants import REMOTE_ICS_MAX_AGE_SECONDS, REMOTE_ICS_TIMEOUT_SECONDS
+
+
+# Where an agent's ICS calendar is read from. Each agent's CONFIG entry
+# names a local file path, an http(s) URL, or any IcsSource, so that
+# calendars can be fetched from other systems (or a fake in tests) by
+# subclassing IcsSource
+class IcsSource:
+    # Return a token that changes whenever the calendar may have changed,
+    # without reading the calendar itself. The agent is only read again
+    # when its token changes, and only rebuilt if the contents changed too
+    def version(self) -> Hashable:
+        raise NotImplementedError
+
+    # Read the calendar's contents, blocking until they're read
+    def read(self) -> bytes:
+        raise NotImplementedError
+
+    # Read the calendar's contents without blocking the event loop
+    async def read_async(self) -> bytes:
+        return await anyio.to_thread.run_sync(self.read)
+
+
+# A calendar in a local ICS file, which is read again whenever its mtime changes
+@dataclass(frozen=True)
+class FileSource(IcsSource):
+    path: str
+
+    def version(self) -> Hashable:
+        return os.stat(self.path).st_mtime_ns
+
+    def read(self) -> bytes:
+        with open(self.path, "rb") as file:
+            return file.read()
+
+    async def read_async(self) -> bytes:
+        return await anyio.Path(self.path).read_bytes()
+
+
+# A calendar served over http(s), which is fetched again once it's
+# older than `max_age_seconds`
+@dataclass(frozen=True)
+class UrlSource(IcsSource):
+    url: str
+    max_age_seconds: float = REMOTE_ICS_MAX_AGE_SECONDS
+    timeout_seconds: float = REMOTE_ICS_TIMEOUT_SECONDS
+
+    def version(self) -> Hashable:
+        return int(time.monotonic() // self.max_age_seconds) if self.max_age_seconds > 0 else time.monotonic()
+
+    def read(self) -> bytes:
+        response = httpx.get(self.url, timeout=self.timeout_seconds, follow_redirects=True)
+        response.raise_for_status()
+        return response.content
+
+    async def read_async(self) -> bytes:
+        async with httpx.AsyncClient(timeout=self.timeout_seconds, follow_redirects=True) as client:
+            response = await client.get(self.url)
+        response.raise_for_status()
+        return response.content
+
+
+# Helper function to return the source for an agent's calendar as named
+# in CONFIG: an IcsSource, an http(s) URL, or the path to a local file
+def ics_source(ics_config_value) -> IcsSource:
+    if isinstance(ics_config_value, IcsSource):
+        return ics_config_value
+
+    location = os.fspath(ics_config_value)
+    if location.startswith(("http://", "https://")):
+        return UrlSource(location)
+    return FileSource(location)
+
+
+# Helper function to return the local file behind a source, if there is one
+def source_path(source: IcsSource) -> Optional[str]:
+    return source.path if isinstance(source, FileSource) else None
@@ -0,0 +1,69 @@
+from datetime import date, datetime
+
+import pytest
+
+from .analytics import day_utilization, utilization_csv, utilization_report, utilization_table
+from .availability import build_availability, to_epoch_minute
+from .constants import PACIFIC_TIMEZONE
+from .working_hours import WorkingHours
+
+
+##################################
+# Create tests for the analytics #
+##################################
+
+def pacific(day, hour, minute=0):
+    return datetime(2024, 12, day, hour, minute, tzinfo=PACIFIC_TIMEZONE)
+
+
+# Meetings from 9 - 10 am, 10:30 - 11 am and 4:30 - 6 pm on Dec. 2nd
+BUSY_STARTS = [to_epoch_minute(pacific(2, 9)), to_epoch_minute(pacific(2, 10, 30)), to_epoch_minute(pacific(2, 16, 30))]
+BUSY_ENDS = [to_epoch_minute(pacific(2, 10)), to_epoch_minute(pacific(2, 11)), to_epoch_minute(pacific(2, 18))]
+
+
+def test_day_utilization_matches_every_backend():
+    for backend in ["intervals", "array", "days"]:
+        availability = build_availability(BUSY_STARTS, BUSY_ENDS, pacific(2, 8), pacific(6, 17), backend)
+
+        assert day_utilization(1, availability, date(2024, 12, 2)) == (
+            1, date(2024, 12, 2), 540, 120, 420, 3, 330, 2, 0.2222
+        )
+        assert day_utilization(1, availability, date(2024, 12, 3), min_block=30) == (
+            1, date(2024, 12, 3), 540, 0, 540, 1, 540, 1, 0.0
+        )
+
+    # Days outside of the preprocessed window can't be reported on
+    availability = build_availability(BUSY_STARTS, BUSY_ENDS, pacific(2, 8), pacific(6, 17), "array")
+    with pytest.raises(LookupError):
+        day_utilization(1, availability, date(2024, 12, 7))
+
+
+def test_utilization_report_follows_each_agents_working_hours():
+    part_time = WorkingHours.from_config({"hours": {"mon": ["09:00-12:00", "13:00-15:00"]}})
+    availabilities = {
+        2: build_availability([], [], pacific(2, 0), pacific(8, 23, 59), "days", hours=part_time),
+        1: build_availability(BUSY_STARTS, BUSY_ENDS, pacific(2, 0), pacific(8, 23, 59), "days"),
+    }
+
+    rows = utilization_report(availabilities, date(2024, 12, 2), date(2024, 12, 3))
+    assert [(row.agent_id, row.date.day, row.free_minutes, row.free_blocks) for row in rows] == [
+        (1, 2, 420, 3),
+        (1, 3, 540, 1),
+        (2, 2, 300, 2),
+        (2, 3, 0, 0),
+    ]
+
+    # Days off have no working minutes rather than being fully utilized
+    assert rows[-1].utilization == 0.0
+
+    table = utilization_table(rows)
+    assert table["columns"][:3] == ["agent_id", "date", "working_minutes"]
+    assert table["rows"][0] == [1, "2024-12-02", 540, 120, 420, 3, 330, 2, 0.2222]
+
+    lines = utilization_csv(rows).splitlines()
+    assert lines[0] == ",".join(table["columns"])
+    assert lines[1] == "1,2024-12-02,540,120,420,3,330,2,0.2222"
+    assert len(lines) == 5
+
+    with pytest.raises(ValueError):
+        utilization_report(availabilities, date(2024, 12, 3), date(2024, 12, 2))
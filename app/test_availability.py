@@ -0,0 +1,159 @@
+from datetime import datetime
+
+import pickle
+
+import pytest
+
+from .availability import ArrayAvailability, DayAvailability, IntervalAvailability, day_cache, to_epoch_minute
+from .constants import PACIFIC_TIMEZONE, PREPROCESS_START, PREPROCESS_END
+from .fixtures import (
+    ics_file_with_1_hour_event_at_12_pm_pacific_on_december_2_2024,
+)
+from .utils import preprocess_ics_file
+
+
+#####################################
+# Create tests for the availability #
+#####################################
+
+def pacific(day, hour, minute=0):
+    return datetime(2024, 12, day, hour, minute, tzinfo=PACIFIC_TIMEZONE)
+
+
+def test_interval_availability_with_1_hour_event_at_12_pm_pacific_on_december_2_2024(
+    ics_file_with_1_hour_event_at_12_pm_pacific_on_december_2_2024
+):
+    availability = preprocess_ics_file(ics_file_with_1_hour_event_at_12_pm_pacific_on_december_2_2024, backend="intervals")
+
+    # Free until the event starts at noon
+    assert availability.minutes_free(pacific(2, 8)) == 240
+    assert availability.minutes_free(pacific(2, 11, 59)) == 1
+
+    # Busy for the duration of the event
+    assert availability.minutes_free(pacific(2, 12)) == 0
+    assert availability.minutes_free(pacific(2, 12, 59)) == 0
+
+    # Free until the end of the business day once the event ends
+    assert availability.minutes_free(pacific(2, 13)) == 240
+    assert availability.minutes_free(pacific(3, 8)) == 540
+
+    # Never free outside of the business day
+    assert availability.minutes_free(pacific(2, 17)) == 0
+    assert availability.minutes_free(pacific(3, 7, 59)) == 0
+
+    # Times outside of the preprocessed window can't be answered
+    with pytest.raises(LookupError):
+        availability.minutes_free(pacific(9, 8))
+
+
+def test_interval_availability_merges_overlapping_and_multi_day_events():
+    events = [
+        {"begin": pacific(2, 9), "end": pacific(2, 10)},
+        {"begin": pacific(2, 9, 30), "end": pacific(2, 11)},
+        {"begin": pacific(2, 11), "end": pacific(2, 11, 30)},
+        {"begin": pacific(3, 16), "end": pacific(5, 16)},
+    ]
+
+    availability = IntervalAvailability.from_events(events, PREPROCESS_START, PREPROCESS_END)
+
+    assert availability.busy_starts == [to_epoch_minute(pacific(2, 9)), to_epoch_minute(pacific(3, 16))]
+    assert availability.busy_ends == [to_epoch_minute(pacific(2, 11, 30)), to_epoch_minute(pacific(5, 16))]
+    assert availability.minutes_free(pacific(2, 10, 45)) == 0
+    assert availability.minutes_free(pacific(2, 11, 30)) == 330
+
+    # A multi-day event keeps the agent busy on every day it spans
+    assert availability.minutes_free(pacific(3, 15)) == 60
+    assert availability.minutes_free(pacific(4, 8)) == 0
+    assert availability.minutes_free(pacific(5, 16)) == 60
+
+
+def test_array_availability_matches_interval_availability():
+    for ics_file_path in ["janedoe.ics", "jilldoe.ics", "joedoe.ics", "johndoe.ics"]:
+        interval_availability = preprocess_ics_file(ics_file_path, backend="intervals")
+        array_availability = preprocess_ics_file(ics_file_path, backend="array")
+
+        assert isinstance(array_availability, ArrayAvailability)
+        assert array_availability.window_start == interval_availability.window_start
+        assert array_availability.window_end == interval_availability.window_end
+
+        for minute in range(interval_availability.window_start, interval_availability.window_end + 1):
+            assert array_availability.minutes_free_at(minute) == interval_availability.minutes_free_at(minute)
+
+    with pytest.raises(LookupError):
+        array_availability.minutes_free(pacific(2, 7, 59))
+
+
+def test_day_availability_matches_array_availability_and_covers_any_date():
+    for ics_file_path in ["janedoe.ics", "jilldoe.ics", "joedoe.ics", "johndoe.ics"]:
+        array_availability = preprocess_ics_file(ics_file_path, backend="array")
+        day_availability = preprocess_ics_file(ics_file_path, backend="days")
+
+        assert isinstance(day_availability, DayAvailability)
+        for minute in range(array_availability.window_start, array_availability.window_end + 1):
+            assert day_availability.minutes_free_at(minute) == array_availability.minutes_free_at(minute)
+
+    # Days outside of the preprocess window are answered too
+    availability = DayAvailability([to_epoch_minute(datetime(2031, 3, 4, 9, 0, tzinfo=PACIFIC_TIMEZONE))], [to_epoch_minute(datetime(2031, 3, 4, 10, 0, tzinfo=PACIFIC_TIMEZONE))])
+    assert availability.minutes_free(datetime(2031, 3, 4, 8, 0, tzinfo=PACIFIC_TIMEZONE)) == 60
+    assert availability.minutes_free(datetime(2031, 3, 4, 10, 0, tzinfo=PACIFIC_TIMEZONE)) == 420
+    assert availability.minutes_free(pacific(9, 8)) == 540
+
+
+def test_day_availability_only_keeps_a_bounded_number_of_days():
+    availability = DayAvailability([], [])
+    max_days = day_cache.max_days
+    day_cache.clear()
+
+    try:
+        day_cache.max_days = 3
+        for day in range(2, 7):
+            availability.minutes_free(pacific(day, 8))
+
+        assert len(day_cache) == 3
+
+        # The evicted days are rebuilt the next time they're looked up
+        assert availability.minutes_free(pacific(2, 8)) == 540
+        assert len(day_cache) == 3
+    finally:
+        day_cache.max_days = max_days
+        day_cache.clear()
+
+
+def test_day_availability_gets_its_own_days_when_unpickled():
+    availability = DayAvailability([to_epoch_minute(pacific(2, 9))], [to_epoch_minute(pacific(2, 10))])
+    assert availability.minutes_free(pacific(2, 8)) == 60
+
+    # A rebuilt agent (e.g. from a worker process) never sees another agent's cached days
+    free_all_day = DayAvailability([], [])
+    assert pickle.loads(pickle.dumps(free_all_day)).minutes_free(pacific(2, 8)) == 540
+    assert pickle.loads(pickle.dumps(availability)).minutes_free(pacific(2, 8)) == 60
+
+
+def test_day_availability_expands_recurring_events_for_each_day(tmp_path):
+    ics_file_path = tmp_path / "agent.ics"
+    ics_file_path.write_text("\n".join([
+        "BEGIN:VCALENDAR",
+        "BEGIN:VEVENT",
+        "UID:standup",
+        "DTSTART;TZID=America/Los_Angeles:20241202T090000",
+        "DTEND;TZID=America/Los_Angeles:20241202T100000",
+        "RRULE:FREQ=DAILY",
+        "END:VEVENT",
+        "BEGIN:VEVENT",
+        "UID:lunch",
+        "DTSTART;TZID=America/Los_Angeles:20241203T120000",
+        "DTEND;TZID=America/Los_Angeles:20241203T130000",
+        "END:VEVENT",
+        "END:VCALENDAR",
+    ]))
+
+    day_availability = preprocess_ics_file(ics_file_path, backend="days")
+    array_availability = preprocess_ics_file(ics_file_path, backend="array")
+
+    for minute in range(array_availability.window_start, array_availability.window_end + 1):
+        assert day_availability.minutes_free_at(minute) == array_availability.minutes_free_at(minute)
+
+    # The daily standup never ends
+    assert day_availability.minutes_free(datetime(2031, 7, 1, 8, 0, tzinfo=PACIFIC_TIMEZONE)) == 60
+    assert day_availability.minutes_free(datetime(2031, 7, 1, 9, 30, tzinfo=PACIFIC_TIMEZONE)) == 0
+    assert day_availability.minutes_free(datetime(2031, 7, 1, 10, 0, tzinfo=PACIFIC_TIMEZONE)) == 420
@@ -0,0 +1,41 @@
+import json
+
+from .availability import to_epoch_minute
+from .benchmark import run, write_synthetic_calendars
+from .constants import PREPROCESS_START, PREPROCESS_END
+from .ics_reader import read_ics_events
+
+
+##################################
+# Create tests for the benchmark #
+##################################
+
+def test_write_synthetic_calendars(tmp_path):
+    ics_config = write_synthetic_calendars(tmp_path, agents=3, events=40)
+
+    assert list(ics_config) == [1, 2, 3]
+    for ics_file_path in ics_config.values():
+        events = read_ics_events(ics_file_path)
+        assert len(events) == 40
+
+        # Some of the events fall in the preprocess window and some are history
+        window_events = read_ics_events(ics_file_path, to_epoch_minute(PREPROCESS_START), to_epoch_minute(PREPROCESS_END))
+        assert 0 < len(window_events) < len(events)
+
+
+def test_run_saves_results(tmp_path):
+    output = tmp_path / "results.json"
+    report = run(["--agents", "2", "--events", "20", "--iterations", "2", "--output", str(output)])
+
+    assert json.loads(output.read_text()) == report
+    assert {result["name"] for result in report["results"]} >= {
+        "preprocess_ics_files",
+        "GET /check",
+        "GET /query",
+        "GET /multi-agent-coordination",
+        "GET /underutilized",
+        "POST /batch (100 checks)",
+    }
+
+    # Comparing against the saved results shouldn't fail
+    run(["--agents", "2", "--events", "20", "--iterations", "2", "--compare", str(output)])
@@ -0,0 +1,116 @@
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+
+from .cache import ResultCache, result_cache_key
+from .constants import PACIFIC_TIMEZONE
+from .datastore import AvailabilityStore
+
+
+#####################################
+# Create tests for the result cache #
+#####################################
+
+def pacific(day, hour, minute=0):
+    return datetime(2024, 12, day, hour, minute, tzinfo=PACIFIC_TIMEZONE)
+
+
+def test_result_cache_key_ignores_agent_order_but_not_timezone():
+    key = result_cache_key("coordinate", [2, 1, 2], 60, pacific(2, 8), pacific(2, 10))
+
+    assert key == result_cache_key("coordinate", [1, 2], 60, pacific(2, 8), pacific(2, 10))
+    # Results are returned in the timezone they were requested in
+    assert key != result_cache_key("coordinate", [1, 2], 60, pacific(2, 8).astimezone(timezone.utc), pacific(2, 10))
+    assert key != result_cache_key("query", [1, 2], 60, pacific(2, 8), pacific(2, 10))
+
+
+def test_result_cache_evicts_the_least_recently_used_result():
+    cache = ResultCache(max_entries=2)
+    first = result_cache_key("query", [1], 60, pacific(2, 8), pacific(2, 10))
+    second = result_cache_key("query", [2], 60, pacific(2, 8), pacific(2, 10))
+    third = result_cache_key("query", [3], 60, pacific(2, 8), pacific(2, 10))
+
+    cache.put(first, [pacific(2, 8)])
+    cache.put(second, [])
+    assert cache.get(first) == [pacific(2, 8)]
+
+    # An empty result is still a hit
+    assert cache.get(second) == []
+
+    cache.get(first)
+    cache.put(third, [])
+
+    assert cache.get(second) is None
+    assert cache.get(first) is not None
+    assert cache.stats() == {"entries": 2, "hits": 4, "misses": 1, "evictions": 1, "invalidations": 0}
+
+
+def test_result_cache_evicts_results_to_stay_under_its_slot_budget():
+    cache = ResultCache(max_entries=10, max_slots=5, max_entry_slots=3)
+    first = result_cache_key("query", [1], 60, pacific(2, 8), pacific(2, 10))
+    second = result_cache_key("query", [2], 60, pacific(2, 8), pacific(2, 10))
+    third = result_cache_key("query", [3], 60, pacific(2, 8), pacific(2, 10))
+
+    cache.put(first, [pacific(2, 8), pacific(2, 9)])
+    cache.put(second, [pacific(2, 8), pacific(2, 9)])
+    assert cache.slots == 4
+
+    # The least recently used results go until the new one fits
+    cache.get(first)
+    cache.put(third, [pacific(2, 8), pacific(2, 9)])
+    assert cache.get(second) is None
+    assert cache.get(first) is not None
+    assert cache.slots == 4
+    assert cache.evictions == 1
+
+
+def test_result_cache_skips_results_that_are_too_large():
+    cache = ResultCache(max_entries=10, max_slots=100, max_entry_slots=3)
+    key = result_cache_key("query", [1], 60, pacific(2, 8), pacific(2, 10))
+
+    cache.put(key, [pacific(2, 8)])
+    cache.put(key, [pacific(2, hour) for hour in range(8, 12)])
+
+    # Nor is the earlier result for the same key kept around
+    assert cache.get(key) is None
+    assert len(cache) == 0
+    assert cache.slots == 0
+
+
+def test_result_cache_expires_results_after_the_ttl():
+    cache = ResultCache(max_entries=10, ttl_seconds=0.01)
+    key = result_cache_key("query", [1], 60, pacific(2, 8), pacific(2, 10))
+
+    cache.put(key, [])
+    assert cache.get(key) == []
+
+    time.sleep(0.02)
+    assert cache.get(key) is None
+    assert len(cache) == 0
+
+
+def test_result_cache_drops_results_when_their_agents_are_rebuilt(tmp_path):
+    ics_file_path = tmp_path / "agent.ics"
+    shutil.copy("janedoe.ics", ics_file_path)
+
+    datastore = AvailabilityStore({1: str(ics_file_path), 2: "jilldoe.ics", 3: "joedoe.ics"})
+    cache = ResultCache(max_entries=10)
+    datastore.add_listener(cache.invalidate_agent)
+    datastore.refresh()
+
+    jane_and_jill = result_cache_key("coordinate", [1, 2], 60, pacific(2, 8), pacific(2, 10))
+    jill_and_joe = result_cache_key("coordinate", [2, 3], 60, pacific(2, 8), pacific(2, 10))
+    cache.put(jane_and_jill, [])
+    cache.put(jill_and_joe, [])
+
+    # Only the results involving Jane are dropped when her calendar changes
+    with open(ics_file_path, "a") as file:
+        file.write("\n")
+    stat = os.stat(ics_file_path)
+    os.utime(ics_file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    datastore.refresh()
+
+    assert cache.get(jane_and_jill) is None
+    assert cache.get(jill_and_joe) == []
+    assert cache.stats()["invalidations"] == 1
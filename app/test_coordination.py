@@ -0,0 +1,60 @@
+from datetime import datetime
+from itertools import chain, combinations
+
+from .constants import PACIFIC_TIMEZONE
+from .coordination import find_common_available_times, iter_common_available_times
+from .search import find_available_times
+from .utils import preprocess_ics_file
+
+
+#####################################
+# Create tests for the coordination #
+#####################################
+
+ICS_FILE_PATHS = ["janedoe.ics", "jilldoe.ics", "joedoe.ics", "johndoe.ics"]
+
+
+def test_find_common_available_times_matches_intersecting_each_agent():
+    range_start = datetime(2024, 12, 2, 8, 0, tzinfo=PACIFIC_TIMEZONE)
+    range_end = datetime(2024, 12, 6, 17, 0, tzinfo=PACIFIC_TIMEZONE)
+
+    for backend in ["array", "intervals", "days"]:
+        availabilities = [preprocess_ics_file(ics_file_path, backend=backend) for ics_file_path in ICS_FILE_PATHS]
+
+        for size in [2, 3, 4]:
+            for agents in combinations(availabilities, size):
+                for duration in [30, 60, 120]:
+                    expected = set(find_available_times(agents[0], range_start, range_end, duration))
+                    for availability in agents[1:]:
+                        expected &= set(find_available_times(availability, range_start, range_end, duration))
+
+                    assert find_common_available_times(list(agents), range_start, range_end, duration) == sorted(expected)
+
+
+def test_find_common_available_times_for_jane_and_joe_on_december_6_2024():
+    range_start = datetime(2024, 12, 6, 8, 0, tzinfo=PACIFIC_TIMEZONE)
+    range_end = datetime(2024, 12, 6, 17, 0, tzinfo=PACIFIC_TIMEZONE)
+
+    for backend in ["array", "intervals", "days"]:
+        availabilities = [preprocess_ics_file(ics_file_path, backend=backend) for ics_file_path in ["janedoe.ics", "joedoe.ics"]]
+
+        # Jane is free from 1 pm and Joe is busy from 3 pm
+        assert find_common_available_times(availabilities, range_start, range_end, 60) == [
+            datetime(2024, 12, 6, 13, 0, tzinfo=PACIFIC_TIMEZONE),
+            datetime(2024, 12, 6, 13, 15, tzinfo=PACIFIC_TIMEZONE),
+            datetime(2024, 12, 6, 13, 30, tzinfo=PACIFIC_TIMEZONE),
+            datetime(2024, 12, 6, 13, 45, tzinfo=PACIFIC_TIMEZONE),
+            datetime(2024, 12, 6, 14, 0, tzinfo=PACIFIC_TIMEZONE),
+        ]
+
+
+def test_iter_common_available_times_finds_the_same_times_a_day_at_a_time():
+    range_start = datetime(2024, 12, 2, 8, 0, tzinfo=PACIFIC_TIMEZONE)
+    range_end = datetime(2024, 12, 6, 17, 0, tzinfo=PACIFIC_TIMEZONE)
+
+    for backend in ["array", "intervals", "days"]:
+        availabilities = [preprocess_ics_file(ics_file_path, backend=backend) for ics_file_path in ICS_FILE_PATHS]
+
+        for duration in [30, 120]:
+            chunks = iter_common_available_times(availabilities[:2], range_start, range_end, duration)
+            assert list(chain.from_iterable(chunks)) == find_common_available_times(availabilities[:2], range_start, range_end, duration)
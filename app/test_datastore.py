@@ -0,0 +1,159 @@
+import asyncio
+import os
+import shutil
+from datetime import date, datetime
+
+from .availability import to_epoch_minute
+from .constants import PACIFIC_TIMEZONE, PREPROCESS_START, PREPROCESS_END
+from .datastore import AvailabilityStore, touched_days
+from .fixtures import (
+    ics_file_with_1_hour_event_at_12_pm_pacific_on_december_2_2024,
+)
+from .utils import preprocess_ics_file, preprocess_ics_files
+
+
+##################################
+# Create tests for the datastore #
+##################################
+
+def test_availability_store_only_rebuilds_when_ics_file_changes(
+    ics_file_with_1_hour_event_at_12_pm_pacific_on_december_2_2024,
+    tmp_path,
+):
+    ics_file_path = tmp_path / "agent.ics"
+    shutil.copy(ics_file_with_1_hour_event_at_12_pm_pacific_on_december_2_2024, ics_file_path)
+
+    datastore = AvailabilityStore({1: str(ics_file_path)})
+
+    # The first lookup builds the agent's availability
+    assert datastore.refresh_agent(1) is True
+    first_availability = datastore.get(1)
+
+    # An unchanged file is served from the datastore
+    assert datastore.refresh_agent(1) is False
+    assert datastore.get(1) is first_availability
+
+    # Touching the file without changing its contents doesn't rebuild
+    stat = os.stat(ics_file_path)
+    os.utime(ics_file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert datastore.refresh_agent(1) is False
+
+    # Changing the contents rebuilds the agent's availability
+    with open(ics_file_path, "a") as file:
+        file.write("\n")
+    os.utime(ics_file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2_000_000_000))
+    assert datastore.refresh_agent(1) is True
+    assert datastore.get(1) is not first_availability
+
+
+def test_availability_store_only_recomputes_days_touched_by_changed_events(tmp_path):
+    ics_file_path = tmp_path / "agent.ics"
+    shutil.copy("janedoe.ics", ics_file_path)
+
+    datastore = AvailabilityStore({1: str(ics_file_path)}, backend="array")
+    first_availability = datastore.get(1)
+
+    # Move Jane's showings on Dec. 6th from 8 am - 1 pm to 9 am - 2 pm
+    with open(ics_file_path) as file:
+        contents = file.read()
+    with open(ics_file_path, "w") as file:
+        file.write(contents.replace("DTSTART:20241206T160000Z", "DTSTART:20241206T170000Z").replace("DTEND:20241206T210000Z", "DTEND:20241206T220000Z"))
+    stat = os.stat(ics_file_path)
+    os.utime(ics_file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    updated_availability = datastore.get(1)
+    rebuilt_availability = preprocess_ics_file(ics_file_path, backend="array")
+
+    assert updated_availability is not first_availability
+    assert updated_availability.values.tolist() == rebuilt_availability.values.tolist()
+    assert updated_availability.minutes_free(datetime(2024, 12, 6, 8, 0, tzinfo=PACIFIC_TIMEZONE)) == 60
+    assert first_availability.minutes_free(datetime(2024, 12, 6, 8, 0, tzinfo=PACIFIC_TIMEZONE)) == 0
+
+
+def test_touched_days_covers_every_day_a_changed_event_spans():
+    event_keys = {
+        ("conference", to_epoch_minute(datetime(2024, 12, 2, 16, 0, tzinfo=PACIFIC_TIMEZONE)), to_epoch_minute(datetime(2024, 12, 4, 16, 0, tzinfo=PACIFIC_TIMEZONE))),
+        ("before-window", to_epoch_minute(datetime(2024, 11, 1, 8, 0, tzinfo=PACIFIC_TIMEZONE)), to_epoch_minute(datetime(2024, 11, 1, 9, 0, tzinfo=PACIFIC_TIMEZONE))),
+    }
+
+    assert touched_days(event_keys, to_epoch_minute(PREPROCESS_START), to_epoch_minute(PREPROCESS_END)) == [
+        date(2024, 12, 2),
+        date(2024, 12, 3),
+        date(2024, 12, 4),
+    ]
+
+
+def test_availability_store_refreshes_agents_across_the_process_pool():
+    datastore = AvailabilityStore({1: "janedoe.ics", 2: "jilldoe.ics", 3: "joedoe.ics", 4: "johndoe.ics"}, backend="array")
+
+    assert sorted(asyncio.run(datastore.refresh_async())) == [1, 2, 3, 4]
+    assert asyncio.run(datastore.refresh_async()) == []
+
+    serial_availabilities = preprocess_ics_files(datastore.ics_config, max_workers=1, backend="array")
+    parallel_availabilities = preprocess_ics_files(datastore.ics_config, max_workers=2, backend="array")
+
+    for agent_id, availability in zip(datastore.ics_config, asyncio.run(datastore.get_async(list(datastore.ics_config)))):
+        assert availability.values.tolist() == serial_availabilities[agent_id].values.tolist()
+        assert availability.values.tolist() == parallel_availabilities[agent_id].values.tolist()
+
+
+def test_availability_store_watches_ics_files_that_are_replaced(tmp_path):
+    ics_file_path = tmp_path / "agent.ics"
+    shutil.copy("janedoe.ics", ics_file_path)
+
+    datastore = AvailabilityStore({1: str(ics_file_path)})
+    datastore.refresh()
+    rebuilt_agent_ids = []
+    datastore.add_listener(rebuilt_agent_ids.append)
+
+    # Save the calendar the way sync tools do, by writing a new
+    # file next to it and moving it over the old one
+    def replace_calendar(suffix):
+        new_file_path = tmp_path / "agent.ics.tmp"
+        with open("janedoe.ics") as file:
+            new_file_path.write_text(file.read() + suffix)
+        os.replace(new_file_path, ics_file_path)
+
+    async def wait_for_rebuilds(count):
+        for _ in range(100):
+            if len(rebuilt_agent_ids) >= count:
+                return
+            await asyncio.sleep(0.05)
+
+    async def replace_calendar_twice():
+        watcher = asyncio.create_task(datastore.watch())
+        try:
+            await asyncio.sleep(0.5)
+            replace_calendar("\n")
+            await wait_for_rebuilds(1)
+            replace_calendar("\n\n")
+            await wait_for_rebuilds(2)
+        finally:
+            watcher.cancel()
+
+    asyncio.run(replace_calendar_twice())
+    assert rebuilt_agent_ids == [1, 1]
+
+
+def test_availability_store_notifies_listeners_when_an_agent_is_rebuilt(tmp_path):
+    ics_file_path = tmp_path / "agent.ics"
+    shutil.copy("janedoe.ics", ics_file_path)
+
+    datastore = AvailabilityStore({1: str(ics_file_path), 2: "jilldoe.ics"})
+    rebuilt_agent_ids = []
+    datastore.add_listener(rebuilt_agent_ids.append)
+
+    datastore.refresh()
+    assert rebuilt_agent_ids == [1, 2]
+
+    # Unchanged calendars don't notify anyone
+    datastore.refresh()
+    assert rebuilt_agent_ids == [1, 2]
+
+    with open(ics_file_path, "a") as file:
+        file.write("\n")
+    stat = os.stat(ics_file_path)
+    os.utime(ics_file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    datastore.refresh()
+    assert rebuilt_agent_ids == [1, 2, 1]
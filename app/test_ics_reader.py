@@ -0,0 +1,214 @@
+import gc
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from dateutil.rrule import rrulestr
+from ics import Calendar
+import pytest
+
+from .availability import event_minutes, to_epoch_minute
+from .constants import PACIFIC_TIMEZONE
+from .fixtures import (
+    ics_file_with_1_hour_event_at_12_pm_pacific_on_december_2_2024,
+)
+from .ics_reader import IcsEvent, iter_ics_events_from_lines, iter_occurrences, read_ics_calendar, read_ics_events, rule_start_near
+from .utils import read_ics_file_and_sort_events
+
+
+###################################
+# Create tests for the ICS reader #
+###################################
+
+def pacific_minute(day, hour, minute=0):
+    return to_epoch_minute(datetime(2024, 12, day, hour, minute, tzinfo=PACIFIC_TIMEZONE))
+
+
+def test_read_ics_events_matches_the_ics_library(
+    ics_file_with_1_hour_event_at_12_pm_pacific_on_december_2_2024
+):
+    ics_file_paths = [
+        ics_file_with_1_hour_event_at_12_pm_pacific_on_december_2_2024,
+        "janedoe.ics",
+        "jilldoe.ics",
+        "joedoe.ics",
+        "johndoe.ics",
+    ]
+
+    for ics_file_path in ics_file_paths:
+        # Events marked as "free" (TRANSP:TRANSPARENT) never make the agent busy
+        with open(ics_file_path) as file:
+            transparent_uids = {event.uid for event in Calendar(file.read()).events if event.transparent}
+
+        expected = [
+            (*event_minutes(event), event["uid"])
+            for event in read_ics_file_and_sort_events(ics_file_path)
+            if event["uid"] not in transparent_uids
+        ]
+        assert [tuple(event) for event in read_ics_events(ics_file_path)] == sorted(expected)
+
+
+def test_read_ics_events_skips_events_outside_the_window():
+    events = read_ics_events("janedoe.ics", pacific_minute(3, 0), pacific_minute(5, 23, 59))
+
+    # Only Jane's conference overlaps Dec. 3rd - 5th
+    assert [event.uid for event in events] == ["5st58b905jg84qanorgic6isqs@google.com"]
+
+
+def test_iter_ics_events_from_lines_handles_folding_timezones_durations_and_transparency():
+    lines = [
+        "BEGIN:VCALENDAR",
+        "BEGIN:VEVENT",
+        "UID:folded-",
+        " uid",
+        "DTSTART;TZID=America/New_York:20241202T130000",
+        "DURATION:PT1H30M",
+        "BEGIN:VALARM",
+        "TRIGGER:-PT15M",
+        "DURATION:PT5M",
+        "END:VALARM",
+        "END:VEVENT",
+        "BEGIN:VEVENT",
+        "UID:free-time",
+        "DTSTART:20241202T180000Z",
+        "DTEND:20241202T190000Z",
+        "TRANSP:TRANSPARENT",
+        "END:VEVENT",
+        "BEGIN:VEVENT",
+        "UID:floating",
+        "DTSTART:20241203T090000",
+        "DTEND:20241203T093000",
+        "END:VEVENT",
+        "END:VCALENDAR",
+    ]
+
+    assert list(iter_ics_events_from_lines(lines)) == [
+        IcsEvent(pacific_minute(2, 10), pacific_minute(2, 11, 30), "folded-uid"),
+        IcsEvent(pacific_minute(3, 9), pacific_minute(3, 9, 30), "floating"),
+    ]
+
+
+# A weekly 9 am meeting on Mondays and Wednesdays with no end, where one
+# occurrence is cancelled, one is moved, and one extra one is added
+RECURRING_CALENDAR = [
+    "BEGIN:VCALENDAR",
+    "BEGIN:VEVENT",
+    "UID:weekly",
+    "DTSTART;TZID=America/Los_Angeles:20241202T090000",
+    "DTEND;TZID=America/Los_Angeles:20241202T093000",
+    "RRULE:FREQ=WEEKLY;BYDAY=MO,WE",
+    "EXDATE;TZID=America/Los_Angeles:20241204T090000",
+    "RDATE;TZID=America/Los_Angeles:20241206T150000",
+    "END:VEVENT",
+    "BEGIN:VEVENT",
+    "UID:weekly",
+    "RECURRENCE-ID;TZID=America/Los_Angeles:20241209T090000",
+    "DTSTART;TZID=America/Los_Angeles:20241209T110000",
+    "DTEND;TZID=America/Los_Angeles:20241209T113000",
+    "END:VEVENT",
+    "BEGIN:VEVENT",
+    "UID:one-off",
+    "DTSTART:20241203T180000Z",
+    "DTEND:20241203T190000Z",
+    "END:VEVENT",
+    "END:VCALENDAR",
+]
+
+
+def test_iter_ics_events_from_lines_expands_recurring_events_within_the_window():
+    events = list(iter_ics_events_from_lines(RECURRING_CALENDAR, pacific_minute(2, 0), pacific_minute(11, 23, 59)))
+
+    assert events == [
+        IcsEvent(pacific_minute(2, 9), pacific_minute(2, 9, 30), "weekly"),
+        IcsEvent(pacific_minute(3, 10), pacific_minute(3, 11), "one-off"),
+        IcsEvent(pacific_minute(6, 15), pacific_minute(6, 15, 30), "weekly"),
+        IcsEvent(pacific_minute(9, 11), pacific_minute(9, 11, 30), "weekly"),
+        IcsEvent(pacific_minute(11, 9), pacific_minute(11, 9, 30), "weekly"),
+    ]
+
+
+def test_recurring_events_are_expanded_lazily_in_their_own_timezone():
+    calendar = read_ics_calendar(RECURRING_CALENDAR)
+    # The moved occurrence is kept as a one-off event
+    assert [event.uid for event in calendar.events] == ["one-off", "weekly"]
+    assert [series.uid for series in calendar.series] == ["weekly"]
+
+    # Years later, and across a daylight saving time change, it's still at 9 am Pacific
+    window_start = to_epoch_minute(datetime(2031, 3, 10, 0, 0, tzinfo=PACIFIC_TIMEZONE))
+    window_end = to_epoch_minute(datetime(2031, 3, 10, 23, 59, tzinfo=PACIFIC_TIMEZONE))
+    assert list(calendar.iter_events(window_start, window_end)) == [
+        IcsEvent(
+            to_epoch_minute(datetime(2031, 3, 10, 9, 0, tzinfo=PACIFIC_TIMEZONE)),
+            to_epoch_minute(datetime(2031, 3, 10, 9, 30, tzinfo=PACIFIC_TIMEZONE)),
+            "weekly",
+        ),
+    ]
+
+    # A series with no end can't be expanded without an end to the window
+    with pytest.raises(ValueError):
+        list(calendar.iter_events(window_start))
+
+
+def test_bounded_recurring_events_are_expanded_without_a_window():
+    lines = [
+        "BEGIN:VEVENT",
+        "UID:daily",
+        "DTSTART:20241202T170000Z",
+        "DURATION:PT1H",
+        "RRULE:FREQ=DAILY;UNTIL=20241204",
+        "END:VEVENT",
+    ]
+
+    assert list(iter_ics_events_from_lines(lines)) == [
+        IcsEvent(pacific_minute(day, 9), pacific_minute(day, 10), "daily") for day in [2, 3, 4]
+    ]
+
+
+def test_far_future_occurrences_are_expanded_without_keeping_every_earlier_one():
+    calendar = read_ics_calendar([
+        "BEGIN:VEVENT",
+        "UID:daily",
+        "DTSTART;TZID=America/Los_Angeles:20150105T090000",
+        "DURATION:PT30M",
+        "RRULE:FREQ=DAILY",
+        "END:VEVENT",
+    ])
+    (series,) = calendar.series
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        for day in range(1, 29):
+            window_start = to_epoch_minute(datetime(2100, 2, day, 0, 0, tzinfo=PACIFIC_TIMEZONE))
+            assert list(iter_occurrences(series, window_start, window_start + 24 * 60 - 1)) == [
+                IcsEvent(window_start + 9 * 60, window_start + 9 * 60 + 30, "daily"),
+            ]
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # Nothing is kept from the 85 years of occurrences before the window
+    assert after - before < 64 * 1024
+
+
+def test_rules_start_near_the_window_without_changing_their_occurrences():
+    starts = [
+        datetime(2015, 1, 31, 9, 0, tzinfo=PACIFIC_TIMEZONE),
+        datetime(2016, 2, 29, 23, 30, tzinfo=PACIFIC_TIMEZONE),
+        datetime(2017, 12, 31, 10, 0, tzinfo=timezone.utc),
+    ]
+    rules = [
+        "FREQ=DAILY;INTERVAL=3;BYHOUR=8,17",
+        "FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,FR",
+        "FREQ=MONTHLY",
+        "FREQ=MONTHLY;BYSETPOS=-1;BYDAY=MO,TU,WE,TH,FR",
+        "FREQ=YEARLY",
+        "FREQ=DAILY;COUNT=5000",
+    ]
+
+    for start in starts:
+        for rule in rules:
+            for days in [0, 40, 400, 4000, 30000]:
+                after = (start + timedelta(days=days, hours=5)).astimezone(timezone.utc)
+                expected = rrulestr(rule, dtstart=start).xafter(after, count=5)
+                assert list(rrulestr(rule, dtstart=rule_start_near(rule, start, after)).xafter(after, count=5)) == list(expected)
@@ -1,9 +1,12 @@
 from fastapi.testclient import TestClient
 from datetime import datetime
 from ics import Calendar, Event
+import json
 import pytest
 
 
+from . import main
+from .datastore import AvailabilityStore
 from .main import app
 from .utils import read_ics_file_and_sort_events
 
@@ -22,3 +25,144 @@ def test_query():
     response = client.get("/query")
     assert response.status_code == 200
     assert response.json() == {"message": "Hello World"}
+
+
+#############################
+# Batch Endpoint Unit tests #
+#############################
+
+def test_batch():
+    response = client.post("/batch", json={
+        "checks": [
+            {"agent_id": 1, "duration": 60, "start": "2024-12-02T08:00:00-08:00"},
+            {"agent_id": 1, "duration": 60, "start": "2024-12-02T10:00:00-08:00"},
+            {"agent_id": 99, "duration": 60, "start": "2024-12-02T08:00:00-08:00"},
+        ],
+        "queries": [
+            {"agent_id": 1, "duration": 60, "start": "2024-12-02T08:00:00-08:00", "end": "2024-12-02T10:00:00-08:00"},
+        ],
+    })
+    assert response.status_code == 200
+
+    checks = response.json()["checks"]
+    assert [check["is_available"] for check in checks] == [True, False, None]
+    assert checks[2]["detail"] == "Unable to find requested agent_id"
+
+    queries = response.json()["queries"]
+    assert queries[0]["available_times"] == [
+        "2024-12-02T08:00:00-08:00",
+        "2024-12-02T08:15:00-08:00",
+        "2024-12-02T08:30:00-08:00",
+        "2024-12-02T08:45:00-08:00",
+        "2024-12-02T09:00:00-08:00",
+    ]
+
+
+###############################
+# Streaming Search Unit tests #
+###############################
+
+def test_streamed_searches_match_their_json_results():
+    for path in [
+        "/query/1/60/2024-12-02T08:00:00-08:00/2024-12-06T17:00:00-08:00",
+        "/multi-agent-coordination/60/2024-12-02T08:00:00-08:00/2024-12-06T17:00:00-08:00?agent_ids=1&agent_ids=3",
+    ]:
+        available_times = client.get(path).json()["available_times"]
+        assert available_times
+
+        separator = "&" if "?" in path else "?"
+        response = client.get(f"{path}{separator}format=ndjson")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert [json.loads(line)["available_time"] for line in response.text.splitlines()] == available_times
+
+
+def test_batch_answers_the_agents_that_can_be_read(monkeypatch):
+    monkeypatch.setattr(main, "datastore", AvailabilityStore({1: "janedoe.ics", 2: "missing.ics"}))
+
+    response = client.post("/batch", json={
+        "checks": [
+            {"agent_id": 1, "duration": 60, "start": "2024-12-02T08:00:00-08:00"},
+            {"agent_id": 2, "duration": 60, "start": "2024-12-02T08:00:00-08:00"},
+        ],
+        "queries": [
+            {"agent_id": 2, "duration": 60, "start": "2024-12-02T08:00:00-08:00", "end": "2024-12-02T10:00:00-08:00"},
+        ],
+    })
+    assert response.status_code == 200
+
+    checks = response.json()["checks"]
+    assert checks[0]["is_available"] is True
+    assert checks[1]["is_available"] is None
+    assert "missing.ics" in checks[1]["detail"]
+    assert "missing.ics" in response.json()["queries"][0]["detail"]
+
+
+###############################
+# Metrics Endpoint Unit tests #
+###############################
+
+def test_metrics():
+    client.get("/check/1/60/2024-12-02T08:00:00-08:00")
+    client.get("/multi-agent-coordination/60/2024-12-02T08:00:00-08:00/2024-12-02T10:00:00-08:00?agent_ids=1&agent_ids=2")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+
+    metrics = response.text
+    assert 'housewhisper_requests_total{endpoint="check",status="200"}' in metrics
+    assert 'housewhisper_request_duration_seconds_count{endpoint="coordinate"}' in metrics
+    assert 'housewhisper_intersection_duration_seconds_count{endpoint="coordinate"}' in metrics
+    assert 'housewhisper_agent_lookups_total{agent_id="1"}' in metrics
+
+
+def test_profile_is_disabled_by_default():
+    response = client.get("/debug/profile")
+    assert response.status_code == 200
+    assert response.json()["status_code"] == 404
+    assert "PROFILE_SAMPLE_INTERVAL_MS" in response.json()["detail"]
+
+
+##################################
+# Best Slots Endpoint Unit tests #
+##################################
+
+def test_best_slots():
+    response = client.get("/best-slots/60/2024-12-02T08:00:00-08:00/2024-12-02T17:00:00-08:00?agent_ids=1&agent_ids=2&k=2")
+    assert response.status_code == 200
+    assert response.json() == {"best_slots": [
+        {"agent_id": 1, "start": "2024-12-02T08:00:00-08:00", "free_minutes": 120, "back_to_back": 0},
+        {"agent_id": 1, "start": "2024-12-02T08:15:00-08:00", "free_minutes": 105, "back_to_back": 0},
+    ]}
+
+
+###################################
+# Utilization Endpoint Unit tests #
+###################################
+
+def test_utilization():
+    response = client.get("/utilization/2024-12-02/2024-12-02?agent_ids=1&agent_ids=2")
+    assert response.status_code == 200
+    assert response.json()["rows"] == [
+        [1, "2024-12-02", 540, 360, 180, 2, 120, 2, 0.6667],
+        [2, "2024-12-02", 540, 480, 60, 1, 60, 1, 0.8889],
+    ]
+
+    response = client.get("/utilization/2024-12-02/2024-12-02?agent_ids=1&format=csv")
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.text.splitlines()[1] == "1,2024-12-02,540,360,180,2,120,2,0.6667"
+
+
+######################
+# Startup Unit tests #
+######################
+
+def test_shared_store_requires_the_array_backend(monkeypatch):
+    monkeypatch.setattr(main, "SHARED_STORE_NAME", "housewhisper-test")
+    monkeypatch.setattr(main.datastore, "backend", "days")
+
+    # Every worker would otherwise quietly build its own store
+    with pytest.raises(ValueError, match="array"):
+        with TestClient(app):
+            pass
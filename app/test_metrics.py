@@ -0,0 +1,70 @@
+import time
+
+from .metrics import Counter, Histogram, MetricsRegistry, StackSampler
+
+
+################################
+# Create tests for the metrics #
+################################
+
+def test_counter_renders_each_set_of_labels():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests handled", ["endpoint"])
+
+    requests.inc("check")
+    requests.inc("check")
+    requests.inc("query", amount=3)
+
+    assert registry.render() == "\n".join([
+        "# HELP requests_total Requests handled",
+        "# TYPE requests_total counter",
+        'requests_total{endpoint="check"} 2',
+        'requests_total{endpoint="query"} 3',
+    ]) + "\n"
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("search_seconds", "Slot search time", ["endpoint"], buckets=[0.001, 0.01])
+
+    histogram.observe(0.0005, "query")
+    histogram.observe(0.001, "query")
+    histogram.observe(0.005, "query")
+    histogram.observe(1, "query")
+
+    assert histogram.render()[2:] == [
+        'search_seconds_bucket{endpoint="query",le="0.001"} 2',
+        'search_seconds_bucket{endpoint="query",le="0.01"} 3',
+        'search_seconds_bucket{endpoint="query",le="+Inf"} 4',
+        'search_seconds_sum{endpoint="query"} 1.0065',
+        'search_seconds_count{endpoint="query"} 4',
+    ]
+
+
+def test_histogram_times_a_block():
+    histogram = Histogram("build_seconds", "Build time", ["agent_id"])
+
+    with histogram.time(1):
+        pass
+
+    assert histogram.series[("1",)][-1] >= 0
+    assert sum(histogram.series[("1",)][:-1]) == 1
+
+
+def test_label_values_are_escaped():
+    counter = Counter("errors_total", "Errors", ["detail"])
+    counter.inc('a "quoted"\nvalue')
+
+    assert counter.render()[-1] == 'errors_total{detail="a \\"quoted\\"\\nvalue"} 1'
+
+
+def test_stack_sampler_records_the_calling_thread():
+    sampler = StackSampler(0.001)
+    sampler.start()
+
+    deadline = time.perf_counter() + 0.1
+    while time.perf_counter() < deadline:
+        pass
+
+    sampler.stop()
+
+    assert "test_stack_sampler_records_the_calling_thread" in sampler.collapsed()
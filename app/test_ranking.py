@@ -0,0 +1,132 @@
+from datetime import datetime
+
+import pytest
+
+from .availability import build_availability, to_epoch_minute
+from .constants import PACIFIC_TIMEZONE
+from . import ranking
+from .ranking import find_best_slots
+from .search import find_available_times
+from .working_hours import WorkingHours
+
+
+################################
+# Create tests for the ranking #
+################################
+
+def pacific(day, hour, minute=0):
+    return datetime(2024, 12, day, hour, minute, tzinfo=PACIFIC_TIMEZONE)
+
+
+# Agent 1 has meetings from 9 - 10 am and 10:30 - 11 am on Dec. 2nd, and
+# agent 2 is busy all of Dec. 2nd except 4 - 5 pm and all of Dec. 3rd
+# until noon
+BUSY_INTERVALS = {
+    1: [(pacific(2, 9), pacific(2, 10)), (pacific(2, 10, 30), pacific(2, 11))],
+    2: [(pacific(2, 8), pacific(2, 16)), (pacific(3, 8), pacific(3, 12))],
+}
+
+
+def availabilities(backend):
+    return {
+        agent_id: build_availability(
+            [to_epoch_minute(start) for start, _ in intervals],
+            [to_epoch_minute(end) for _, end in intervals],
+            pacific(2, 0),
+            pacific(6, 23, 59),
+            backend,
+        )
+        for agent_id, intervals in BUSY_INTERVALS.items()
+    }
+
+
+def test_earliest_slots_across_agents():
+    for backend in ["intervals", "array", "days"]:
+        slots = find_best_slots(availabilities(backend), pacific(2, 8), pacific(6, 17), 30, 4)
+
+        assert [(slot.agent_id, slot.start) for slot in slots] == [
+            (1, to_epoch_minute(pacific(2, 8))),
+            (1, to_epoch_minute(pacific(2, 8, 15))),
+            (1, to_epoch_minute(pacific(2, 8, 30))),
+            (1, to_epoch_minute(pacific(2, 10))),
+        ]
+        assert [slot.back_to_back for slot in slots] == [0, 0, 1, 2]
+
+
+def test_longest_and_fewest_back_to_back_slots():
+    for backend in ["intervals", "array", "days"]:
+        agents = availabilities(backend)
+
+        # Whole free business days beat everything else, earliest first
+        slots = find_best_slots(agents, pacific(2, 8), pacific(6, 17), 60, 3, "longest")
+        assert [(slot.agent_id, slot.start, slot.free_minutes) for slot in slots] == [
+            (1, to_epoch_minute(pacific(3, 8)), 540),
+            (1, to_epoch_minute(pacific(4, 8)), 540),
+            (2, to_epoch_minute(pacific(4, 8)), 540),
+        ]
+
+        # 8 am runs into agent 1's 9 am meeting, 11 am follows their 10:30
+        # am meeting and 4 pm follows agent 2's meetings
+        slots = find_best_slots(agents, pacific(2, 8), pacific(2, 17), 60, 3, "fewest_back_to_back")
+        assert [(slot.agent_id, slot.start, slot.back_to_back) for slot in slots] == [
+            (1, to_epoch_minute(pacific(2, 11, 15)), 0),
+            (1, to_epoch_minute(pacific(2, 11, 30)), 0),
+            (1, to_epoch_minute(pacific(2, 11, 45)), 0),
+        ]
+        slots = find_best_slots(agents, pacific(2, 8), pacific(2, 17), 60, 100, "fewest_back_to_back")
+        assert [(slot.agent_id, slot.start, slot.back_to_back) for slot in slots[-3:]] == [
+            (1, to_epoch_minute(pacific(2, 8)), 1),
+            (1, to_epoch_minute(pacific(2, 11)), 1),
+            (2, to_epoch_minute(pacific(2, 16)), 1),
+        ]
+
+
+def test_best_slots_agree_with_every_available_time():
+    agents = availabilities("days")
+
+    for rank in ["earliest", "longest", "fewest_back_to_back"]:
+        slots = find_best_slots(agents, pacific(2, 8), pacific(6, 17), 45, 1000, rank)
+
+        expected = sorted(
+            (agent_id, to_epoch_minute(time))
+            for agent_id, availability in agents.items()
+            for time in find_available_times(availability, pacific(2, 8), pacific(6, 17), 45)
+        )
+        assert sorted((slot.agent_id, slot.start) for slot in slots) == expected
+
+    assert find_best_slots(agents, pacific(2, 8), pacific(6, 17), 45, 0) == []
+
+    with pytest.raises(ValueError):
+        find_best_slots(agents, pacific(2, 8), pacific(6, 17), 45, 5, "best")
+
+
+def test_longest_slots_stop_once_they_cant_be_beaten(monkeypatch):
+    consumed = []
+    iter_agent_slots = ranking.iter_agent_slots
+
+    def counting_iter_agent_slots(*args):
+        for slot in iter_agent_slots(*args):
+            consumed.append(slot)
+            yield slot
+
+    monkeypatch.setattr(ranking, "iter_agent_slots", counting_iter_agent_slots)
+
+    # Whole free days turn up within the first few days of a year-long range
+    range_end = datetime(2025, 12, 1, 17, 0, tzinfo=PACIFIC_TIMEZONE)
+    slots = find_best_slots(availabilities("days"), pacific(2, 8), range_end, 60, 3, "longest")
+    assert [slot.free_minutes for slot in slots] == [540, 540, 540]
+    assert len(consumed) < 100
+
+
+def test_longest_slots_include_blocks_that_span_a_daylight_saving_time_change():
+    # 12 - 3 am every day, which lasts 4 hours on Nov. 3rd, 2024
+    hours = WorkingHours.from_config({
+        "timezone": "America/Los_Angeles",
+        "hours": {day: "00:00-03:00" for day in ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]},
+    })
+    range_start = datetime(2024, 11, 1, 0, 0, tzinfo=PACIFIC_TIMEZONE)
+    range_end = datetime(2024, 11, 5, 0, 0, tzinfo=PACIFIC_TIMEZONE)
+    agents = {1: build_availability([], [], range_start, range_end, "days", hours=hours)}
+
+    (slot,) = find_best_slots(agents, range_start, range_end, 60, 1, "longest")
+    assert (slot.start, slot.free_minutes) == (to_epoch_minute(datetime(2024, 11, 3, 0, 0, tzinfo=PACIFIC_TIMEZONE)), 240)
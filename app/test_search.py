@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+from itertools import chain
+
+import pytest
+
+from .constants import PACIFIC_TIMEZONE
+from .search import find_available_times, iter_available_times
+from .utils import preprocess_ics_file
+
+
+###############################
+# Create tests for the search #
+###############################
+
+def find_available_times_slowly(availability, range_start, range_end, duration):
+    available_times = []
+    time_pointer = range_start
+    while time_pointer <= range_end:
+        if availability.minutes_free(time_pointer) >= duration:
+            available_times.append(time_pointer)
+        time_pointer += timedelta(minutes=15)
+    return available_times
+
+
+def test_find_available_times_matches_probing_every_quarter_hour():
+    range_start = datetime(2024, 12, 2, 8, 0, tzinfo=PACIFIC_TIMEZONE)
+    range_end = datetime(2024, 12, 6, 17, 0, tzinfo=PACIFIC_TIMEZONE)
+
+    for ics_file_path in ["janedoe.ics", "jilldoe.ics", "joedoe.ics", "johndoe.ics"]:
+        for backend in ["array", "intervals", "days"]:
+            availability = preprocess_ics_file(ics_file_path, backend=backend)
+
+            for duration in [15, 60, 120, 540]:
+                expected = find_available_times_slowly(availability, range_start, range_end, duration)
+                assert find_available_times(availability, range_start, range_end, duration) == expected
+
+
+def test_find_available_times_rounds_up_to_the_next_quarter_hour():
+    availability = preprocess_ics_file("janedoe.ics")
+
+    available_times = find_available_times(
+        availability,
+        datetime(2024, 12, 2, 8, 7, tzinfo=PACIFIC_TIMEZONE),
+        datetime(2024, 12, 2, 10, 0, tzinfo=PACIFIC_TIMEZONE),
+        60,
+    )
+
+    assert available_times == [
+        datetime(2024, 12, 2, 8, 15, tzinfo=PACIFIC_TIMEZONE),
+        datetime(2024, 12, 2, 8, 30, tzinfo=PACIFIC_TIMEZONE),
+        datetime(2024, 12, 2, 8, 45, tzinfo=PACIFIC_TIMEZONE),
+        datetime(2024, 12, 2, 9, 0, tzinfo=PACIFIC_TIMEZONE),
+    ]
+
+
+def test_iter_available_times_finds_the_same_times_a_day_at_a_time():
+    range_start = datetime(2024, 12, 2, 8, 7, tzinfo=PACIFIC_TIMEZONE)
+    range_end = datetime(2024, 12, 6, 17, 0, tzinfo=PACIFIC_TIMEZONE)
+
+    for backend in ["array", "intervals", "days"]:
+        availability = preprocess_ics_file("janedoe.ics", backend=backend)
+
+        for duration in [0, 60]:
+            chunks = list(iter_available_times(availability, range_start, range_end, duration))
+            assert len(chunks) == 5
+            assert list(chain.from_iterable(chunks)) == find_available_times(availability, range_start, range_end, duration)
+
+    # The range is checked before any of it is searched
+    with pytest.raises(LookupError):
+        iter_available_times(preprocess_ics_file("janedoe.ics", backend="array"), range_start, range_end + timedelta(days=1), 60)
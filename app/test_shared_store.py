@@ -0,0 +1,85 @@
+import os
+import tempfile
+import uuid
+
+import pytest
+
+from .datastore import AvailabilityStore
+from .shared_store import SharedStorePublisher, SharedStoreReader, acquire_builder_lock
+from .sources import IcsSource
+
+
+#####################################
+# Create tests for the shared store #
+#####################################
+
+CONFIG = {
+    1: "janedoe.ics",
+    2: "jilldoe.ics",
+    3: "joedoe.ics",
+    4: "johndoe.ics",
+}
+
+
+@pytest.fixture
+def shared_store_name():
+    return f"hw-test-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+# A calendar that must never be read, for workers that follow the shared store
+class UnreadableSource(IcsSource):
+    def version(self):
+        return 0
+
+    def read(self):
+        raise AssertionError("The calendar should come from the shared store")
+
+
+def test_workers_read_agents_from_the_shared_store(shared_store_name):
+    builder = AvailabilityStore(CONFIG, backend="array")
+    builder.refresh()
+
+    publisher = SharedStorePublisher(shared_store_name)
+    reader = SharedStoreReader(shared_store_name)
+    try:
+        assert reader.generation() == 0
+        first_generation = builder.publish_shared(publisher)
+        assert reader.generation() == first_generation
+
+        # A worker follows the shared store without reading any calendars
+        worker = AvailabilityStore({agent_id: UnreadableSource() for agent_id in CONFIG}, backend="array")
+        worker.follow_shared(reader)
+        for agent_id in CONFIG:
+            assert worker.get(agent_id).values.tolist() == builder.get(agent_id).values.tolist()
+        assert worker.refresh() is False
+
+        # Publishing a new generation swaps it in on the next lookup, and
+        # only agents whose calendars changed are reported as changed
+        changed_agent_ids = []
+        worker.add_listener(changed_agent_ids.append)
+        second_generation = builder.publish_shared(publisher)
+        assert second_generation > first_generation
+
+        assert worker.get(1).values.tolist() == builder.get(1).values.tolist()
+        assert worker._entries[1].generation == second_generation
+        assert changed_agent_ids == []
+
+        # The previous generation is gone, so no reader can attach to it
+        assert SharedStoreReader(shared_store_name).load(first_generation, 0, 0) is None
+    finally:
+        reader.close()
+        publisher.close()
+
+
+def test_only_one_process_builds_the_shared_store(shared_store_name):
+    lock = acquire_builder_lock(shared_store_name)
+    try:
+        assert lock is not None
+        assert acquire_builder_lock(shared_store_name) is None
+    finally:
+        lock.close()
+
+    lock = acquire_builder_lock(shared_store_name)
+    assert lock is not None
+    lock.close()
+    os.remove(os.path.join(tempfile.gettempdir(), f"{shared_store_name}.lock"))
@@ -0,0 +1,70 @@
+import hashlib
+
+from .availability import to_epoch_minute
+from .constants import PREPROCESS_START, PREPROCESS_END
+from .datastore import AvailabilityStore
+from .snapshot import load_snapshot
+
+
+##################################
+# Create tests for the snapshots #
+##################################
+
+CONFIG = {
+    1: "janedoe.ics",
+    2: "jilldoe.ics",
+    3: "joedoe.ics",
+    4: "johndoe.ics",
+}
+
+
+def test_snapshot_round_trips_every_agents_availability(tmp_path):
+    snapshot_path = tmp_path / "availability.snapshot"
+
+    datastore = AvailabilityStore(CONFIG, backend="array")
+    datastore.refresh()
+    datastore.save_snapshot(snapshot_path)
+
+    window_start = to_epoch_minute(PREPROCESS_START)
+    window_end = to_epoch_minute(PREPROCESS_END)
+    snapshot = load_snapshot(snapshot_path, window_start, window_end)
+
+    assert sorted(snapshot) == sorted(CONFIG)
+    for agent_id, (availability, content_hash) in snapshot.items():
+        with open(CONFIG[agent_id], "rb") as file:
+            assert content_hash == hashlib.sha256(file.read()).hexdigest()
+        assert availability.values.tolist() == datastore.get(agent_id).values.tolist()
+
+    # A snapshot built for a different window is ignored
+    assert load_snapshot(snapshot_path, window_start + 1, window_end) == dict()
+
+
+def test_datastore_seeded_from_a_snapshot_skips_rebuilding_unchanged_agents(tmp_path):
+    snapshot_path = tmp_path / "availability.snapshot"
+
+    datastore = AvailabilityStore(CONFIG, backend="array")
+    datastore.refresh()
+    datastore.save_snapshot(snapshot_path)
+
+    restarted_datastore = AvailabilityStore(CONFIG, backend="array")
+    restarted_datastore.load_snapshot(snapshot_path)
+
+    assert restarted_datastore.refresh() is False
+    assert restarted_datastore.get(1).values.tolist() == datastore.get(1).values.tolist()
+
+
+def test_snapshot_skips_agents_whose_working_hours_changed(tmp_path):
+    snapshot_path = tmp_path / "availability.snapshot"
+
+    datastore = AvailabilityStore(CONFIG, backend="array")
+    datastore.refresh()
+    datastore.save_snapshot(snapshot_path)
+
+    config = {**CONFIG, 1: {"ics_file_path": "janedoe.ics", "working_hours": {"timezone": "America/New_York"}}}
+    restarted_datastore = AvailabilityStore(config, backend="array")
+    restarted_datastore.load_snapshot(snapshot_path)
+
+    # Only the agent whose working hours changed is rebuilt
+    assert restarted_datastore.is_fresh(1) is False
+    assert restarted_datastore.refresh_agent(2) is False
+    assert restarted_datastore.get(1).hours == restarted_datastore.working_hours_for(1)
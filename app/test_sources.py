@@ -0,0 +1,97 @@
+import asyncio
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from .datastore import AvailabilityStore
+from .sources import FileSource, IcsSource, UrlSource, ics_source
+
+
+################################
+# Create tests for the sources #
+################################
+
+# Serves files without logging every request
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+# A local HTTP server serving the ICS files in the current directory
+@pytest.fixture
+def ics_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory="."))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_ics_source_accepts_paths_urls_and_sources():
+    source = UrlSource("https://example.com/agent.ics", max_age_seconds=60)
+
+    assert ics_source("janedoe.ics") == FileSource("janedoe.ics")
+    assert ics_source("https://example.com/agent.ics") == UrlSource("https://example.com/agent.ics")
+    assert ics_source(source) is source
+
+
+def test_calendars_are_fetched_from_urls(ics_server):
+    datastore = AvailabilityStore({1: f"{ics_server}/janedoe.ics", 2: "janedoe.ics"}, backend="array")
+
+    # Fetched calendars match the same calendar read from disk
+    url_availability, file_availability = asyncio.run(datastore.get_async([1, 2]))
+    assert url_availability.values.tolist() == file_availability.values.tolist()
+
+    # A calendar is only fetched again once it's older than its max age
+    assert datastore.is_fresh(1) is True
+    assert datastore.refresh_agent(1) is False
+
+    missing = AvailabilityStore({1: f"{ics_server}/missing.ics"})
+    with pytest.raises(Exception):
+        asyncio.run(missing.get_async([1]))
+
+
+# A calendar that's held back until the test releases it,
+# counting how many times it was read
+class SlowSource(IcsSource):
+    def __init__(self, path):
+        self.path = path
+        self.reads = 0
+        self.released = None
+
+    def version(self):
+        return 0
+
+    def read(self):
+        with open(self.path, "rb") as file:
+            return file.read()
+
+    async def read_async(self):
+        self.reads += 1
+        await self.released.wait()
+        return self.read()
+
+
+def test_concurrent_lookups_share_one_refresh():
+    source = SlowSource("janedoe.ics")
+    datastore = AvailabilityStore({1: source, 2: "jilldoe.ics"}, backend="array")
+
+    async def lookups():
+        source.released = asyncio.Event()
+        requests = [asyncio.ensure_future(datastore.get_async([1, 2])) for _ in range(5)]
+
+        # Let every request start waiting for agent 1 before releasing it
+        await asyncio.sleep(0.05)
+        source.released.set()
+        return await asyncio.gather(*requests)
+
+    results = asyncio.run(lookups())
+
+    assert source.reads == 1
+    assert all(availabilities[0] is results[0][0] for availabilities in results)
+    assert asyncio.run(datastore.refresh_async()) == []
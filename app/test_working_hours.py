@@ -0,0 +1,122 @@
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from .availability import DayAvailability, build_availability, to_epoch_minute
+from .datastore import AvailabilityStore
+from .utils import preprocess_ics_files
+from .working_hours import DEFAULT_WORKING_HOURS, WorkingHours
+
+
+######################################
+# Create tests for the working hours #
+######################################
+
+NEW_YORK_TIMEZONE = ZoneInfo("America/New_York")
+
+# 9 am - 5 pm New York time on weekdays, with a long lunch on
+# Fridays, weekends off, and Christmas Day off
+NEW_YORK_HOURS = WorkingHours.from_config({
+    "timezone": "America/New_York",
+    "hours": {
+        "mon": "09:00-17:00",
+        "tue": "09:00-17:00",
+        "wed": "09:00-17:00",
+        "thu": "09:00-17:00",
+        "fri": ["09:00-12:00", "13:00-15:00"],
+    },
+    "holidays": ["2024-12-25"],
+})
+
+
+def new_york(day, hour, minute=0):
+    return datetime(2024, 12, day, hour, minute, tzinfo=NEW_YORK_TIMEZONE)
+
+
+def test_working_hours_are_parsed_from_config():
+    assert NEW_YORK_HOURS.timezone == "America/New_York"
+    assert NEW_YORK_HOURS.weekly_hours[0] == ((540, 1020),)
+    assert NEW_YORK_HOURS.weekly_hours[4] == ((540, 720), (780, 900))
+    assert NEW_YORK_HOURS.weekly_hours[5] == ()
+    assert NEW_YORK_HOURS.holidays == frozenset([date(2024, 12, 25)])
+
+    # Without any hours, an agent keeps the default business hours
+    assert WorkingHours.from_config({}) == DEFAULT_WORKING_HOURS
+    assert WorkingHours.from_config({"timezone": "America/New_York"}).weekly_hours == DEFAULT_WORKING_HOURS.weekly_hours
+
+    for config in [
+        {"timezone": "Not/A_Timezone"},
+        {"hours": {"someday": "09:00-17:00"}},
+        {"hours": {"mon": "17:00-09:00"}},
+        {"hours": {"mon": ["09:00-12:00", "11:00-15:00"]}},
+    ]:
+        with pytest.raises(Exception):
+            WorkingHours.from_config(config)
+
+
+def test_every_backend_follows_an_agents_working_hours():
+    # A meeting from 10 to 11 am New York time on Monday, Dec. 2nd
+    busy_starts = [to_epoch_minute(new_york(2, 10))]
+    busy_ends = [to_epoch_minute(new_york(2, 11))]
+
+    for backend in ["intervals", "array", "days"]:
+        availability = build_availability(busy_starts, busy_ends, new_york(2, 0), new_york(27, 0), backend, hours=NEW_YORK_HOURS)
+
+        # The business day starts and ends in New York time
+        assert availability.minutes_free(new_york(2, 8, 59)) == 0
+        assert availability.minutes_free(new_york(2, 9)) == 60
+        assert availability.minutes_free(new_york(2, 11)) == 360
+        assert availability.minutes_free(new_york(2, 17)) == 0
+
+        # Fridays are split around lunch
+        assert availability.minutes_free(new_york(6, 9)) == 180
+        assert availability.minutes_free(new_york(6, 12, 30)) == 0
+        assert availability.minutes_free(new_york(6, 13)) == 120
+
+        # Nobody works on weekends or holidays
+        assert availability.minutes_free(new_york(7, 10)) == 0
+        assert availability.minutes_free(new_york(25, 10)) == 0
+        assert availability.minutes_free(new_york(26, 10)) == 420
+
+
+def test_days_with_the_same_hours_share_a_template():
+    # Every Monday without a daylight saving time change looks the same
+    assert NEW_YORK_HOURS.day_template(date(2024, 12, 2)) is NEW_YORK_HOURS.day_template(date(2024, 12, 9))
+    assert NEW_YORK_HOURS.day_template(date(2024, 12, 2)) is not NEW_YORK_HOURS.day_template(date(2024, 12, 6))
+
+    # Agents without any events on a day share that day's template
+    availability = DayAvailability([], [], hours=NEW_YORK_HOURS)
+    other_availability = DayAvailability([], [], hours=NEW_YORK_HOURS)
+    assert availability.day_values(date(2024, 12, 2))[1] is other_availability.day_values(date(2024, 12, 9))[1]
+
+
+def test_datastore_reads_working_hours_from_config():
+    datastore = AvailabilityStore({
+        1: {"ics_file_path": "janedoe.ics", "working_hours": {"timezone": "America/New_York"}},
+        2: "jilldoe.ics",
+    })
+
+    assert datastore.ics_config == {1: "janedoe.ics", 2: "jilldoe.ics"}
+    assert datastore.working_hours_for(1).tz == NEW_YORK_TIMEZONE
+    assert datastore.working_hours_for(2) == DEFAULT_WORKING_HOURS
+    assert datastore.get(1).hours == datastore.working_hours_for(1)
+
+    with pytest.raises(LookupError):
+        datastore.working_hours_for(5)
+
+
+def test_preprocess_ics_files_reads_working_hours_from_config():
+    config = {
+        1: {"ics_file_path": "janedoe.ics", "working_hours": {"timezone": "America/New_York"}},
+        2: "jilldoe.ics",
+    }
+
+    for max_workers in [1, 2]:
+        availabilities = preprocess_ics_files(config, max_workers=max_workers, backend="days")
+
+        assert availabilities[1].hours.tz == NEW_YORK_TIMEZONE
+        assert availabilities[2].hours == DEFAULT_WORKING_HOURS
+        # Jane's business day starts at 8 am New York time, not Pacific time
+        assert availabilities[1].minutes_free(new_york(2, 7, 59)) == 0
+        assert availabilities[1].minutes_free(new_york(2, 8)) > 0
@@ -0,0 +1,35 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional, Sequence
+
+from .constants import PREPROCESS_WORKERS
+
+
+# A process pool shared by every request, created on first use
+# so that importing the app doesn't fork any processes
+process_pool: Optional[ProcessPoolExecutor] = None
+
+
+# Helper function to return the shared process pool
+def get_process_pool() -> ProcessPoolExecutor:
+    global process_pool
+    if process_pool is None:
+        process_pool = ProcessPoolExecutor(max_workers=PREPROCESS_WORKERS)
+    return process_pool
+
+
+# Helper function to shut down the shared process pool
+def shutdown_process_pool():
+    global process_pool
+    if process_pool is not None:
+        process_pool.shutdown(cancel_futures=True)
+        process_pool = None
+
+
+# Helper function to run `function` once per set of arguments across
+# the shared process pool, without blocking the event loop while the
+# work happens. Results are returned in the order of `arguments`
+async def run_in_process_pool(function: Callable, arguments: Sequence[tuple]) -> List:
+    loop = asyncio.get_running_loop()
+    executor = get_process_pool()
+    return await asyncio.gather(*(loop.run_in_executor(executor, function, *args) for args in arguments))
@@ -0,0 +1,187 @@
+import hashlib
+from array import array
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from .constants import BUSINESS_DAY_START, BUSINESS_DAY_END, DEFAULT_TIMEZONE
+
+
+# The keys used for each weekday in CONFIG, Monday first
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+# Each weekday's open hours as (start, end) minutes since local midnight
+WeeklyHours = Tuple[Tuple[Tuple[int, int], ...], ...]
+
+
+# An agent's working-hours profile: the timezone they work in, the hours
+# they're open on each weekday, and the dates they're off. Profiles are
+# immutable and hashable so that agents with the same profile share its
+# cached open blocks and day templates
+@dataclass(frozen=True)
+class WorkingHours:
+    timezone: str = DEFAULT_TIMEZONE.key
+    weekly_hours: WeeklyHours = (((BUSINESS_DAY_START * 60, BUSINESS_DAY_END * 60),),) * 7
+    holidays: FrozenSet[date] = field(default_factory=frozenset)
+
+    # Build a profile from an agent's CONFIG entry, e.g.
+    #
+    #   {
+    #       "timezone": "America/New_York",
+    #       "hours": {"mon": "09:00-17:00", "fri": ["09:00-12:00", "13:00-15:00"]},
+    #       "holidays": ["2024-12-25"],
+    #   }
+    #
+    # Weekdays missing from "hours" are days off. Without "hours" at all,
+    # the agent keeps the default business hours every day
+    @classmethod
+    def from_config(cls, config: Dict) -> "WorkingHours":
+        timezone = config.get("timezone", DEFAULT_TIMEZONE.key)
+        ZoneInfo(timezone)
+
+        weekly_hours = cls.weekly_hours
+        if "hours" in config:
+            unknown_weekdays = set(config["hours"]) - set(WEEKDAYS)
+            if unknown_weekdays:
+                raise ValueError(f"Unknown weekdays in working hours: {sorted(unknown_weekdays)}")
+
+            weekly_hours = tuple(parse_hours(config["hours"].get(weekday, [])) for weekday in WEEKDAYS)
+
+        holidays = frozenset(date.fromisoformat(holiday) for holiday in config.get("holidays", []))
+        return cls(timezone=timezone, weekly_hours=weekly_hours, holidays=holidays)
+
+    @property
+    def tz(self) -> ZoneInfo:
+        return ZoneInfo(self.timezone)
+
+    # A digest identifying the profile, stored alongside availability that
+    # was built with it (e.g. in snapshots) so it's rebuilt if it changes
+    def fingerprint(self) -> bytes:
+        holidays = ",".join(sorted(holiday.isoformat() for holiday in self.holidays))
+        return hashlib.sha256(f"{self.timezone}|{self.weekly_hours}|{holidays}".encode()).digest()
+
+    # Return the epoch minutes at which the local day starts and the next one starts
+    @lru_cache(maxsize=65536)
+    def day_bounds(self, local_date: date) -> Tuple[int, int]:
+        tz = self.tz
+        day_start = int(datetime.combine(local_date, time(0, 0), tzinfo=tz).timestamp()) // 60
+        next_day_start = int(datetime.combine(local_date + timedelta(days=1), time(0, 0), tzinfo=tz).timestamp()) // 60
+        return day_start, next_day_start
+
+    # Return the [start, end) epoch minutes of every block of open hours on
+    # the local date, which is empty on holidays and days off
+    @lru_cache(maxsize=65536)
+    def open_blocks(self, local_date: date) -> Tuple[Tuple[int, int], ...]:
+        if local_date in self.holidays:
+            return ()
+
+        return tuple(
+            (self.local_minute(local_date, start), self.local_minute(local_date, end))
+            for start, end in self.weekly_hours[local_date.weekday()]
+        )
+
+    # Return the minutes free for every minute of the local date when the
+    # agent has no events. Days with the same length and open hours (e.g.
+    # every Monday outside of DST changes) share one read-only template
+    def day_template(self, local_date: date) -> array:
+        day_start, next_day_start = self.day_bounds(local_date)
+        offsets = tuple((start - day_start, end - day_start) for start, end in self.open_blocks(local_date))
+        return day_template(next_day_start - day_start, offsets)
+
+    # Return the [start, end) epoch minutes of the block of open
+    # hours containing epoch minute `minute`, or None if it's closed
+    def open_block_at(self, minute: int) -> Optional[Tuple[int, int]]:
+        local_date = datetime.fromtimestamp(minute * 60, tz=self.tz).date()
+        for block_start, block_end in self.open_blocks(local_date):
+            if block_start <= minute < block_end:
+                return block_start, block_end
+        return None
+
+    # Helper method to convert minutes since local midnight into an epoch minute
+    def local_minute(self, local_date: date, minutes: int) -> int:
+        days, minutes = divmod(minutes, 24 * 60)
+        local_time = datetime.combine(local_date + timedelta(days=days), time(minutes // 60, minutes % 60), tzinfo=self.tz)
+        return int(local_time.timestamp()) // 60
+
+
+# The profile of every agent that isn't given one in CONFIG
+DEFAULT_WORKING_HOURS = WorkingHours()
+
+
+# Helper function to parse one weekday's hours, given as a
+# "09:00-17:00" string or a list of them, into minute offsets
+def parse_hours(hours) -> Tuple[Tuple[int, int], ...]:
+    if isinstance(hours, str):
+        hours = [hours]
+
+    blocks = []
+    for block in hours:
+        start, end = (parse_clock(value) for value in block.split("-"))
+        if not 0 <= start < end <= 24 * 60:
+            raise ValueError(f"Invalid working hours: {block}")
+        blocks.append((start, end))
+
+    blocks.sort()
+    for (_, previous_end), (start, _) in zip(blocks, blocks[1:]):
+        if start < previous_end:
+            raise ValueError(f"Overlapping working hours: {hours}")
+
+    return tuple(blocks)
+
+
+# Helper function to parse "HH:MM" into minutes since midnight ("24:00" is allowed)
+def parse_clock(value: str) -> int:
+    hours, minutes = value.strip().split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+# Helper function to build the minutes free for every minute of a day of
+# `day_length` minutes with the given open blocks (as minute offsets) and
+# no events. Every minute of a block counts down to the end of the block
+@lru_cache(maxsize=256)
+def day_template(day_length: int, offsets: Tuple[Tuple[int, int], ...]) -> array:
+    values = array("H", bytes(2 * day_length))
+    for start, end in offsets:
+        start, end = min(start, day_length), min(end, day_length)
+        values[start:end] = array("H", range(end - start, 0, -1))
+    return values
+
+
+# Helper function to return the profile for an agent's CONFIG entry,
+# which is either their ICS file's path (or URL, or IcsSource) or a dict
+# with that under "ics_file_path" and their profile under "working_hours"
+def agent_working_hours(agent_config) -> WorkingHours:
+    if isinstance(agent_config, dict) and "working_hours" in agent_config:
+        return WorkingHours.from_config(agent_config["working_hours"])
+    return DEFAULT_WORKING_HOURS
+
+
+# Helper function to return the path (or URL, or IcsSource)
+# of an agent's ICS file from their CONFIG entry
+def agent_ics_file_path(agent_config) -> str:
+    if isinstance(agent_config, dict):
+        return agent_config["ics_file_path"]
+    return agent_config
+
+
+# Helper function to split a CONFIG into each agent's ICS file path and profile
+def split_agent_config(config: Dict) -> Tuple[Dict[int, str], Dict[int, WorkingHours]]:
+    ics_config = {agent_id: agent_ics_file_path(agent_config) for agent_id, agent_config in config.items()}
+    working_hours = {agent_id: agent_working_hours(agent_config) for agent_id, agent_config in config.items()}
+    return ics_config, working_hours
+
+
+# Helper function to list the blocks of open hours that overlap the
+# range between epoch minutes `start` and `end`, day by day
+def iter_open_blocks(hours: WorkingHours, start: int, end: int) -> List[Tuple[int, int]]:
+    tz = hours.tz
+    local_date = datetime.fromtimestamp(start * 60, tz=tz).date()
+    last_date = datetime.fromtimestamp(end * 60, tz=tz).date()
+
+    blocks = []
+    while local_date <= last_date:
+        blocks.extend(block for block in hours.open_blocks(local_date) if block[1] > start and block[0] <= end)
+        local_date += timedelta(days=1)
+    return blocks